@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+"""
+Micro-benchmark: temps de serialisation du payload chat par tour
+
+Compare la serialisation complete ([systeme] + historique, json.dumps puis
+encodage UTF-8) au PayloadBuilder incremental, pour un historique qui
+grandit sans resume. Fonctionne en Python 2.7 et 3.
+
+Lancer:
+    python benchmark_payload.py --turns 200 --repeat 20
+"""
+
+import argparse
+import json
+import time
+
+from nao_payload_py27 import PayloadBuilder
+
+clock = getattr(time, "perf_counter", time.time)
+
+
+SYSTEM_PROMPT = (u"Tu es NAO, un robot assistant sympathique et serviable. Reponds de maniere "
+                 u"concise et naturelle en fran\xe7ais.")
+USER_TEXT = u"Est-ce que tu peux m'expliquer comment fonctionnent les robots humano\xefdes? "
+ASSISTANT_TEXT = (u"Bien s\xfbr! Un robot humano\xefde utilise des moteurs dans chaque articulation, "
+                  u"des capteurs pour garder l'\xe9quilibre et un ordinateur pour d\xe9cider. ") * 3
+
+
+def naive_body(messages, max_tokens):
+    payload = {
+        "model": "llama-3.3-70b-versatile",
+        "messages": messages,
+        "temperature": 0.7,
+        "max_tokens": max_tokens
+    }
+    data = json.dumps(payload, ensure_ascii=False)
+    if not isinstance(data, bytes):
+        data = data.encode("utf-8")
+    return data
+
+
+def timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = clock()
+        fn()
+        elapsed = clock() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serialisation payload chat")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--every", type=int, default=20, help="Afficher un tour sur N")
+    args = parser.parse_args()
+
+    system_message = {"role": "system", "content": SYSTEM_PROMPT}
+    history = []
+    # Un builder par repetition, chacun avance tour par tour comme le bridge
+    builders = [PayloadBuilder() for _ in range(args.repeat)]
+
+    print("%6s %10s %12s %14s %9s" % ("tour", "octets", "complet (us)", "incremental (us)", "gain"))
+    for turn in range(1, args.turns + 1):
+        history.append({"role": "user", "content": USER_TEXT + str(turn)})
+        messages = [system_message] + history
+
+        naive = timed(lambda: naive_body(messages, 350), args.repeat)
+        incremental = None
+        for builder in builders:
+            start = clock()
+            body = builder.build(messages, model="llama-3.3-70b-versatile", temperature=0.7, max_tokens=350)
+            elapsed = clock() - start
+            incremental = elapsed if incremental is None else min(incremental, elapsed)
+
+        assert json.loads(body.decode("utf-8")) == json.loads(naive_body(messages, 350).decode("utf-8"))
+
+        if turn == 1 or turn % args.every == 0:
+            print("%6d %10d %12.1f %14.1f %8.1fx" % (
+                turn, len(body), naive * 1e6, incremental * 1e6,
+                naive / incremental if incremental else 0.0))
+
+        history.append({"role": "assistant", "content": ASSISTANT_TEXT})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+"""
+Minutage a blanc des choregraphies (Python 2.7 / 3)
+
+Sans robot: compile choreographies.json, estime la duree de chaque
+comportement (parole comprise) et verifie butees, instants et vitesses.
+
+    python choreography_tool.py                     # durees + validation
+    python choreography_tool.py --show scratch_head # ligne de temps detaillee
+    python choreography_tool.py --lang en --speed 90
+
+Code de sortie 1 si une choregraphie est invalide.
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys
+
+from nao_choreography_py27 import DEFAULT_CHOREOGRAPHY_PATH, ChoreographyLibrary, estimate
+from nao_gesture_library_py27 import SPEED_MARGIN
+
+
+def print_timings(library, lang, speed):
+    print("%-15s %8s %8s %8s %7s" % ("Choregraphie", "Raideur", "Moteurs", "Total", "Appels"))
+    for name in sorted(library.choreographies):
+        result = estimate(library.get(name), lang, speed)
+        print("%-15s %7.2fs %7.2fs %7.2fs %7d" % (
+            name, result["settle_s"], result["motion_s"], result["duration_s"], result["calls"]))
+
+
+def print_timeline(library, name, lang, speed):
+    choreography = library.get(name)
+    if choreography is None:
+        print("X Choregraphie inconnue: %s" % name)
+        return False
+    result = estimate(choreography, lang, speed)
+    print("%s: %s" % (name, choreography.description))
+    if choreography.stiffness:
+        print("  raideur %s puis %.2fs d'attente" % (
+            ", ".join("%s=%.1f" % item for item in choreography.stiffness), result["settle_s"]))
+    for t, kind, label in result["timeline"]:
+        print("  %6.2fs  %-6s %s" % (t, kind, label))
+    if choreography.release:
+        print("  %6.2fs  relacher %s" % (choreography.duration, ", ".join(choreography.release)))
+    print("Duree estimee %.2fs, %d appels NAOqi" % (result["duration_s"], result["calls"]))
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Minutage et validation des choregraphies NAO")
+    parser.add_argument("--file", default=DEFAULT_CHOREOGRAPHY_PATH, help="Choregraphies JSON")
+    parser.add_argument("--speed-margin", type=float, default=SPEED_MARGIN,
+                        help="Part de la vitesse maximale autorisee (0-1)")
+    parser.add_argument("--lang", default="fr", help="Langue des reperes TTS (fr, en)")
+    parser.add_argument("--speed", type=int, default=100, help="Vitesse TTS (100 = normal)")
+    parser.add_argument("--show", default="", help="Afficher la ligne de temps d'une choregraphie")
+    args = parser.parse_args(argv)
+
+    try:
+        library = ChoreographyLibrary.load(args.file)
+    except (IOError, ValueError) as e:
+        print("X Choregraphies invalides: %s" % str(e))
+        return 1
+
+    if args.show:
+        return 0 if print_timeline(library, args.show, args.lang, args.speed) else 1
+
+    print_timings(library, args.lang, args.speed)
+    print()
+    problems = library.validate(args.speed_margin)
+    for problem in problems:
+        print("X %s" % problem)
+    if problems:
+        print("%d probleme(s) dans %s" % (len(problems), args.file))
+        return 1
+    print("OK %d choregraphies valides" % len(library.choreographies))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
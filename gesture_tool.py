@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""
+Outil hors ligne pour la bibliotheque de gestes (Python 2.7 / 3)
+
+Sans robot: compile gestures.json, affiche la duree de chaque geste et
+verifie butees articulaires, instants et vitesses.
+
+    python gesture_tool.py                  # durees + validation
+    python gesture_tool.py --file mes_gestes.json --speed-margin 0.4
+    python gesture_tool.py --show explain   # arguments ALMotion compiles
+
+Code de sortie 1 si un geste est invalide.
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys
+
+from nao_gesture_library_py27 import DEFAULT_LIBRARY_PATH, SPEED_MARGIN, GestureLibrary
+
+
+def peak_speed(gesture, start_pose):
+    """Vitesse articulaire maximale du geste (rad/s) et articulation concernee"""
+    best = (0.0, "")
+    for joint, times, angles in zip(gesture.names, gesture.times, gesture.angles):
+        previous_time = 0.0
+        previous_angle = start_pose.get(joint)
+        for t, angle in zip(times, angles):
+            if previous_angle is not None and t > previous_time:
+                speed = abs(angle - previous_angle) / (t - previous_time)
+                if speed > best[0]:
+                    best = (speed, joint)
+            previous_time = t
+            previous_angle = angle
+    return best
+
+
+def print_timings(library):
+    start_pose = library.rest_pose()
+    print("%-18s %-10s %8s %7s %7s %14s" % ("Geste", "Type", "Duree", "Joints", "Images", "Vitesse max"))
+    for name, gesture_type, duration, joints, frames in library.timings():
+        speed, joint = peak_speed(library.get(name), start_pose)
+        print("%-18s %-10s %7.2fs %7d %7d %7.2f rad/s %s" % (
+            name, gesture_type, duration, joints, frames, speed, joint))
+
+
+def print_gesture(library, name):
+    gesture = library.get(name)
+    if gesture is None:
+        print("X Geste inconnu: %s" % name)
+        return False
+    print("%s (%s, %s, %.2fs)" % (gesture.name, gesture.gesture_type,
+                                  gesture.interpolation, gesture.duration))
+    print("names  = %r" % gesture.names)
+    print("times  = %r" % gesture.times)
+    if gesture.interpolation == "bezier":
+        print("controls = %r" % gesture.controls)
+    else:
+        print("angles = %r" % gesture.angles)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Durees et validation des gestes NAO")
+    parser.add_argument("--file", default=DEFAULT_LIBRARY_PATH, help="Bibliotheque JSON")
+    parser.add_argument("--speed-margin", type=float, default=SPEED_MARGIN,
+                        help="Part de la vitesse maximale autorisee (0-1)")
+    parser.add_argument("--show", default="", help="Afficher les arguments compiles d'un geste")
+    args = parser.parse_args(argv)
+
+    try:
+        library = GestureLibrary.load(args.file)
+    except (IOError, ValueError) as e:
+        print("X Bibliotheque invalide: %s" % str(e))
+        return 1
+
+    if args.show:
+        return 0 if print_gesture(library, args.show) else 1
+
+    print_timings(library)
+    print()
+    problems = library.validate(args.speed_margin)
+    for problem in problems:
+        print("X %s" % problem)
+    if problems:
+        print("%d probleme(s) dans %s" % (len(problems), args.file))
+        return 1
+    print("OK %d gestes valides (%s)" % (len(library.gestures), ", ".join(sorted(library.by_type))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
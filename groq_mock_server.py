@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+
+"""
+Serveur local imitant l'API Groq (compatible OpenAI) pour les tests de charge
+
+Endpoints utilises par le bridge et VoiceConversation:
+- POST /openai/v1/chat/completions (avec "stream": true en SSE)
+- POST /openai/v1/audio/transcriptions
+- GET  /openai/v1/models (prechauffage des connexions)
+
+Latence, debit de tokens, taux d'erreur et reponses sont configurables.
+Pointer le bridge dessus via le .env:
+    GROQ_API_URL=http://127.0.0.1:8090/openai/v1/chat/completions
+    GROQ_TRANSCRIPTION_URL=http://127.0.0.1:8090/openai/v1/audio/transcriptions
+
+Lancer:
+    python groq_mock_server.py --port 8090 --latency 0.3 --token-rate 200
+"""
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_RESPONSES = [
+    "Je suis NAO, un petit robot humanoide. J'aime beaucoup discuter avec les visiteurs!",
+    "Je peux parler, bouger mes bras et suivre ton visage. Pose-moi une question!",
+    "C'est une tres bonne question. Je reflechis souvent a ce genre de choses.",
+]
+
+
+class MockConfig(object):
+    """Parametres de simulation partages par les requetes"""
+
+    def __init__(self, args):
+        self.latency = args.latency
+        self.jitter = args.jitter
+        self.token_rate = args.token_rate
+        self.error_rate = args.error_rate
+        self.error_status = args.error_status
+        self.transcript = args.transcript
+        self.transcription_latency = args.transcription_latency
+        self.responses = DEFAULT_RESPONSES
+        self.keyword_responses = {}
+        if args.responses:
+            with open(args.responses, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self.keyword_responses = data
+            else:
+                self.responses = data
+        self._cycle = itertools.cycle(self.responses)
+        self._lock = threading.Lock()
+        self.counts = {"chat": 0, "stream": 0, "transcription": 0, "errors": 0}
+
+    def pick_response(self, messages):
+        user_text = ""
+        for message in reversed(messages):
+            if message.get("role") == "user":
+                user_text = message.get("content", "").lower()
+                break
+        for keyword, answer in self.keyword_responses.items():
+            if keyword.lower() in user_text:
+                return answer
+        with self._lock:
+            return next(self._cycle)
+
+    def delay(self):
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+
+def _tokens(text):
+    # Decoupage grossier en "tokens": mots avec leur espace
+    words = text.split(" ")
+    return [w + (" " if i < len(words) - 1 else "") for i, w in enumerate(words)]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None
+
+    def log_message(self, fmt, *args):
+        print("[mock] %s - %s" % (self.address_string(), fmt % args))
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _maybe_fail(self):
+        if random.random() < self.config.error_rate:
+            self.config.count("errors")
+            time.sleep(self.config.delay())
+            self._send_json(self.config.error_status,
+                            {"error": {"message": "mock error", "type": "server_error"}})
+            return True
+        return False
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [
+                {"id": "llama-3.3-70b-versatile", "object": "model"},
+                {"id": "llama-3.1-8b-instant", "object": "model"},
+                {"id": "whisper-large-v3", "object": "model"},
+            ]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path.endswith("/chat/completions"):
+            self._chat(body)
+        elif self.path.endswith("/audio/transcriptions"):
+            self._transcription()
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def _chat(self, body):
+        try:
+            request = json.loads(body.decode("utf-8"))
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid JSON"}})
+            return
+        if self._maybe_fail():
+            return
+
+        answer = self.config.pick_response(request.get("messages", []))
+        tokens = _tokens(answer)
+        max_tokens = int(request.get("max_tokens") or len(tokens))
+        finish_reason = "stop"
+        if len(tokens) > max_tokens:
+            tokens = tokens[:max_tokens]
+            finish_reason = "length"
+        model = request.get("model", "mock")
+        completion_id = "chatcmpl-%s" % uuid.uuid4().hex[:12]
+        per_token = 1.0 / self.config.token_rate if self.config.token_rate > 0 else 0.0
+
+        # Temps jusqu'au premier token
+        time.sleep(self.config.delay())
+
+        if request.get("stream"):
+            self.config.count("stream")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for index, token in enumerate(tokens):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"role": "assistant", "content": token} if index == 0 else {"content": token},
+                        "finish_reason": None,
+                    }],
+                }
+                self._write_chunk("data: %s\n\n" % json.dumps(chunk, ensure_ascii=False))
+                time.sleep(per_token)
+            final = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}],
+            }
+            self._write_chunk("data: %s\n\n" % json.dumps(final))
+            self._write_chunk("data: [DONE]\n\n")
+            self._write_chunk("")
+            return
+
+        self.config.count("chat")
+        time.sleep(per_token * len(tokens))
+        prompt_tokens = sum(len(m.get("content", "")) // 4 for m in request.get("messages", []))
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": finish_reason,
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(tokens),
+                "total_tokens": prompt_tokens + len(tokens),
+            },
+        })
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(("%x\r\n" % len(data)).encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _transcription(self):
+        if self._maybe_fail():
+            return
+        self.config.count("transcription")
+        time.sleep(self.config.transcription_latency)
+        self._send_json(200, {"text": self.config.transcript})
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serveur local compatible API Groq/OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.3,
+                        help="Delai avant le premier token (s)")
+    parser.add_argument("--jitter", type=float, default=0.05,
+                        help="Variation aleatoire du delai (+/- s)")
+    parser.add_argument("--token-rate", type=float, default=250.0,
+                        help="Debit de generation (tokens/s, 0 = instantane)")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Proportion de requetes en erreur (0-1)")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--responses", default="",
+                        help="Fichier JSON: liste de reponses ou {mot-cle: reponse}")
+    parser.add_argument("--transcript", default="Comment tu t'appelles?",
+                        help="Texte renvoye par la transcription")
+    parser.add_argument("--transcription-latency", type=float, default=0.4)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    MockHandler.config = MockConfig(args)
+    server = ThreadingHTTPServer((args.host, args.port), MockHandler)
+    print("[mock] API Groq simulee sur http://%s:%d/openai/v1 "
+          "(latence %.2fs, %.0f tokens/s, erreurs %.0f%%)" % (
+              args.host, args.port, args.latency, args.token_rate, args.error_rate * 100))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("[mock] arrete - requetes: %s" % MockHandler.config.counts)
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+"""
+Client du bridge NAOqi Python 2.7 pour l'application Streamlit (Python 3)
+
+Le bridge est un processus fils qui echange des lignes JSON sur
+stdin/stdout. Un thread lecteur lit stdout en continu et pousse chaque
+evenement (logs, progression, reponses) dans une file: les commandes
+partent sans attendre leur reponse, et l'interface depile les evenements
+a son rythme, sans jamais bloquer sur readline().
+"""
+
+import json
+import queue
+import subprocess
+import threading
+
+
+class BridgeClient(object):
+    """Processus bridge + thread lecteur
+
+    Args:
+        command: Ligne de commande du bridge ([python27, script])
+        events: File ou pousser les evenements (queue.Queue)
+        env, cwd: Environnement et dossier du processus
+    """
+
+    def __init__(self, command, events=None, env=None, cwd=None):
+        self.command = command
+        self.events = events if events is not None else queue.Queue()
+        self.env = env
+        self.cwd = cwd
+        self.process = None
+        self._reader = None
+        self._write_lock = threading.Lock()
+
+    def start(self):
+        self.process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=self.env,
+            cwd=self.cwd
+        )
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+        return self
+
+    def _read(self):
+        for raw in iter(self.process.stdout.readline, b""):
+            line = raw.decode("utf-8", errors="ignore").strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                # Sortie hors protocole (print d'une bibliotheque): simple log
+                data = {"action": "log", "success": True, "data": {"message": line}, "logs": [line]}
+            self.events.put(data)
+        self.events.put({"action": "bridge_exit", "success": False, "data": {}, "logs": []})
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def submit(self, action, params=None):
+        """Envoyer une commande sans attendre la reponse
+
+        Returns:
+            True si la commande a ete ecrite sur stdin du bridge
+        """
+        if not self.alive():
+            return False
+        command = json.dumps({"action": action, "params": params or {}}) + "\n"
+        try:
+            with self._write_lock:
+                self.process.stdin.write(command.encode("utf-8"))
+                self.process.stdin.flush()
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def stop(self, timeout=5):
+        """Quitter proprement (commande quit), sinon tuer le processus"""
+        if not self.alive():
+            return
+        self.submit("quit")
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
@@ -51,6 +51,9 @@ class LogCapture:
 # On capture stderr pour les logs NAOqi
 original_stderr = sys.stderr
 
+# Les logs peuvent venir de threads d'arriere-plan: une ligne JSON a la fois
+stdout_lock = threading.Lock()
+
 def send_response(action, success, data=None, logs=None):
     """Envoyer une reponse JSON sur stdout"""
     response = {
@@ -60,8 +63,9 @@ def send_response(action, success, data=None, logs=None):
         "logs": logs or []
     }
     line = json.dumps(response)
-    sys.stdout.write(line + "\n")
-    sys.stdout.flush()
+    with stdout_lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
 
 def send_log(message):
     """Envoyer un log en temps reel"""
@@ -72,8 +76,9 @@ def send_log(message):
         "logs": [message]
     }
     line = json.dumps(response)
-    sys.stdout.write(line + "\n")
-    sys.stdout.flush()
+    with stdout_lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
 
 
 # Variable globale pour l'instance de conversation
@@ -115,12 +120,19 @@ def handle_connect(params):
             "audio_player": ALProxy(str("ALAudioPlayer"), nao_ip, nao_port),
             "groq_api_key": env_vars.get("GROQ_API_KEY", ""),
             "llm_model": env_vars.get("LLM_MODEL", "llama-3.3-70b-versatile"),
-            "groq_api_url": "https://api.groq.com/openai/v1/chat/completions",
-            "conversation_history": [],
+            "groq_api_url": env_vars.get("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions"),
+            "groq_transcription_url": env_vars.get("GROQ_TRANSCRIPTION_URL", "https://api.groq.com/openai/v1/audio/transcriptions"),
+            "context": None,
             "tracking_active": False,
             "use_expressive_gestures": True,
             "silence_threshold": 1100,
             "silence_duration": 1.5,
+            "tts_speed": int(env_vars.get("TTS_SPEED", "100")),
+            # Reponse LLM en streaming: texte partiel envoye a l'interface
+            "llm_stream": env_vars.get("LLM_STREAM", "1") == "1",
+            "target_speaking_s": float(env_vars.get("SPEAKING_TIME_TARGET", "30")),
+            # Temps moyen par phrase hors parole (pause TTS + ecart geste)
+            "sentence_overhead_s": float(env_vars.get("SENTENCE_OVERHEAD", "0.8")),
             "language": str(params.get("language", env_vars.get("NAO_LANGUAGE", "fr"))),
             "system_prompt_fr": env_vars.get("SYSTEM_PROMPT_FR", "Tu es NAO, un robot assistant sympathique et serviable. Reponds de maniere concise et naturelle en francais. Garde tes reponses pas trop longues mais avec quelques explications car elles seront prononcees par un robot."),
             "system_prompt_en": env_vars.get("SYSTEM_PROMPT_EN", "You are NAO, a friendly and helpful robot assistant. Respond concisely and naturally in English. Keep your answers not too long but with some explanations as they will be spoken by a robot."),
@@ -128,20 +140,73 @@ def handle_connect(params):
             "greeting_en": env_vars.get("GREETING_EN", "Hello! I am NAO, a robot assistant. Nice to meet you! How can I help you?"),
         }
         
+        from nao_context_py27 import ConversationContext
+        from nao_gestures_py27 import GestureWorker, GesturePlanner, GestureScheduler
+        from nao_cache_py27 import ResponseCache
+        from nao_router_py27 import build_default_router
+        from nao_payload_py27 import PayloadBuilder
+        from nao_gesture_library_py27 import GestureLibrary
+        from nao_motion_py27 import MotionFacade
+        from nao_phrase_cache_py27 import PhraseCache
+        from nao_tts_queue_py27 import SpeechQueue
+        from nao_choreography_py27 import ChoreographyLibrary, ChoreographyPlayer
+        conversation["context"] = ConversationContext(
+            token_budget=int(env_vars.get("CONTEXT_TOKEN_BUDGET", "1500")),
+            summarize_fn=_summarize_turns)
+        conversation["response_cache"] = ResponseCache(
+            path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "response_cache.json"),
+            max_entries=int(env_vars.get("RESPONSE_CACHE_SIZE", "200")),
+            ttl=float(env_vars.get("RESPONSE_CACHE_TTL", str(7 * 24 * 3600))))
+        send_log("OK Cache de reponses: %d entrees" % conversation["response_cache"].stats()["entries"])
+        conversation["payload_builder"] = PayloadBuilder()
+        conversation["gesture_worker"] = GestureWorker(log_fn=send_log)
+        conversation["gesture_planner"] = GesturePlanner()
+        conversation["motion_facade"] = MotionFacade(conversation["motion"])
+        conversation["gestures"] = GestureLibrary.load(env_vars.get("GESTURES_FILE") or None)
+        conversation["gesture_scheduler"] = GestureScheduler(
+            conversation["gestures"], max_gap_s=float(env_vars.get("SENTENCE_MAX_GAP", "0.3")))
+        send_log("OK Gestes compiles: %d (%s)" % (
+            len(conversation["gestures"].gestures), ", ".join(sorted(conversation["gestures"].by_type))))
+        conversation["choreographies"] = ChoreographyLibrary.load(env_vars.get("CHOREOGRAPHY_FILE") or None)
+        conversation["choreography_player"] = ChoreographyPlayer(
+            conversation["motion_facade"], conversation["tts"], conversation["leds"], log_fn=send_log)
+        conversation["llm_router"] = build_default_router(
+            env_vars, conversation["groq_api_key"], conversation["groq_api_url"], log_fn=send_log)
+        send_log("OK Backends LLM: %s" % ", ".join(
+            "%s (%s)" % (b.name, b.model) for b in conversation["llm_router"].backends))
+        
         # Configurer la langue du TTS
         lang = conversation["language"]
         tts_lang = "French" if lang == "fr" else "English"
         conversation["tts"].setLanguage(str(tts_lang))
         conversation["tts"].setVolume(0.8)
+        conversation["tts"].setParameter("speed", float(conversation["tts_speed"]))
         send_log("OK Langue configuree: %s" % tts_lang)
         
+        # Phrases fixes pre-synthetisees sur le robot (en arriere-plan)
+        conversation["phrase_cache"] = PhraseCache(
+            conversation["tts"], conversation["audio_player"],
+            path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "phrase_cache.json"),
+            remote_dir=env_vars.get("PHRASE_CACHE_DIR", "/home/nao"),
+            max_entries=int(env_vars.get("PHRASE_CACHE_SIZE", "60")),
+            learn_after=int(env_vars.get("PHRASE_LEARN_AFTER", "3")),
+            log_fn=send_log)
+        _prerender_phrases()
+        
+        # Phrases soumises une a une (tts.post.say), avec look-ahead
+        conversation["speech_queue"] = SpeechQueue(
+            conversation["tts"], lookahead=int(env_vars.get("SPEECH_LOOKAHEAD", "1")),
+            progress_fn=_send_speech_progress, log_fn=send_log)
+        
         send_log("OK Connexion etablie avec succes!")
         
         # Verifier Groq
         if not conversation["groq_api_key"]:
             send_log("ATTENTION: GROQ_API_KEY non trouve dans .env")
         else:
-            send_log("OK Configuration Groq valide (Modele: %s)" % conversation["llm_model"])
+            send_log("OK Configuration Groq valide (Modele: %s, API: %s)" % (
+                conversation["llm_model"], conversation["groq_api_url"]))
+            _warm_up_http(conversation)
         
         send_response("connect", True, {"message": "Connecte a NAO"})
         
@@ -150,10 +215,103 @@ def handle_connect(params):
         send_response("connect", False, {"error": str(e)})
 
 
+def _prerender_phrases():
+    """Pre-synthetiser accueil, incomprehension, erreurs et au revoir pour la langue courante"""
+    from nao_phrase_cache_py27 import fixed_phrases
+    from nao_llm_client_py27 import FALLBACK_ANSWERS
+    
+    lang = conversation["language"]
+    greeting = conversation.get("greeting_%s" % lang, "")
+    if isinstance(greeting, str):
+        greeting = greeting.decode('utf-8', 'ignore')
+    cache = conversation["phrase_cache"]
+    cache.set_voice(lang, conversation["tts_speed"])
+    cache.prerender(fixed_phrases(lang, [greeting, FALLBACK_ANSWERS.get(lang, FALLBACK_ANSWERS["en"])]))
+    send_log("OK Cache audio: %d phrases pretes" % cache.stats()["entries"])
+
+
+def _say_plain(text):
+    """Dire le texte sans gestes (fichier pre-synthetise si disponible)"""
+    cache = conversation["phrase_cache"]
+    with cache.speaking():
+        if cache.speak(text):
+            send_log(">>> Phrase jouee depuis le cache audio")
+        else:
+            conversation["tts"].say(text.encode('utf-8'))
+    cache.observe(text)
+
+
+def _warm_up_http(conv):
+    """Pre-ouvrir les connexions Groq en arriere-plan"""
+    def warm():
+        try:
+            from nao_http_py27 import get_session_pool
+            results = get_session_pool().warm_up(
+                [str(conv["groq_api_url"]), str(conv["groq_transcription_url"])],
+                str(conv["groq_api_key"]))
+            for url, result in results.items():
+                if "error" in result:
+                    send_log("X Prechauffage HTTP %s: %s" % (url, result["error"]))
+                else:
+                    send_log("OK Connexion HTTP prechauffee (%.3fs): %s" % (result["total_s"], url))
+        except Exception as e:
+            send_log("X Prechauffage HTTP: %s" % str(e))
+    
+    t = threading.Thread(target=warm)
+    t.daemon = True
+    t.start()
+
+
+def _summarize_turns(previous_summary, turns):
+    """Replier des anciens tours dans le resume (appele en arriere-plan)"""
+    from nao_http_py27 import get_session_pool
+    
+    conv = conversation
+    if not conv or not conv["groq_api_key"]:
+        return None
+    
+    if conv.get("language", "fr") == "fr":
+        instruction = ("Resume en 3 phrases maximum cette conversation entre un utilisateur et NAO, "
+                       "en gardant les faits utiles pour la suite (noms, sujets, demandes).")
+    else:
+        instruction = ("Summarize this conversation between a user and NAO in at most 3 sentences, "
+                       "keeping facts useful later (names, topics, requests).")
+    
+    transcript = "\n".join("%s: %s" % (t["role"], t["content"]) for t in turns)
+    if previous_summary:
+        transcript = previous_summary + "\n" + transcript
+    
+    payload = json.dumps({
+        "model": str(conv["llm_model"]),
+        "messages": [
+            {"role": "system", "content": instruction},
+            {"role": "user", "content": transcript}
+        ],
+        "temperature": 0.2,
+        "max_tokens": 150
+    }, ensure_ascii=False)
+    if isinstance(payload, unicode):
+        payload = payload.encode('utf-8')
+    
+    response, timing = get_session_pool().post(
+        str(conv["groq_api_url"]),
+        headers={
+            "Authorization": "Bearer %s" % str(conv["groq_api_key"]),
+            "Content-Type": "application/json"
+        },
+        data=payload,
+        timeout=30
+    )
+    if response.status_code != 200:
+        return None
+    return response.json()["choices"][0]["message"]["content"]
+
+
 def handle_listen(params):
     """Gerer l'ecoute et la transcription"""
     global conversation
-    import requests
+    from nao_http_py27 import get_session_pool, format_timing
+    from nao_stage_timing_py27 import StageTimer
     
     if not conversation:
         send_response("listen", False, {"error": "Non connecte"})
@@ -162,6 +320,7 @@ def handle_listen(params):
     max_duration = params.get("max_duration", 10)
     audio_file = "/tmp/temp_audio.wav"
     local_audio_file = "temp_audio.wav"
+    timer = StageTimer()
     
     try:
         # Arreter tout enregistrement en cours
@@ -181,8 +340,7 @@ def handle_listen(params):
         
         # Face tracking
         try:
-            conversation["motion"].setStiffnesses("Head", 1.0)
-            time.sleep(0.2)
+            conversation["motion_facade"].set_stiffness([("Head", 1.0)], settle=0.2)
             conversation["face_detection"].setParameter("Period", 500)
             conversation["face_detection"].enableTracking(True)
             conversation["tracker"].setMode("Head")
@@ -252,10 +410,9 @@ def handle_listen(params):
         try:
             conversation["tracker"].stopTracker()
             conversation["tracker"].unregisterAllTargets()
-            conversation["motion"].setAngles("HeadYaw", 0.0, 0.3)
-            conversation["motion"].setAngles("HeadPitch", 0.0, 0.3)
+            conversation["motion_facade"].set_angles([("HeadYaw", 0.0), ("HeadPitch", 0.0)], 0.3)
             time.sleep(0.3)
-            conversation["motion"].setStiffnesses("Head", 0.0)
+            conversation["motion_facade"].release(["Head"])
             conversation["tracking_active"] = False
         except:
             pass
@@ -268,32 +425,41 @@ def handle_listen(params):
         
         # Arreter l'enregistrement
         conversation["audio_recorder"].stopMicrophonesRecording()
+        stop_time = time.time()
         send_log(">>> Enregistrement termine")
+        # Parole jusqu'au debut du silence, puis attente de la fin de parole
+        if silence_start_time is not None:
+            timer.mark("capture", start_time, silence_start_time)
+            timer.mark("end_of_speech", silence_start_time, stop_time)
+        else:
+            timer.mark("capture", start_time, stop_time)
         
         # Telecharger le fichier audio
         send_log(">>> Telechargement de l'audio...")
         import paramiko
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(conversation["nao_ip"], username='nao', password='nao')
-        sftp = ssh.open_sftp()
-        sftp.get(audio_file, local_audio_file)
-        sftp.close()
-        ssh.close()
+        with timer.measure("audio_transfer"):
+            ssh = paramiko.SSHClient()
+            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            ssh.connect(conversation["nao_ip"], username='nao', password='nao')
+            sftp = ssh.open_sftp()
+            sftp.get(audio_file, local_audio_file)
+            sftp.close()
+            ssh.close()
         
         # Transcrire avec Groq Whisper
         send_log(">>> Transcription avec Groq Whisper...")
-        url = "https://api.groq.com/openai/v1/audio/transcriptions"
+        url = str(conversation["groq_transcription_url"])
         headers = {"Authorization": "Bearer %s" % conversation["groq_api_key"]}
         
         whisper_lang = str(conversation.get("language", "fr"))
-        with open(local_audio_file, 'rb') as f:
+        with timer.measure("transcription"), open(local_audio_file, 'rb') as f:
             files = {
                 'file': ('audio.wav', f, 'audio/wav'),
                 'model': (None, 'whisper-large-v3'),
                 'language': (None, whisper_lang)
             }
-            response = requests.post(url, headers=headers, files=files, timeout=30)
+            response, timing = get_session_pool().post(url, headers=headers, files=files, timeout=30)
+        send_log(format_timing("whisper", timing))
         
         # Nettoyer
         try:
@@ -305,99 +471,127 @@ def handle_listen(params):
             result = response.json()
             transcription = result.get('text', '')
             send_log(">>> Texte reconnu: '%s'" % transcription)
-            send_response("listen", True, {"transcription": transcription})
+            if transcription.strip() and params.get("think_after"):
+                _start_thinking()
+            send_log(">>> Etapes ecoute: %s" % timer.summary())
+            send_response("listen", True, {"transcription": transcription, "timing": timing,
+                                           "stages": timer.stages})
         else:
             send_log("X Erreur Whisper API (code %d)" % response.status_code)
-            send_response("listen", False, {"error": "Erreur transcription"})
+            send_response("listen", False, {"error": "Erreur transcription", "stages": timer.stages})
         
     except Exception as e:
         send_log("X Erreur ecoute: %s" % str(e))
-        send_response("listen", False, {"error": str(e)})
+        send_response("listen", False, {"error": str(e), "stages": timer.stages})
+
+
+# Etat de l'animation de reflexion en arriere-plan (started: debut, pour
+# l'etape "thinking" rendue avec la reponse)
+thinking = {"behaviour": None, "started": None, "stage": None}
+
+
+def _motors_busy():
+    """Parole ou nouvelle reflexion en cours: les bras restent raides"""
+    return ((speech_thread is not None and speech_thread.is_alive())
+            or thinking["behaviour"] is not None)
+
+
+def _start_thinking():
+    """Lancer l'animation de reflexion en arriere-plan (sans bloquer)
+    
+    Entree rapide, grattage en boucle jusqu'a l'arrivee de la reponse,
+    "Heummm" seulement si l'attente depasse THINK_FILLER_AFTER secondes.
+    """
+    from nao_choreography_py27 import LoopingBehaviour
+    
+    if thinking["behaviour"] is not None:
+        return
+    send_log(">>> Animation de reflexion...")
+    choreographies = conversation["choreographies"]
+    behaviour = LoopingBehaviour(
+        conversation["choreography_player"], choreographies.get("think_enter"),
+        choreographies.get("think_scratch"), choreographies.get("think_exit"),
+        filler_text="Heummmmmmmmmmmm",
+        filler_after=float(env_vars.get("THINK_FILLER_AFTER", "2.0")),
+        release=["RArm", "Head"], busy_fn=_motors_busy, log_fn=send_log)
+    thinking["behaviour"] = behaviour
+    thinking["started"] = time.time()
+    thinking["stage"] = None
+    behaviour.start()
+
+
+def _stop_thinking(wait=True):
+    """Quitter la boucle de reflexion; le retour au repos continue en arriere-plan"""
+    behaviour = thinking["behaviour"]
+    if behaviour is None:
+        return
+    thinking["behaviour"] = None
+    elapsed = behaviour.stop(wait)
+    send_log(">>> Reflexion arretee en %d ms (%d cycles%s)" % (
+        elapsed * 1000, behaviour.cycles, ", son" if behaviour.filler_played else ""))
+    started = thinking["started"]
+    thinking["stage"] = {"stage": "thinking", "start": round(started, 4),
+                         "duration_s": round(time.time() - started, 4),
+                         "stop_s": round(elapsed, 4), "cycles": behaviour.cycles}
+
+
+def _thinking_stages():
+    """Etape "thinking" du dernier arret (une seule fois)"""
+    stage, thinking["stage"] = thinking["stage"], None
+    return [stage] if stage else []
 
 
 def handle_think(params):
-    """Animation de reflexion"""
+    """Animation de reflexion (non bloquante, arretee par get_response)"""
     global conversation
     
     if not conversation:
         send_response("think", False, {"error": "Non connecte"})
         return
     
-    try:
-        import math
-        import thread
-        
-        send_log(">>> Animation de reflexion...")
-        
-        conversation["motion"].setStiffnesses("RArm", 1.0)
-        conversation["motion"].setStiffnesses("Head", 1.0)
-        time.sleep(0.2)
-        
-        names = ["RShoulderPitch", "RShoulderRoll", "RElbowYaw", "RElbowRoll", "RWristYaw", "RHand"]
-        angles_up = [-1.22, -0.43, 0.22, 1.39, 0.52, 0.2]
-        conversation["motion"].setAngles(names, angles_up, 0.2)
-        time.sleep(1.0)
-        
-        conversation["motion"].setAngles("HeadPitch", 0.2, 0.3)
-        conversation["motion"].setAngles("HeadYaw", -0.3, 0.3)
-        time.sleep(0.5)
-        
-        try:
-            thread.start_new_thread(conversation["tts"].say, ("Heummmmmmmmmmmm",))
-        except:
-            pass
-        
-        for _ in range(5):
-            conversation["motion"].setAngles("RWristYaw", 0.52, 0.8)
-            conversation["motion"].setAngles("RHand", 0.3, 0.9)
-            time.sleep(0.2)
-            conversation["motion"].setAngles("RWristYaw", 0.8, 0.52)
-            conversation["motion"].setAngles("RHand", 0.5, 0.9)
-            time.sleep(0.2)
-        
-        conversation["motion"].setAngles("RWristYaw", 0.0, 0.3)
-        time.sleep(0.2)
-        conversation["motion"].setAngles("HeadPitch", 0.0, 0.3)
-        conversation["motion"].setAngles("HeadYaw", 0.0, 0.3)
-        time.sleep(0.3)
-        
-        angles_rest = [
-            60.4 * math.pi / 180,
-            -17.0 * math.pi / 180,
-            32.8 * math.pi / 180,
-            88.5 * math.pi / 180,
-            31.6 * math.pi / 180,
-            0.22
-        ]
-        conversation["motion"].setAngles(names, angles_rest, 0.8)
-        time.sleep(1.0)
-        
-        conversation["motion"].setStiffnesses("RArm", 0.0)
-        conversation["motion"].setStiffnesses("Head", 0.0)
-        
-        send_log(">>> Animation terminee")
-        send_response("think", True)
-        
-    except Exception as e:
-        send_log("X Erreur animation: %s" % str(e))
-        try:
-            conversation["motion"].setStiffnesses("RArm", 0.0)
-            conversation["motion"].setStiffnesses("Head", 0.0)
-        except:
-            pass
-        send_response("think", True)
+    _start_thinking()
+    send_response("think", True, {"background": True})
+
+
+def _send_fallback_response(lang, reason, llm_stats, stages=()):
+    """Repondre avec la phrase locale de secours (pas d'echec du tour)
+    
+    Reserve aux echecs passagers (delai, 429 / 5xx, disjoncteur). La
+    reponse entre dans l'historique comme une reponse normale.
+    """
+    from nao_llm_client_py27 import FALLBACK_ANSWERS
+    
+    answer = FALLBACK_ANSWERS.get(lang, FALLBACK_ANSWERS["en"])
+    conversation["context"].add("assistant", answer)
+    send_log("X LLM indisponible (%s): reponse de secours" % reason)
+    send_response("get_response", True, {
+        "response": answer,
+        "fallback": True,
+        "error": reason,
+        "llm_stats": llm_stats,
+        "stages": list(stages) + _thinking_stages()
+    })
+
+
+# Intervalle minimal entre deux textes partiels du LLM (secondes)
+PARTIAL_INTERVAL_S = 0.1
 
 
 def handle_get_response(params):
     """Obtenir une reponse du LLM"""
     global conversation
-    import requests
+    from nao_http_py27 import format_timing
+    from nao_cache_py27 import prompt_version
+    from nao_llm_client_py27 import CircuitOpenError, RETRY_STATUS, is_transient, read_completion
+    from nao_speech_py27 import max_tokens_for_target, target_words, trim_to_target
+    from nao_stage_timing_py27 import StageTimer
     
     if not conversation:
         send_response("get_response", False, {"error": "Non connecte"})
         return
     
     user_input = params.get("text", "")
+    timer = StageTimer()
     
     try:
         # Encoder le texte correctement pour Python 2.7
@@ -409,10 +603,8 @@ def handle_get_response(params):
         send_log(">>> Envoi a Groq LLM: '%s'" % user_input_str)
         send_log(">>> Langue: %s" % conversation.get("language", "fr"))
         
-        conversation["conversation_history"].append({
-            "role": "user",
-            "content": user_input
-        })
+        context = conversation["context"]
+        context.add("user", user_input)
         
         lang = conversation.get("language", "fr")
         prompt_key = "system_prompt_fr" if lang == "fr" else "system_prompt_en"
@@ -424,53 +616,149 @@ def handle_get_response(params):
             "content": system_prompt
         }
         
-        messages = [system_message] + conversation["conversation_history"]
-        
-        headers = {
-            "Authorization": "Bearer %s" % str(conversation["groq_api_key"]),
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": str(conversation["llm_model"]),
-            "messages": messages,
-            "temperature": 0.7,
-            "max_tokens": 350
-        }
-        
-        payload_json = json.dumps(payload, ensure_ascii=False)
-        if isinstance(payload_json, unicode):
-            payload_json = payload_json.encode('utf-8')
-        
-        response = requests.post(
-            str(conversation["groq_api_url"]),
-            headers=headers,
-            data=payload_json,
-            timeout=30
-        )
-        
+        # Question deja connue: repondre sans appel reseau
+        # Cle liee a l'echange precedent: une relance depend de ce qui precede
+        cache = conversation["response_cache"]
+        version = prompt_version(system_prompt, conversation["llm_model"])
+        history = context.recent(2, skip=1)
+        cache_start = time.time()
+        cached_response = cache.get(user_input, lang, version, history)
+        cache_stats = cache.stats()
+        if cached_response:
+            timer.mark("llm", cache_start, cached=True)
+            _stop_thinking()
+            context.add("assistant", cached_response)
+            context.compact()
+            send_log(">>> Cache: reponse trouvee (taux %.0f%%)" % (cache_stats["hit_rate"] * 100))
+            send_response("get_response", True, {
+                "response": cached_response,
+                "cached": True,
+                "cache": cache_stats,
+                "llm_stats": conversation["llm_router"].stats(),
+                "stages": timer.stages + _thinking_stages()
+            })
+            return
+        
+        messages = context.build_messages(system_message, lang)
+        stats = context.stats()
+        send_log(">>> Payload: %d tokens (%d messages, resume %d tokens)" % (
+            stats["payload_tokens"], stats["turns"], stats["summary_tokens"]))
+        
+        # Budget de generation a partir du temps de parole cible
+        target_s = float(params.get("target_speaking_s", conversation["target_speaking_s"]))
+        speed = conversation["tts_speed"]
+        overhead = conversation["sentence_overhead_s"]
+        max_tokens = max_tokens_for_target(target_s, lang, speed, overhead)
+        words = target_words(target_s, lang, speed, overhead)
+        if lang == "fr":
+            length_hint = " Reponds en %d mots maximum." % words
+        else:
+            length_hint = " Answer in at most %d words." % words
+        messages[0] = {"role": "system", "content": system_prompt + length_hint}
+        send_log(">>> Temps de parole cible: %.0fs (max_tokens %d, ~%d mots)" % (target_s, max_tokens, words))
+        
+        # Seuls les nouveaux messages sont serialises a chaque tour
+        builder = conversation["payload_builder"]
+        stream = conversation["llm_stream"]
+        
+        def build_body(model):
+            if stream:
+                return builder.build(messages, model=str(model), temperature=0.7,
+                                     max_tokens=max_tokens, stream=True)
+            return builder.build(messages, model=str(model), temperature=0.7, max_tokens=max_tokens)
+        
+        # Texte partiel vers l'interface, au plus un evenement par intervalle
+        partial = {"sent": 0.0}
+        
+        def on_text(text):
+            now = time.time()
+            if now - partial["sent"] >= PARTIAL_INTERVAL_S:
+                partial["sent"] = now
+                send_response("llm_partial", True, {"text": text})
+        
+        router = conversation["llm_router"]
+        llm_start = time.time()
+        try:
+            response, info = router.post(build_body, on_text=on_text if stream else None)
+        except CircuitOpenError:
+            _stop_thinking()
+            _send_fallback_response(lang, "disjoncteur ouvert", router.stats(),
+                                    [timer.mark("llm", llm_start, fallback=True)])
+            return
+        except Exception as e:
+            if not is_transient(e):
+                raise
+            _stop_thinking()
+            _send_fallback_response(lang, str(e), router.stats(),
+                                    [timer.mark("llm", llm_start, fallback=True)])
+            return
+        timer.mark("llm", llm_start, backend=info["backend"], attempts=info["attempts"])
+        _stop_thinking()
+        
+        timing = info["timing"]
+        llm_stats = router.stats()
         send_log(">>> API status: %d" % response.status_code)
+        send_log(format_timing("chat", timing))
+        if info["hedged"] or info["attempts"] > 1:
+            send_log(">>> Requete LLM: %d tentative(s)%s" % (
+                info["attempts"], ", doublon envoye" if info["hedged"] else ""))
+        send_log(">>> Latence LLM %s: p50 %.2fs / p95 %.2fs (disjoncteur %s)" % (
+            info["backend"], llm_stats.get("p50_s", 0.0), llm_stats.get("p95_s", 0.0), llm_stats["breaker"]))
         
         if response.status_code == 200:
-            result = response.json()
-            llm_response = result["choices"][0]["message"]["content"]
+            if "content" in info:
+                llm_response, finish_reason = info["content"], info["finish_reason"]
+            else:
+                llm_response, finish_reason = read_completion(response)
+            truncated = finish_reason == "length"
+            llm_response, speaking_s, cut = trim_to_target(
+                llm_response, target_s, lang, speed, overhead, drop_incomplete=truncated)
+            if cut:
+                send_log(">>> Reponse coupee a une fin de phrase (%.1fs de parole estimes)" % speaking_s)
+            else:
+                send_log(">>> Temps de parole estime: %.1fs" % speaking_s)
             
-            conversation["conversation_history"].append({
-                "role": "assistant",
-                "content": llm_response
-            })
+            context.add("assistant", llm_response)
+            # Seules les reponses du modele principal sont gardees: un repli
+            # (petit modele, serveur local) serait rejoue sous sa cle
+            if info.get("model") == conversation["llm_model"]:
+                cache.put(user_input, lang, version, llm_response, history)
+            if context.compact():
+                send_log(">>> Historique hors budget: resume en arriere-plan")
             
             send_log(">>> Reponse LLM recue")
-            send_response("get_response", True, {"response": llm_response})
+            send_response("get_response", True, {
+                "response": llm_response,
+                "timing": timing,
+                "payload_tokens": stats["payload_tokens"],
+                "cached": False,
+                "cache": cache_stats,
+                "llm_stats": llm_stats,
+                "speaking_s": round(speaking_s, 1),
+                "stages": timer.stages + _thinking_stages()
+            })
+        elif response.status_code in RETRY_STATUS:
+            send_log("X Erreur API Groq (code %d): %s" % (response.status_code, response.text[:200]))
+            _send_fallback_response(lang, "Erreur API Groq code %d" % response.status_code, llm_stats,
+                                    timer.stages)
         else:
+            # 4xx: cle API, modele ou requete invalide, a corriger cote configuration
             send_log("X Erreur API Groq (code %d): %s" % (response.status_code, response.text[:200]))
-            send_response("get_response", False, {"error": "Erreur API Groq code %d" % response.status_code})
+            context.discard_last("user")
+            send_response("get_response", False, {
+                "error": "Erreur API Groq code %d" % response.status_code,
+                "llm_stats": llm_stats,
+                "stages": timer.stages + _thinking_stages()
+            })
         
     except Exception as e:
         import traceback
+        _stop_thinking()
+        if conversation.get("context"):
+            conversation["context"].discard_last("user")
         send_log("X Erreur LLM: %s" % str(e))
         send_log("X Traceback: %s" % traceback.format_exc())
-        send_response("get_response", False, {"error": str(e)})
+        send_response("get_response", False, {"error": str(e), "stages": _thinking_stages()})
 
 
 def handle_speak(params):
@@ -482,6 +770,10 @@ def handle_speak(params):
         return
     
     text = params.get("text", "")
+    _stop_thinking()
+    facade = conversation["motion_facade"]
+    facade.invalidate()
+    facade.begin_answer()
     
     try:
         import random
@@ -494,175 +786,182 @@ def handle_speak(params):
             text = text.decode('utf-8')
         
         # Gestes expressifs
+        speech = {}
         if conversation["use_expressive_gestures"]:
-            _speak_with_gestures(text)
+            speech = _speak_with_gestures(text)
         else:
-            conversation["tts"].say(text.encode('utf-8'))
+            start = time.time()
+            _say_plain(text)
+            speech = {"stages": [{"stage": "speech", "start": round(start, 4),
+                                  "duration_s": round(time.time() - start, 4), "index": 1}]}
         
         # Reset bras
         if conversation["use_expressive_gestures"]:
             _reset_arms_to_rest()
         
-        send_response("speak", True)
+        send_response("speak", True, {"motion_rpc": _log_motion_rpc(), "speech": speech,
+                                      "stages": speech.pop("stages", [])})
         
     except Exception as e:
         send_log("X Erreur parole: %s" % str(e))
         send_response("speak", True)
 
 
-def _detect_gesture_type(text):
-    """Detecter le type de geste"""
-    import random
+def _perform_gesture(gesture, time_scale=1.0):
+    """Effectuer un geste expressif (un seul appel ALMotion asynchrone)
     
-    text_lower = text.lower() if isinstance(text, unicode) else text.decode('utf-8').lower()
-    
-    question_words = [u'pourquoi', u'comment', u'quoi', u'qui', u'o\xf9', u'quand', u'quel', u'quelle', u'?']
-    emphasis_words = [u'important', u'attention', u'!', u'vraiment', u'absolument', u'certainement',
-                     u'tr\xe8s', u'super', u'magnifique', u'incroyable', u'g\xe9nial', u'excellent']
-    explain_words = [u'parce que', u'donc', u'ainsi', u'par exemple', u'c\'est-\xe0-dire', u'en effet',
-                    u'voici', u'voil\xe0', u'regardez', u'comme', u'si', u'alors']
-    
-    for word in emphasis_words:
-        if word in text_lower:
-            return "emphasis"
-    for word in question_words:
-        if word in text_lower:
-            return "question"
-    for word in explain_words:
-        if word in text_lower:
-            return "explain"
-    
-    if random.random() < 0.7:
-        return "neutral"
-    return None
-
-
-def _perform_gesture(gesture_type):
-    """Effectuer un geste expressif"""
+    Le geste part de la pose courante: apres un autre geste, le passage
+    de l'un a l'autre est direct, sans retour au repos.
+    """
     global conversation
-    import random
+    from nao_motion_py27 import GESTURE_STIFFNESS
     
     try:
-        conversation["motion"].setStiffnesses("LArm", 0.8)
-        conversation["motion"].setStiffnesses("RArm", 0.8)
-        conversation["motion"].setStiffnesses("Head", 0.6)
-        conversation["motion"].setStiffnesses("LLeg", 1.0)
-        conversation["motion"].setStiffnesses("RLeg", 1.0)
-        time.sleep(0.1)
-        
-        if gesture_type == "explain":
-            names = ["LShoulderPitch", "LShoulderRoll", "LElbowRoll", "LElbowYaw",
-                    "RShoulderPitch", "RShoulderRoll", "RElbowRoll", "RElbowYaw",
-                    "HeadPitch", "HeadYaw"]
-            angles_mid = [0.0, 0.3, -0.2, -0.4, 0.0, -0.3, 0.2, 0.4, -0.05, 0.0]
-            conversation["motion"].setAngles(names, angles_mid, 0.12)
-            time.sleep(0.5)
-            angles = [-0.2, 0.6, -0.4, -0.8, -0.2, -0.6, 0.4, 0.8, -0.1, 0.0]
-            conversation["motion"].post.setAngles(names, angles, 0.12)
-            
-        elif gesture_type == "question":
-            side = random.choice(["L", "R"])
-            if side == "L":
-                names = ["LShoulderPitch", "LShoulderRoll", "LElbowRoll", "LElbowYaw",
-                        "HeadPitch", "HeadYaw"]
-                angles_mid = [-0.1, 0.3, -0.6, -0.3, 0.05, 0.1]
-                conversation["motion"].setAngles(names, angles_mid, 0.12)
-                time.sleep(0.4)
-                angles = [-0.4, 0.5, -1.2, -0.5, 0.1, 0.2]
-            else:
-                names = ["RShoulderPitch", "RShoulderRoll", "RElbowRoll", "RElbowYaw",
-                        "HeadPitch", "HeadYaw"]
-                angles_mid = [-0.1, -0.3, 0.6, 0.3, 0.05, -0.1]
-                conversation["motion"].setAngles(names, angles_mid, 0.12)
-                time.sleep(0.4)
-                angles = [-0.4, -0.5, 1.2, 0.5, 0.1, -0.2]
-            conversation["motion"].post.setAngles(names, angles, 0.12)
-            
-        elif gesture_type == "emphasis":
-            names = ["LShoulderPitch", "LShoulderRoll", "LElbowRoll",
-                    "RShoulderPitch", "RShoulderRoll", "RElbowRoll",
-                    "HeadPitch", "HeadYaw"]
-            angles = [0.0, 0.3, -0.3, 0.0, -0.3, 0.3, -0.08, 0.0]
-            conversation["motion"].setAngles(names, angles, 0.08)
-            time.sleep(0.5)
-            angles = [-0.2, 0.5, -0.5, -0.2, -0.5, 0.5, -0.15, 0.0]
-            conversation["motion"].setAngles(names, angles, 0.08)
-            time.sleep(0.5)
-            angles = [-0.3, 0.4, -0.6, -0.3, -0.4, 0.6, 0.0, 0.0]
-            conversation["motion"].post.setAngles(names, angles, 0.12)
-            
-        else:  # neutral
-            side = random.choice(["L", "R"])
-            head_yaw = random.choice([-0.15, 0.15])
-            if side == "L":
-                names = ["LShoulderPitch", "LShoulderRoll", "LElbowRoll", "HeadYaw"]
-                angles_mid = [0.0, 0.2, -0.3, head_yaw * 0.5]
-                conversation["motion"].setAngles(names, angles_mid, 0.08)
-                time.sleep(0.4)
-                angles = [-0.2, 0.4, -0.5, head_yaw]
-            else:
-                names = ["RShoulderPitch", "RShoulderRoll", "RElbowRoll", "HeadYaw"]
-                angles_mid = [0.0, -0.2, 0.3, head_yaw * 0.5]
-                conversation["motion"].setAngles(names, angles_mid, 0.08)
-                time.sleep(0.4)
-                angles = [-0.2, -0.4, 0.5, head_yaw]
-            conversation["motion"].post.setAngles(names, angles, 0.08)
+        facade = conversation["motion_facade"]
+        # Aucun appel si les moteurs sont deja dans cet etat (phrase precedente)
+        facade.set_stiffness(GESTURE_STIFFNESS)
+        facade.play(gesture, time_scale=time_scale)
     except:
         pass
 
 
-def _reset_arms_to_rest():
-    """Remettre les bras en position repos"""
+def _reset_arms_to_rest(release=True):
+    """Remettre les bras en position repos
+    
+    Args:
+        release: Relacher les moteurs ensuite (False entre deux phrases:
+            le geste suivant les reactive aussitot)
+    """
     global conversation
     try:
-        names = ["LShoulderPitch", "LShoulderRoll", "LElbowRoll", "LElbowYaw",
-                "RShoulderPitch", "RShoulderRoll", "RElbowRoll", "RElbowYaw",
-                "HeadPitch", "HeadYaw"]
-        
-        angles_mid = [0.3, 0.05, -0.5, -0.3, 0.3, -0.05, 0.5, 0.3, 0.0, 0.0]
-        conversation["motion"].setAngles(names, angles_mid, 0.12)
-        time.sleep(0.5)
-        
-        angles = [1.0, 0.1, -1.0, -0.5, 1.0, -0.1, 1.0, 0.5, 0.0, 0.0]
-        conversation["motion"].setAngles(names, angles, 0.12)
-        time.sleep(0.8)
-        
-        conversation["motion"].setStiffnesses("LArm", 0.0)
-        conversation["motion"].setStiffnesses("RArm", 0.0)
-        conversation["motion"].setStiffnesses("Head", 0.0)
-        conversation["motion"].setStiffnesses("LLeg", 0.0)
-        conversation["motion"].setStiffnesses("RLeg", 0.0)
+        facade = conversation["motion_facade"]
+        # Trajectoire complete en un appel, bloquant avant de relacher les moteurs
+        facade.play(conversation["gestures"].get("rest"), wait=True)
+        
+        if release:
+            facade.release()
     except:
         pass
 
 
+def _log_motion_rpc():
+    """Journaliser les appels ALMotion de la reponse (envoyes / evites)"""
+    stats = conversation["motion_facade"].answer_stats()
+    send_log(">>> RPC moteur: %d envoyes, %d evites (sur %d)" % (
+        stats["rpc"], stats["saved"], stats["naive_rpc"]))
+    return stats
+
+
+def _send_speech_progress(progress):
+    """Progression de la parole (phrase en cours) pour l'interface"""
+    send_response("speech_progress", True, progress)
+
+
 def _speak_with_gestures(text):
-    """Parler avec gestes aux phrases completes"""
+    """Parler avec gestes: phrases en file TTS, geste au debut de chaque phrase
+    
+    Returns:
+        dict de SpeechQueue.speak (phrases dites, annulation...) et stages
+        (duree de chaque phrase, envoi de chaque geste)
+    """
     global conversation
-    import re
+    from nao_stage_timing_py27 import StageTimer
     
-    sentences = re.split(r'([.!?])', text)
+    worker = conversation["gesture_worker"]
+    scheduler = conversation["gesture_scheduler"]
     
-    for i, segment in enumerate(sentences):
-        segment = segment.strip()
-        if not segment:
-            continue
-        
-        if segment in ['.', '!', '?']:
-            _reset_arms_to_rest()
-            time.sleep(0.4)
-            continue
-        
-        gesture_type = _detect_gesture_type(segment)
-        if gesture_type:
-            send_log(">>> Geste: %s" % gesture_type)
-            _perform_gesture(gesture_type)
+    # Tous les gestes planifies avant de parler, en une passe sur la reponse,
+    # puis tenus dans le budget d'ecart entre debut de phrase et geste
+    start = time.time()
+    cues = scheduler.schedule(conversation["gesture_planner"].plan(text),
+                              conversation["language"], conversation["tts_speed"])
+    send_log(">>> Plan des gestes (%.2f ms): %s" % ((time.time() - start) * 1000, ", ".join(
+        "%s/%s" % (cue["type"], cue["mode"]) for cue in cues)))
+    
+    setup = {}
+    sentence_starts = {}
+    worker.lags.clear()
+    
+    def gesture_for(index, sentence):
+        cue = cues[index] if index < len(cues) else None
+        if cue is None or cue["gesture"] is None:
+            return None
+        
+        def action():
+            began = time.time()
+            if cue["mode"] == "reset":
+                _reset_arms_to_rest(release=False)
+            _perform_gesture(cue["gesture"], cue["time_scale"])
+            setup[index] = time.time() - began
+        return action, "%s (%s)" % (cue["gesture"].name, cue["mode"])
+    
+    def on_sentence(index, sentence):
+        sentence_starts[index] = time.time()
+        planned = gesture_for(index, sentence)
+        if planned:
+            send_log(">>> Geste: %s (phrase %d)" % (planned[1], index + 1))
+            worker.submit(planned[0], planned[1], key=index)
+    
+    result = {"spoken": 0, "total": len(cues), "cancelled": False}
+    cache = conversation["phrase_cache"]
+    with cache.speaking():
+        if cache.speak(text, on_sentence=on_sentence):
+            send_log(">>> Phrase jouee depuis le cache audio")
+            result["spoken"] = len(cues)
         else:
-            send_log(">>> Geste: neutral")
-            _perform_gesture("neutral")
-        
-        segment_utf8 = segment.encode('utf-8')
-        conversation["tts"].say(segment_utf8)
+            try:
+                result = conversation["speech_queue"].speak(
+                    [cue["sentence"] for cue in cues], on_start=on_sentence)
+                send_log(">>> Debut des phrases (s): %s" % ", ".join(
+                    "%.2f" % t for t in result["starts"]))
+            except Exception as e:
+                # Phrases deja envoyees au TTS (look-ahead) arretees, puis
+                # reprise a la phrase en cours (coupee par l'arret), sans
+                # redire les precedentes
+                conversation["speech_queue"].cancel_all()
+                resume = max(sentence_starts) if sentence_starts else 0
+                remaining = [cue["sentence"] for cue in cues[resume:]]
+                send_log("X File de parole indisponible (%s): parole simple (%d/%d phrases restantes)" % (
+                    str(e), len(remaining), len(cues)))
+                if remaining:
+                    conversation["tts"].say(u" ".join(remaining).encode('utf-8'))
+                result["spoken"] = len(cues)
+        speech_end = time.time()
+        worker.wait_idle()
+    if result["cancelled"]:
+        send_log(">>> Parole interrompue apres %d/%d phrases" % (result["spoken"], result["total"]))
+    else:
+        cache.observe(text)
+    send_log(">>> " + scheduler.report(cues, worker.lags, setup)[1])
+    
+    # Chaque phrase jusqu'au debut de la suivante; geste de l'envoi a la
+    # file jusqu'au depart de la trajectoire
+    timer = StageTimer()
+    ordered = sorted(sentence_starts)
+    for position, index in enumerate(ordered):
+        began = sentence_starts[index]
+        end = sentence_starts[ordered[position + 1]] if position + 1 < len(ordered) else speech_end
+        timer.mark("speech", began, end, index=index + 1)
+        if index in worker.lags and index in setup:
+            timer.mark("gesture", began, began + worker.lags[index] + setup[index], index=index + 1)
+    result["stages"] = timer.stages
+    return result
+
+
+def _cancel_speech():
+    """Arreter la parole en cours (file TTS et fichiers du cache audio)"""
+    if not conversation or not conversation.get("speech_queue"):
+        return False
+    cancelled = conversation["speech_queue"].cancel_all()
+    conversation["phrase_cache"].cancel()
+    return cancelled
+
+
+def handle_cancel_speech(params):
+    """Interrompre NAO (traite pendant qu'il parle)"""
+    cancelled = _cancel_speech()
+    send_log(">>> Parole annulee" if cancelled else ">>> Aucune parole en cours")
+    send_response("cancel_speech", True, {"cancelled": cancelled})
 
 
 def handle_disconnect(params):
@@ -670,23 +969,31 @@ def handle_disconnect(params):
     global conversation
     
     if conversation:
+        _stop_thinking()
+        if conversation.get("gesture_worker"):
+            conversation["gesture_worker"].stop()
+        if conversation.get("phrase_cache"):
+            conversation["phrase_cache"].stop()
         try:
             if conversation.get("tracking_active"):
                 conversation["tracker"].stopTracker()
                 conversation["tracker"].unregisterAllTargets()
-                conversation["motion"].setStiffnesses("Head", 0.0)
         except:
             pass
         
         try:
-            conversation["motion"].setStiffnesses("LArm", 0.0)
-            conversation["motion"].setStiffnesses("RArm", 0.0)
-            conversation["motion"].setStiffnesses("Head", 0.0)
+            conversation["motion_facade"].release(["LArm", "RArm", "Head"], force=True)
         except:
             pass
         
         conversation = None
     
+    try:
+        from nao_http_py27 import get_session_pool
+        get_session_pool().close()
+    except Exception:
+        pass
+    
     send_log(">>> Deconnecte du robot")
     send_response("disconnect", True)
 
@@ -705,6 +1012,7 @@ def handle_set_language(params):
     tts_lang = "French" if lang == "fr" else "English"
     try:
         conversation["tts"].setLanguage(str(tts_lang))
+        _prerender_phrases()
     except:
         pass
     
@@ -731,10 +1039,12 @@ def handle_say_greeting(params):
             text = text.decode('utf-8', 'ignore')
         
         if conversation["use_expressive_gestures"]:
+            conversation["motion_facade"].begin_answer()
             _speak_with_gestures(text)
             _reset_arms_to_rest()
+            _log_motion_rpc()
         else:
-            conversation["tts"].say(text.encode('utf-8'))
+            _say_plain(text)
         
         send_response("say_greeting", True, {"text": text})
     except Exception as e:
@@ -742,6 +1052,24 @@ def handle_say_greeting(params):
         send_response("say_greeting", False, {"error": str(e)})
 
 
+# Commandes de parole: executees dans un thread pour que stdin reste lu
+# (cancel_speech) pendant que NAO parle
+SPEECH_ACTIONS = ("speak", "say_greeting")
+speech_thread = None
+
+
+def _start_speech(handler, params):
+    global speech_thread
+    speech_thread = threading.Thread(target=handler, args=(params,))
+    speech_thread.daemon = True
+    speech_thread.start()
+
+
+def _wait_speech():
+    if speech_thread is not None:
+        speech_thread.join()
+
+
 # Boucle principale - lecture des commandes JSON sur stdin
 def main():
     handlers = {
@@ -776,13 +1104,25 @@ def main():
             action = command.get("action", "")
             params = command.get("params", {})
             
+            # Traite tout de suite, meme pendant que NAO parle
+            if action == "cancel_speech":
+                handle_cancel_speech(params)
+                continue
+            
             if action == "quit":
+                _cancel_speech()
+                _wait_speech()
                 handle_disconnect({})
                 break
             
             handler = handlers.get(action)
             if handler:
-                handler(params)
+                # Les autres commandes attendent la fin de la parole en cours
+                _wait_speech()
+                if action in SPEECH_ACTIONS:
+                    _start_speech(handler, params)
+                else:
+                    handler(params)
             else:
                 send_response("error", False, {"error": "Action inconnue: %s" % action})
         
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+"""
+Cache des reponses LLM pour les questions recurrentes (Python 2.7 / 3)
+
+Cle = question normalisee (casse, accents, ponctuation, mots de
+remplissage) + langue + version du prompt systeme + empreinte de
+l'echange precedent. Une relance ("et pourquoi ?") ne reprend donc une
+reponse que si elle suit le meme echange. Eviction LRU par taille,
+expiration TTL, persistance JSON entre deux redemarrages.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+FILLER_WORDS = {
+    "fr": set([u"euh", u"heu", u"hum", u"hmm", u"bah", u"ben", u"bon", u"alors",
+               u"genre", u"voila", u"enfin", u"nao"]),
+    "en": set([u"um", u"uh", u"erm", u"hmm", u"well", u"so", u"okay",
+               u"ok", u"hey", u"nao", u"please"]),
+}
+
+# Locutions retirees avant le decoupage en mots
+FILLER_PHRASES = {
+    "fr": [u"du coup", u"dis moi", u"dites moi"],
+    "en": [u"you know", u"i mean", u"tell me"],
+}
+
+_PUNCTUATION_RE = re.compile(u"[^\\w\\s]", re.UNICODE)
+_SPACES_RE = re.compile(u"\\s+", re.UNICODE)
+
+
+def _to_unicode(text):
+    if isinstance(text, bytes):
+        return text.decode("utf-8", "ignore")
+    return text
+
+
+def normalize_question(text, lang="fr"):
+    """Forme canonique d'une question pour la cle de cache"""
+    text = _to_unicode(text or u"").lower()
+    text = unicodedata.normalize("NFKD", text)
+    text = u"".join(c for c in text if not unicodedata.combining(c))
+    text = text.replace(u"'", u" ").replace(u"-", u" ")
+    text = _PUNCTUATION_RE.sub(u" ", text)
+    text = _SPACES_RE.sub(u" ", text).strip()
+    for phrase in FILLER_PHRASES.get(lang, []):
+        text = re.sub(u"\\b%s\\b" % phrase, u" ", text)
+    fillers = FILLER_WORDS.get(lang, set())
+    words = [w for w in text.split() if w not in fillers]
+    return u" ".join(words)
+
+
+def prompt_version(system_prompt, model=""):
+    """Empreinte courte du prompt systeme et du modele"""
+    data = _to_unicode(system_prompt or u"") + u"|" + _to_unicode(model or u"")
+    return hashlib.md5(data.encode("utf-8")).hexdigest()[:10]
+
+
+def history_version(turns):
+    """Empreinte courte des tours precedant la question ("" si aucun)"""
+    if not turns:
+        return u""
+    data = u"\n".join(u"%s:%s" % (_to_unicode(t.get("role", u"")),
+                                   normalize_question(t.get("content", u"")))
+                       for t in turns)
+    return hashlib.md5(data.encode("utf-8")).hexdigest()[:10]
+
+
+class ResponseCache(object):
+    """Cache LRU + TTL des reponses, persiste dans un fichier JSON
+
+    Args:
+        path: Fichier de persistance (None = memoire seulement)
+        max_entries: Nombre maximal de reponses gardees
+        ttl: Duree de vie d'une reponse en secondes
+    """
+
+    def __init__(self, path=None, max_entries=200, ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.load()
+
+    def make_key(self, text, lang, version, history=None):
+        return u"%s|%s|%s|%s" % (lang, version, history_version(history),
+                                 normalize_question(text, lang))
+
+    def get(self, text, lang, version, history=None):
+        key = self.make_key(text, lang, version, history)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.time() - entry["created"] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            # LRU: remonter l'entree en fin de liste
+            del self._entries[key]
+            self._entries[key] = entry
+            entry["hits"] = entry.get("hits", 0) + 1
+            self.hits += 1
+            return entry["response"]
+
+    def put(self, text, lang, version, response, history=None):
+        key = self.make_key(text, lang, version, history)
+        if not key.split(u"|", 3)[3]:
+            return
+        with self._lock:
+            if key in self._entries:
+                del self._entries[key]
+            self._entries[key] = {"response": response, "created": time.time(), "hits": 0}
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        self.save()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        now = time.time()
+        with self._lock:
+            for key, entry in data.get("entries", []):
+                if now - entry.get("created", 0) <= self.ttl:
+                    self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {"entries": list(self._entries.items())}
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError):
+            pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self.save()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(float(self.hits) / total, 3) if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+
+"""
+Comportements scenarises de NAO sur une ligne de temps (Python 2.7 / 3)
+
+Une choregraphie regroupe sur une meme ligne de temps:
+- des images cles articulaires {"time": s, "angles": {joint: rad}},
+- des reperes TTS {"time": s, "text": ...},
+- des reperes LEDs {"time": s, "group": ..., "color": "#RRGGBB", "duration": s}.
+
+Elle est compilee une fois au chargement: toutes les articulations partent
+en une seule trajectoire ALMotion (Gesture de nao_gesture_library_py27),
+la raideur en un seul setStiffnesses, et chaque repere TTS / LEDs en un
+appel post. Le minutage des articulations est donc tenu par ALMotion, sans
+setAngles + time.sleep. estimate() donne le minutage sans robot.
+"""
+
+import io
+import json
+import os
+import threading
+import time
+
+from nao_gesture_library_py27 import SPEED_MARGIN, Gesture, check_gesture
+from nao_speech_py27 import estimate_speaking_time
+
+
+DEFAULT_CHOREOGRAPHY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                         "choreographies.json")
+
+
+def parse_color(color):
+    """"#RRGGBB" (ou entier) -> entier 0xRRGGBB pour ALLeds.fadeRGB"""
+    if isinstance(color, int):
+        return color
+    return int(str(color).lstrip("#"), 16)
+
+
+class Choreography(object):
+    """Choregraphie compilee
+
+    Attributes:
+        track: Trajectoire articulaire (Gesture) ou None
+        events: Reperes [(instant, "tts" | "leds", arguments)] tries par instant
+        stiffness: [(chaine, raideur)] appliques avant de commencer
+        release: Chaines relachees a la fin
+        duration: Fin du dernier repere ou image cle (s, hors parole)
+    """
+
+    def __init__(self, name, keyframes=(), tts=(), leds=(), stiffness=(), release=(),
+                 settle=0.0, description=u""):
+        self.name = name
+        self.description = description
+        self.track = Gesture(name, "choreography", list(keyframes)) if keyframes else None
+        self.stiffness = sorted((str(chain), float(value)) for chain, value in stiffness)
+        self.release = [str(chain) for chain in release]
+        self.settle = float(settle)
+        self.events = []
+        for cue in tts:
+            self.events.append((float(cue["time"]), "tts", (cue["text"],)))
+        for cue in leds:
+            self.events.append((float(cue["time"]), "leds", (
+                str(cue.get("group", "FaceLeds")), parse_color(cue["color"]),
+                float(cue.get("duration", 0.0)))))
+        self.events.sort(key=lambda event: event[0])
+        ends = [t + (args[2] if kind == "leds" else 0.0) for t, kind, args in self.events]
+        if self.track is not None:
+            ends.append(self.track.duration)
+        self.duration = max(ends or [0.0])
+
+    def calls(self):
+        """Nombre d'appels NAOqi pour jouer la choregraphie"""
+        return ((1 if self.stiffness else 0) + (1 if self.track is not None else 0)
+                + len(self.events) + (1 if self.release else 0))
+
+
+def estimate(choreography, lang="fr", speed=100):
+    """Minutage a blanc (sans robot)
+
+    La fin tient compte de la parole estimee de chaque repere TTS.
+
+    Returns:
+        dict: settle_s, motion_s, duration_s (attente de raideur comprise),
+        calls, timeline [(instant apres la raideur, type, libelle)]
+    """
+    timeline = []
+    end = 0.0
+    if choreography.track is not None:
+        timeline.append((0.0, "motion", "%d articulations, %d images cles" % (
+            len(choreography.track.names), len(choreography.track.keyframes))))
+        end = choreography.track.duration
+    for t, kind, args in choreography.events:
+        if kind == "tts":
+            speech_s = estimate_speaking_time(args[0], lang, speed)
+            timeline.append((t, "tts", u"%s (~%.1fs)" % (args[0], speech_s)))
+            end = max(end, t + speech_s)
+        else:
+            timeline.append((t, "leds", "%s #%06X en %.1fs" % args))
+            end = max(end, t + args[2])
+    settle = choreography.settle if choreography.stiffness else 0.0
+    return {
+        "settle_s": settle,
+        "motion_s": choreography.track.duration if choreography.track is not None else 0.0,
+        "duration_s": round(settle + end, 3),
+        "calls": choreography.calls(),
+        "timeline": timeline,
+    }
+
+
+class ChoreographyLibrary(object):
+    """Choregraphies compilees, par nom"""
+
+    def __init__(self, choreographies):
+        self.choreographies = dict((c.name, c) for c in choreographies)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Construire depuis le contenu du JSON
+
+        Raises:
+            ValueError si la structure est invalide
+        """
+        entries = data.get("choreographies")
+        if not isinstance(entries, dict) or not entries:
+            raise ValueError("Aucune choregraphie (cle 'choreographies')")
+        choreographies = []
+        for name in sorted(entries):
+            entry = entries[name]
+            keyframes = entry.get("keyframes") or []
+            for frame in keyframes:
+                if "time" not in frame or not frame.get("angles"):
+                    raise ValueError("Choregraphie '%s': image cle sans 'time' ou 'angles'" % name)
+            for cue in entry.get("tts", []):
+                if "time" not in cue or not cue.get("text"):
+                    raise ValueError("Choregraphie '%s': repere TTS sans 'time' ou 'text'" % name)
+            for cue in entry.get("leds", []):
+                if "time" not in cue or "color" not in cue:
+                    raise ValueError("Choregraphie '%s': repere LEDs sans 'time' ou 'color'" % name)
+            if not keyframes and not entry.get("tts") and not entry.get("leds"):
+                raise ValueError("Choregraphie '%s' vide" % name)
+            choreographies.append(Choreography(
+                name, keyframes, entry.get("tts", []), entry.get("leds", []),
+                entry.get("stiffness", {}).items(), entry.get("release", []),
+                entry.get("settle", 0.0), entry.get("description", u"")))
+        return cls(choreographies)
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or DEFAULT_CHOREOGRAPHY_PATH
+        with io.open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def get(self, name):
+        return self.choreographies.get(name)
+
+    def validate(self, speed_margin=SPEED_MARGIN):
+        """Butees, instants et vitesses des trajectoires; reperes dans le temps
+
+        Returns:
+            Liste de messages (vide si tout est valide)
+        """
+        problems = []
+        for name in sorted(self.choreographies):
+            choreography = self.choreographies[name]
+            if choreography.track is not None:
+                problems.extend(check_gesture(choreography.track, None, speed_margin))
+            for t, kind, args in choreography.events:
+                if t < 0:
+                    problems.append("%s: repere %s a un instant negatif (%.2fs)" % (name, kind, t))
+        return problems
+
+
+class ChoreographyPlayer(object):
+    """Jouer une choregraphie compilee
+
+    Args:
+        facade: MotionFacade (raideur en cache, compteur de RPC)
+        tts, leds: Proxies ALTextToSpeech et ALLeds (None: reperes ignores)
+    """
+
+    def __init__(self, facade, tts=None, leds=None, log_fn=None):
+        self.facade = facade
+        self.tts = tts
+        self.leds = leds
+        self.log_fn = log_fn
+
+    def _log(self, message):
+        if self.log_fn:
+            self.log_fn(message)
+
+    def _fire(self, kind, args):
+        try:
+            if kind == "tts" and self.tts is not None:
+                text = args[0]
+                self.tts.post.say(text.encode("utf-8") if not isinstance(text, bytes) else text)
+            elif kind == "leds" and self.leds is not None:
+                self.leds.post.fadeRGB(args[0], args[1], args[2])
+        except Exception as e:
+            self._log("X Repere %s: %s" % (kind, str(e)))
+
+    def play(self, choreography, stop=None, on_start=None):
+        """Jouer jusqu'au bout, ou jusqu'a ce que stop (threading.Event) soit leve
+
+        on_start est appele des que la trajectoire est partie.
+
+        Les reperes suivants ne partent plus une fois stop leve et la
+        trajectoire en cours est arretee; les moteurs ne sont pas relaches
+        (l'appelant reprend la main, ex. pour une sortie rapide).
+
+        Returns:
+            dict: elapsed_s, stopped
+        """
+        stop = stop or threading.Event()
+        if stop.is_set():
+            return {"elapsed_s": 0.0, "stopped": True}
+        if choreography.stiffness:
+            self.facade.set_stiffness(choreography.stiffness, settle=choreography.settle)
+
+        start = time.time()
+        task_id = None
+        if choreography.track is not None:
+            task_id = self.facade.play(choreography.track)
+        if on_start:
+            on_start()
+
+        for t, kind, args in choreography.events:
+            if stop.wait(max(0.0, start + t - time.time())):
+                break
+            self._fire(kind, args)
+        stop.wait(max(0.0, start + choreography.duration - time.time()))
+
+        stopped = stop.is_set()
+        if stopped and task_id is not None:
+            try:
+                self.facade.motion.stop(task_id)
+            except Exception:
+                pass
+        elif choreography.release:
+            self.facade.release(choreography.release)
+        return {"elapsed_s": round(time.time() - start, 3), "stopped": stopped}
+
+
+class LoopingBehaviour(object):
+    """Comportement en boucle (ex. reflexion): entree, cycles, sortie rapide
+
+    Les cycles se repetent jusqu'a stop(); l'arret interrompt aussi le cycle
+    ou l'entree en cours. stop() rend la main des que la sortie (retour au
+    repos) est lancee: elle se termine en arriere-plan, et la parole
+    suivante n'attend pas sa fin (le premier geste la remplace).
+
+    Args:
+        player: ChoreographyPlayer
+        enter, loop, exit: Choregraphies d'entree, d'un cycle et de sortie
+        filler_text: Dit une seule fois si l'attente depasse filler_after (s)
+        release: Chaines relachees apres la sortie
+        busy_fn: fonction -> True si une autre activite utilise deja les
+            moteurs (parole): pas de relachement dans ce cas
+    """
+
+    def __init__(self, player, enter, loop, exit, filler_text=None, filler_after=2.0,
+                 release=(), busy_fn=None, log_fn=None):
+        self.player = player
+        self.enter = enter
+        self.loop = loop
+        self.exit = exit
+        self.filler_text = filler_text
+        self.filler_after = filler_after
+        self.release = list(release)
+        self.busy_fn = busy_fn
+        self.log_fn = log_fn
+        self.cycles = 0
+        self.filler_played = False
+        self._stop = threading.Event()
+        self._left = threading.Event()
+        self._thread = None
+
+    def _log(self, message):
+        if self.log_fn:
+            self.log_fn(message)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, wait=True, timeout=1.0):
+        """Arreter la boucle
+
+        Args:
+            wait: Attendre que la sortie soit lancee (pas sa fin)
+
+        Returns:
+            Duree de l'arret (s)
+        """
+        start = time.time()
+        self._stop.set()
+        if wait:
+            self._left.wait(timeout)
+        return time.time() - start
+
+    def _say_filler(self):
+        try:
+            return self.player.tts.post.say(self.filler_text)
+        except Exception as e:
+            self._log("X Son de reflexion: %s" % str(e))
+            return None
+
+    def _cycle(self):
+        """Entree puis cycles jusqu'a stop(); rend l'identifiant du son joue"""
+        began = time.time()
+        filler_id = None
+        self.player.play(self.enter, self._stop)
+        while not self._stop.is_set():
+            # Son seulement si l'attente se prolonge
+            if (self.filler_text and not self.filler_played
+                    and time.time() - began >= self.filler_after):
+                filler_id = self._say_filler()
+                self.filler_played = True
+            self.player.play(self.loop, self._stop)
+            self.cycles += 1
+        return filler_id
+
+    def _run(self):
+        try:
+            filler_id = self._cycle()
+            # Le son ne doit pas retarder la parole qui suit
+            if filler_id is not None:
+                self.player.tts.stop(filler_id)
+            # stop() rend la main une fois la sortie partie: un geste lance
+            # ensuite la remplace, jamais l'inverse
+            self.player.play(self.exit, on_start=self._left.set)
+            if self.release and not (self.busy_fn and self.busy_fn()):
+                self.player.facade.release(self.release)
+        except Exception as e:
+            self._log("X Erreur animation: %s" % str(e))
+            try:
+                self.player.facade.release(self.release, force=True)
+            except Exception:
+                pass
+        finally:
+            self._left.set()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+"""
+Historique de conversation borne en tokens (Python 2.7 / 3)
+
+Les derniers tours sont gardes mot pour mot dans un budget de tokens;
+les tours plus anciens sont replies dans un resume glissant, construit
+en arriere-plan entre deux tours (pendant que le robot parle).
+"""
+
+import threading
+
+
+def estimate_tokens(text):
+    """Estimation rapide du nombre de tokens (~4 caracteres par token)"""
+    if not text:
+        return 0
+    return len(text) // 4 + 1
+
+
+def message_tokens(message):
+    """Tokens d'un message, surcout du format chat inclus"""
+    return estimate_tokens(message.get("content", "")) + 4
+
+
+def payload_tokens(messages):
+    return sum(message_tokens(m) for m in messages)
+
+
+def extractive_summary(previous, turns, max_chars=600):
+    """Resume de secours sans LLM: premiere phrase de chaque tour"""
+    parts = [previous] if previous else []
+    for turn in turns:
+        content = turn.get("content", "").strip()
+        for sep in (".", "!", "?"):
+            idx = content.find(sep)
+            if 0 < idx < 160:
+                content = content[:idx + 1]
+                break
+        else:
+            content = content[:160]
+        who = "Utilisateur" if turn.get("role") == "user" else "NAO"
+        parts.append("%s: %s" % (who, content))
+    summary = " ".join(parts)
+    if len(summary) > max_chars:
+        summary = summary[-max_chars:]
+    return summary
+
+
+class ConversationContext(object):
+    """Historique de conversation avec budget de tokens et resume glissant
+
+    Args:
+        token_budget: Budget de tokens pour les tours gardes mot pour mot
+        summarize_fn: fonction (resume_precedent, tours) -> nouveau resume,
+            appelee dans un thread; resume extractif si absente ou en echec
+        min_recent_turns: Nombre minimal de messages recents toujours gardes
+    """
+
+    def __init__(self, token_budget=1500, summarize_fn=None, min_recent_turns=2):
+        self.token_budget = token_budget
+        self.summarize_fn = summarize_fn
+        self.min_recent_turns = min_recent_turns
+        self.turns = []
+        self.summary = ""
+        self._pending = []
+        self._summarizing = None
+        self._lock = threading.Lock()
+        self.last_payload_tokens = 0
+
+    def add(self, role, content):
+        with self._lock:
+            self.turns.append({"role": role, "content": content})
+
+    def discard_last(self, role):
+        """Retirer le dernier tour s'il est de ce role (question sans reponse)"""
+        with self._lock:
+            if self.turns and self.turns[-1]["role"] == role:
+                self.turns.pop()
+
+    def recent(self, count, skip=0):
+        """Copie des count derniers tours, en ignorant les skip plus recents"""
+        with self._lock:
+            end = len(self.turns) - skip
+            return [dict(t) for t in self.turns[max(0, end - count):max(0, end)]]
+
+    def clear(self):
+        with self._lock:
+            self.turns = []
+            self._pending = []
+            self.summary = ""
+
+    def _summary_message(self, lang):
+        if not self.summary and not self._pending:
+            return None
+        if lang == "fr":
+            header = "Resume de la conversation precedente: "
+        else:
+            header = "Summary of the earlier conversation: "
+        content = header + self.summary
+        # Tours en attente de resume: envoyes tels quels en attendant
+        for turn in self._pending:
+            content += "\n%s: %s" % (turn["role"], turn["content"])
+        return {"role": "system", "content": content}
+
+    def build_messages(self, system_message, lang="fr"):
+        """Messages a envoyer: systeme + resume + tours recents"""
+        with self._lock:
+            messages = [system_message]
+            summary_message = self._summary_message(lang)
+            if summary_message:
+                messages.append(summary_message)
+            messages.extend(self.turns)
+            self.last_payload_tokens = payload_tokens(messages)
+            return messages
+
+    def compact(self):
+        """Deplacer les tours hors budget et lancer le resume en arriere-plan
+
+        A appeler apres chaque reponse de l'assistant. Retourne True si un
+        resume a ete lance.
+        """
+        with self._lock:
+            total = payload_tokens(self.turns)
+            evicted = []
+            # Retirer par paires user/assistant pour garder un dialogue coherent
+            while total > self.token_budget and len(self.turns) > self.min_recent_turns:
+                turn = self.turns.pop(0)
+                evicted.append(turn)
+                total -= message_tokens(turn)
+                if self.turns and self.turns[0]["role"] == "assistant":
+                    turn = self.turns.pop(0)
+                    evicted.append(turn)
+                    total -= message_tokens(turn)
+            if not evicted:
+                return False
+            self._pending.extend(evicted)
+            if self._summarizing is not None:
+                return True
+            self._summarizing = threading.Thread(target=self._summarize_pending)
+            self._summarizing.daemon = True
+            self._summarizing.start()
+            return True
+
+    def _summarize_pending(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._summarizing = None
+                    return
+                turns = list(self._pending)
+                previous = self.summary
+            summary = None
+            if self.summarize_fn is not None:
+                try:
+                    summary = self.summarize_fn(previous, turns)
+                except Exception:
+                    summary = None
+            if not summary:
+                summary = extractive_summary(previous, turns)
+            with self._lock:
+                self.summary = summary
+                del self._pending[:len(turns)]
+
+    def wait_summary(self, timeout=None):
+        thread = self._summarizing
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "turns": len(self.turns),
+                "pending": len(self._pending),
+                "summary_tokens": estimate_tokens(self.summary),
+                "payload_tokens": self.last_payload_tokens,
+            }
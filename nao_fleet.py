@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""
+Flotte de robots NAO pilotee depuis une seule application (Python 3)
+
+Un RobotHub (donc un bridge Python 2.7) par robot. Le pool envoie une
+commande a un robot precis, ou la diffuse a plusieurs robots. Les
+methodes du hub ne font que soumettre la commande et rendent la main:
+chaque bridge l'execute ensuite dans son propre processus, en parallele
+des autres. "Tous disent bonjour" prend donc le temps du robot le plus
+lent, pas la somme.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+DEFAULT_PORT = 9559
+
+
+def parse_fleet(spec, default_port=DEFAULT_PORT):
+    """Liste de robots depuis du texte: un robot par ligne ou par virgule
+
+    Format: "ip", "ip:port" ou "nom=ip[:port]".
+
+    Returns:
+        [(nom, ip, port)] dans l'ordre, sans doublon d'adresse
+
+    Raises:
+        ValueError si un port n'est pas un entier
+    """
+    robots = []
+    seen = set()
+    for item in spec.replace(",", "\n").splitlines():
+        item = item.strip()
+        if not item:
+            continue
+        name, _, address = item.rpartition("=")
+        ip, _, port = address.strip().partition(":")
+        try:
+            port = int(port) if port else default_port
+        except ValueError:
+            raise ValueError("Port invalide pour %s" % item)
+        if (ip, port) in seen:
+            continue
+        seen.add((ip, port))
+        robots.append((name.strip() or ip, ip, port))
+    return robots
+
+
+class FleetPool(object):
+    """Hubs de la flotte, par nom, et diffusion des commandes
+
+    Args:
+        hubs: [(nom, RobotHub)]
+    """
+
+    def __init__(self, hubs):
+        self.hubs = OrderedDict(hubs)
+
+    def names(self):
+        return list(self.hubs)
+
+    def broadcast(self, command, names=None):
+        """Appeler command(hub) sur chaque robot vise
+
+        command ne doit pas bloquer (soumission au bridge): les robots
+        executent ensuite tous en meme temps.
+
+        Args:
+            names: Robots vises (None: toute la flotte)
+
+        Returns:
+            {nom: resultat} (l'exception levee si la commande a echoue)
+        """
+        results = OrderedDict()
+        for name in (names or self.hubs):
+            if name not in self.hubs:
+                continue
+            try:
+                results[name] = command(self.hubs[name])
+            except Exception as e:
+                results[name] = e
+        return results
+
+    def _targets(self, names=None):
+        return [self.hubs[name] for name in (names or self.hubs) if name in self.hubs]
+
+    def connect_all(self, language, names=None):
+        return self.broadcast(lambda hub: hub.connect(language), names)
+
+    def disconnect_all(self, names=None):
+        """Deconnecter les robots connectes (ou en cours de connexion)
+
+        disconnect() attend l'arret du processus bridge: un thread par
+        robot, le temps d'attente est celui du plus lent.
+
+        Returns:
+            Nombre de robots deconnectes
+        """
+        targets = [hub for hub in self._targets(names) if hub.bridge is not None]
+        threads = [threading.Thread(target=hub.disconnect, daemon=True) for hub in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return len(targets)
+
+    def greet_all(self, owner, language, names=None):
+        return self.broadcast(lambda hub: hub.say_greeting(owner, language), names)
+
+    def send_text_all(self, owner, text, language, names=None):
+        return self.broadcast(lambda hub: hub.send_text(owner, text, language), names)
+
+    def cancel_all(self, names=None):
+        return self.broadcast(lambda hub: hub.cancel_speech() if hub.connected else False, names)
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+
+"""
+Bibliotheque de gestes NAO a partir d'un fichier JSON (Python 2.7 / 3)
+
+Chaque geste est une suite d'images cles {"time": s, "angles": {joint: rad}}.
+Au chargement, il est compile une seule fois en arguments de
+ALMotion.angleInterpolation (ou angleInterpolationBezier): un geste complet
+part en un seul appel asynchrone, sans setAngles + time.sleep entre les
+images cles.
+"""
+
+import io
+import json
+import os
+import random
+
+
+DEFAULT_LIBRARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gestures.json")
+
+# Butees articulaires de NAO (radians) - documentation Aldebaran, corps H25
+JOINT_LIMITS = {
+    "HeadYaw": (-2.0857, 2.0857),
+    "HeadPitch": (-0.6720, 0.5149),
+    "LShoulderPitch": (-2.0857, 2.0857),
+    "LShoulderRoll": (-0.3142, 1.3265),
+    "LElbowYaw": (-2.0857, 2.0857),
+    "LElbowRoll": (-1.5446, -0.0349),
+    "LWristYaw": (-1.8238, 1.8238),
+    "LHand": (0.0, 1.0),
+    "RShoulderPitch": (-2.0857, 2.0857),
+    "RShoulderRoll": (-1.3265, 0.3142),
+    "RElbowYaw": (-2.0857, 2.0857),
+    "RElbowRoll": (0.0349, 1.5446),
+    "RWristYaw": (-1.8238, 1.8238),
+    "RHand": (0.0, 1.0),
+}
+
+# Vitesses articulaires maximales (rad/s)
+JOINT_MAX_SPEED = {
+    "HeadYaw": 8.26797,
+    "HeadPitch": 7.19407,
+    "LShoulderPitch": 8.26797,
+    "LShoulderRoll": 7.19407,
+    "LElbowYaw": 8.26797,
+    "LElbowRoll": 7.19407,
+    "LWristYaw": 24.6229,
+    "LHand": 8.33,
+    "RShoulderPitch": 8.26797,
+    "RShoulderRoll": 7.19407,
+    "RElbowYaw": 8.26797,
+    "RElbowRoll": 7.19407,
+    "RWristYaw": 24.6229,
+    "RHand": 8.33,
+}
+
+# Part de la vitesse maximale acceptee par validate() (marge moteurs)
+SPEED_MARGIN = 0.5
+
+
+class Gesture(object):
+    """Geste compile: arguments prets pour ALMotion
+
+    Attributes:
+        names: Articulations animees
+        angles: Une liste d'angles par articulation
+        times: Une liste d'instants (s) par articulation
+        controls: Points de controle Bezier (interpolation "bezier")
+        duration: Duree totale (s)
+    """
+
+    def __init__(self, name, gesture_type, keyframes, interpolation="linear"):
+        self.name = name
+        self.gesture_type = gesture_type
+        self.keyframes = keyframes
+        self.interpolation = interpolation
+        self.names = []
+        self.angles = []
+        self.times = []
+        self.controls = []
+        self.duration = 0.0
+        self._compile()
+
+    def _compile(self):
+        joints = []
+        for frame in self.keyframes:
+            for joint in sorted(frame["angles"]):
+                if joint not in joints:
+                    joints.append(joint)
+
+        for joint in joints:
+            times = []
+            angles = []
+            for frame in self.keyframes:
+                if joint in frame["angles"]:
+                    times.append(float(frame["time"]))
+                    angles.append(float(frame["angles"][joint]))
+            self.names.append(str(joint))
+            self.times.append(times)
+            self.angles.append(angles)
+            self.controls.append(_bezier_controls(times, angles))
+
+        self.duration = max([t[-1] for t in self.times] or [0.0])
+
+    def play(self, motion, wait=False, time_scale=1.0):
+        """Lancer le geste en un seul appel ALMotion
+
+        Args:
+            motion: Proxy ALMotion
+            wait: Bloquer jusqu'a la fin du geste
+            time_scale: Facteur sur les instants (< 1 = geste raccourci)
+
+        Returns:
+            Identifiant de tache (appel asynchrone) ou None
+        """
+        times, controls = self.times, self.controls
+        if time_scale != 1.0:
+            times = [[t * time_scale for t in joint_times] for joint_times in self.times]
+            controls = [_bezier_controls(t, a) for t, a in zip(times, self.angles)]
+        if self.interpolation == "bezier":
+            if wait:
+                motion.angleInterpolationBezier(self.names, times, controls)
+                return None
+            return motion.post.angleInterpolationBezier(self.names, times, controls)
+        if wait:
+            motion.angleInterpolation(self.names, self.angles, times, True)
+            return None
+        return motion.post.angleInterpolation(self.names, self.angles, times, True)
+
+    def final_pose(self):
+        return dict((name, angles[-1]) for name, angles in zip(self.names, self.angles))
+
+
+def _bezier_controls(times, angles):
+    """Points de controle [angle, poignee gauche, poignee droite]
+
+    Poignees plates (type 3) au tiers de chaque segment, comme les
+    exports Choregraphe: depart et arrivee en douceur sur chaque image cle.
+    """
+    controls = []
+    for index, angle in enumerate(angles):
+        previous = times[index - 1] if index > 0 else 0.0
+        following = times[index + 1] if index + 1 < len(times) else times[index]
+        left = -(times[index] - previous) / 3.0
+        right = (following - times[index]) / 3.0
+        controls.append([angle, [3, left, 0.0], [3, right, 0.0]])
+    return controls
+
+
+def check_gesture(gesture, start_pose=None, speed_margin=SPEED_MARGIN):
+    """Butees, instants croissants et vitesses d'un geste compile
+
+    Args:
+        start_pose: Pose de depart {articulation: angle} pour la vitesse du
+            premier segment (None: premier segment non verifie)
+
+    Returns:
+        Liste de messages (vide si tout est valide)
+    """
+    problems = []
+    start_pose = start_pose or {}
+    name = gesture.name
+    for joint, times, angles in zip(gesture.names, gesture.times, gesture.angles):
+        if joint not in JOINT_LIMITS:
+            problems.append("%s: articulation inconnue %s" % (name, joint))
+            continue
+        low, high = JOINT_LIMITS[joint]
+        max_speed = JOINT_MAX_SPEED[joint] * speed_margin
+        previous_time = 0.0
+        previous_angle = start_pose.get(joint)
+        for t, angle in zip(times, angles):
+            if t <= previous_time:
+                problems.append("%s: %s instants non croissants (%.2fs)" % (name, joint, t))
+            if not low <= angle <= high:
+                problems.append("%s: %s=%.3f hors butees [%.3f, %.3f] a %.2fs" % (
+                    name, joint, angle, low, high, t))
+            if previous_angle is not None and t > previous_time:
+                speed = abs(angle - previous_angle) / (t - previous_time)
+                if speed > max_speed:
+                    problems.append("%s: %s trop rapide (%.2f rad/s > %.2f) a %.2fs" % (
+                        name, joint, speed, max_speed, t))
+            previous_time = t
+            previous_angle = angle
+    return problems
+
+
+class GestureLibrary(object):
+    """Gestes compiles, groupes par type (explain, question, ...)
+
+    Un type peut avoir plusieurs variantes (bras gauche/droit, tete a
+    gauche/droite...): choose() en tire une au hasard.
+    """
+
+    def __init__(self, gestures):
+        self.gestures = dict((g.name, g) for g in gestures)
+        self.by_type = {}
+        for gesture in gestures:
+            self.by_type.setdefault(gesture.gesture_type, []).append(gesture)
+        for variants in self.by_type.values():
+            variants.sort(key=lambda g: g.name)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Construire depuis le contenu du JSON
+
+        Raises:
+            ValueError si la structure est invalide
+        """
+        entries = data.get("gestures")
+        if not isinstance(entries, dict) or not entries:
+            raise ValueError("Bibliotheque de gestes vide ou sans cle 'gestures'")
+        gestures = []
+        for name in sorted(entries):
+            entry = entries[name]
+            keyframes = entry.get("keyframes") or []
+            if not keyframes:
+                raise ValueError("Geste '%s' sans images cles" % name)
+            for frame in keyframes:
+                if "time" not in frame or not frame.get("angles"):
+                    raise ValueError("Geste '%s': image cle sans 'time' ou 'angles'" % name)
+            interpolation = entry.get("interpolation", "linear")
+            if interpolation not in ("linear", "bezier"):
+                raise ValueError("Geste '%s': interpolation inconnue '%s'" % (name, interpolation))
+            gestures.append(Gesture(name, entry.get("type", name), keyframes, interpolation))
+        return cls(gestures)
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or DEFAULT_LIBRARY_PATH
+        with io.open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def get(self, name):
+        return self.gestures.get(name)
+
+    def choose(self, gesture_type):
+        """Une variante au hasard pour ce type (None si type inconnu)"""
+        variants = self.by_type.get(gesture_type)
+        if not variants:
+            return None
+        return random.choice(variants)
+
+    def play(self, motion, gesture_type, wait=False):
+        """Choisir et lancer un geste du type donne
+
+        Returns:
+            Le Gesture joue (None si aucun geste pour ce type)
+        """
+        gesture = self.choose(gesture_type)
+        if gesture is not None:
+            gesture.play(motion, wait=wait)
+        return gesture
+
+    def rest_pose(self):
+        """Pose de depart supposee: derniere image du geste 'rest'"""
+        rest = self.by_type.get("rest")
+        return rest[0].final_pose() if rest else {}
+
+    def validate(self, speed_margin=SPEED_MARGIN):
+        """Verifier butees, instants et vitesses de chaque geste
+
+        La vitesse du premier segment est calculee depuis la pose de repos.
+
+        Returns:
+            Liste de messages (vide si tout est valide)
+        """
+        problems = []
+        start_pose = self.rest_pose()
+        for name in sorted(self.gestures):
+            problems.extend(check_gesture(self.gestures[name], start_pose, speed_margin))
+        return problems
+
+    def timings(self):
+        """(nom, type, duree, articulations, images cles) pour chaque geste"""
+        return [(g.name, g.gesture_type, g.duration, len(g.names), len(g.keyframes))
+                for g in sorted(self.gestures.values(), key=lambda g: g.name)]
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+"""
+Parole et gestes en parallele pour NAO (Python 2.7)
+
+Les phrases sont soumises une a une a ALTextToSpeech par la file de parole
+(nao_tts_queue_py27.SpeechQueue). Le geste de la phrase N est remis au
+GestureWorker au moment ou NAO commence a la dire: la voix et le mouvement
+se chevauchent au lieu d'alterner.
+
+Le type de geste de chaque phrase est planifie avant de parler, en une
+seule passe sur toute la reponse (GesturePlanner).
+"""
+
+import re
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+
+from nao_speech_py27 import estimate_speaking_time
+
+
+# Mots cles par type de geste, par priorite decroissante (recherche de
+# sous-chaines dans le texte en minuscules)
+GESTURE_KEYWORDS = [
+    ("emphasis", [u"important", u"attention", u"!", u"vraiment", u"absolument", u"certainement",
+                  u"tr\xe8s", u"super", u"magnifique", u"incroyable", u"g\xe9nial", u"excellent"]),
+    ("question", [u"pourquoi", u"comment", u"quoi", u"qui", u"o\xf9", u"quand", u"quel", u"quelle",
+                  u"?"]),
+    ("explain", [u"parce que", u"donc", u"ainsi", u"par exemple", u"c'est-\xe0-dire", u"en effet",
+                 u"voici", u"voil\xe0", u"regardez", u"comme", u"si", u"alors"]),
+]
+
+_SENTENCE_SPAN_RE = re.compile(r"[^.!?]+[.!?]*", re.UNICODE)
+
+
+class GesturePlanner(object):
+    """Plan des gestes de toute la reponse en une seule passe
+
+    Tous les mots cles sont compiles en une expression reguliere: un
+    lookahead capturant teste chaque position du texte, types dans l'ordre
+    de priorite, ce qui trouve aussi les mots cles qui se chevauchent
+    ("comme" dans "comment"). Chaque correspondance est rattachee a sa
+    phrase; la phrase prend le type le plus prioritaire trouve.
+
+    Args:
+        keywords: Liste (type, mots) par priorite decroissante
+        default: Type des phrases sans mot cle
+    """
+
+    def __init__(self, keywords=None, default="neutral"):
+        keywords = keywords or GESTURE_KEYWORDS
+        self.default = default
+        self.types = [gesture_type for gesture_type, _ in keywords]
+        groups = []
+        first_chars = set()
+        for index, (gesture_type, words) in enumerate(keywords):
+            # Mots longs d'abord: "quelle" avant "quel" dans le meme groupe
+            words = sorted(set(w.lower() for w in words), key=len, reverse=True)
+            first_chars.update(w[0] for w in words)
+            groups.append(u"(?P<g%d>%s)" % (index, u"|".join(re.escape(w) for w in words)))
+        # Filtre sur la premiere lettre: l'alternative complete n'est essayee
+        # qu'aux positions qui peuvent commencer un mot cle
+        guard = u"".join(re.escape(c) for c in sorted(first_chars))
+        self._regex = re.compile(u"(?=[%s])(?=%s)" % (guard, u"|".join(groups)), re.UNICODE)
+
+    def plan(self, text):
+        """Type de geste de chaque phrase (meme decoupage que split_sentences)
+
+        Returns:
+            Liste de (phrase, type)
+        """
+        sentences = []
+        starts = []
+        for match in _SENTENCE_SPAN_RE.finditer(text or u""):
+            sentence = match.group().strip()
+            if sentence:
+                sentences.append(sentence)
+                starts.append(match.start())
+        if not sentences:
+            return []
+
+        best = [len(self.types)] * len(sentences)
+        for match in self._regex.finditer(text.lower()):
+            rank = int(match.lastgroup[1:])
+            index = bisect_right(starts, match.start()) - 1
+            if index >= 0 and rank < best[index]:
+                best[index] = rank
+        return [(sentence, self.types[rank] if rank < len(self.types) else self.default)
+                for sentence, rank in zip(sentences, best)]
+
+
+class GestureWorker(object):
+    """Execute les gestes dans un thread, sans bloquer la parole
+
+    Les actions sont des fonctions sans argument. Si la parole avance plus
+    vite que les gestes, les gestes en retard sont abandonnes: seul le plus
+    recent reste en attente. Le retard entre la soumission (debut de phrase)
+    et le debut de chaque action est mesure dans lags.
+    """
+
+    def __init__(self, log_fn=None):
+        self.log_fn = log_fn
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._running = True
+        self._busy = False
+        self.skipped = 0
+        self.lags = {}
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, action, label="", key=None):
+        """Ajouter une action (key: cle du retard mesure dans lags)"""
+        with self._cond:
+            if self._pending:
+                self.skipped += len(self._pending)
+                self._pending.clear()
+            self._pending.append((action, label, key, time.time()))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait(0.5)
+                if not self._running and not self._pending:
+                    return
+                action, label, key, submitted = self._pending.popleft()
+                if key is not None:
+                    self.lags[key] = time.time() - submitted
+                self._busy = True
+            try:
+                action()
+            except Exception as e:
+                if self.log_fn:
+                    self.log_fn("X Erreur geste %s: %s" % (label, str(e)))
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def wait_idle(self, timeout=5.0):
+        """Attendre la fin des gestes en cours"""
+        deadline = time.time() + timeout
+        with self._cond:
+            while (self._pending or self._busy) and time.time() < deadline:
+                self._cond.wait(0.05)
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join(2.0)
+
+
+class GestureScheduler(object):
+    """Gestes d'une reponse tenus dans un budget d'ecart par phrase
+
+    L'ecart d'une phrase est le delai entre le debut de la phrase et le
+    debut de son geste. Par defaut, chaque geste part directement de la
+    pose du geste precedent (fondu, ecart nul). Le retour au repos entre
+    deux phrases n'est garde que s'il tient dans le budget. Un geste plus
+    long que sa phrase (plus le budget) est raccourci. S'il ne tient pas
+    meme raccourci, il est saute et les bras gardent leur pose.
+
+    Args:
+        library: GestureLibrary
+        max_gap_s: Ecart maximal entre debut de phrase et debut du geste
+        min_scale: Raccourcissement maximal d'un geste (facteur de duree)
+        settle_s: Delai de mise sous tension des moteurs (premier geste)
+    """
+
+    def __init__(self, library, max_gap_s=0.3, min_scale=0.6, settle_s=0.1):
+        self.library = library
+        self.max_gap_s = max_gap_s
+        self.min_scale = min_scale
+        self.settle_s = settle_s
+
+    def schedule(self, plan, lang="fr", speed=100):
+        """Programme de chaque phrase a partir du plan (phrase, type)
+
+        Returns:
+            Liste de dicts: sentence, type, gesture (Gesture ou None),
+            mode (full, blend, reset, short, skip), time_scale,
+            planned_gap_s, speech_s
+        """
+        rest = self.library.get("rest")
+        cues = []
+        previous = None
+        for index, (sentence, gesture_type) in enumerate(plan):
+            speech_s = estimate_speaking_time(sentence, lang, speed)
+            gesture = self.library.choose(gesture_type)
+            cue = {"sentence": sentence, "type": gesture_type, "gesture": gesture,
+                   "mode": "skip", "time_scale": 1.0, "planned_gap_s": 0.0,
+                   "speech_s": round(speech_s, 2)}
+            cues.append(cue)
+            if gesture is None:
+                continue
+
+            gap = 0.0
+            if previous is None:
+                mode = "full"
+                gap = self.settle_s
+            elif rest is not None and rest.duration <= self.max_gap_s:
+                mode = "reset"
+                gap = rest.duration
+            else:
+                mode = "blend"
+
+            # Le geste doit finir avant que la phrase suivante ait attendu plus que le budget
+            available = speech_s + self.max_gap_s - gap
+            scale = 1.0
+            if gesture.duration > available:
+                scale = available / gesture.duration if gesture.duration else 1.0
+                if scale < self.min_scale:
+                    cue["gesture"] = None
+                    continue
+                mode = "short" if mode != "reset" else mode
+
+            cue["mode"] = mode
+            cue["time_scale"] = round(scale, 2)
+            cue["planned_gap_s"] = round(gap, 2)
+            previous = cue
+        return cues
+
+    def report(self, cues, lags, setup):
+        """Ecarts prevus et mesures, par phrase
+
+        Args:
+            lags: Retard debut de phrase -> debut d'action (GestureWorker.lags)
+            setup: Duree action -> envoi du geste (repos, raideur), par phrase
+
+        Returns:
+            (liste de dicts, ligne de log)
+        """
+        rows = []
+        parts = []
+        for index, cue in enumerate(cues):
+            measured = None
+            if index in lags and index in setup:
+                measured = round(lags[index] + setup[index], 2)
+            rows.append({"index": index + 1, "mode": cue["mode"],
+                         "planned_gap_s": cue["planned_gap_s"], "measured_gap_s": measured})
+            if cue["mode"] == "skip":
+                parts.append("%d: saute" % (index + 1))
+            elif measured is None:
+                parts.append("%d: %.2f/- %s" % (index + 1, cue["planned_gap_s"], cue["mode"]))
+            else:
+                parts.append("%d: %.2f/%.2f %s" % (index + 1, cue["planned_gap_s"], measured, cue["mode"]))
+        line = "Ecarts phrase/geste (prevu/mesure, s, budget %.2f): %s" % (
+            self.max_gap_s, ", ".join(parts))
+        return rows, line
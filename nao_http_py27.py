@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pool de sessions HTTP keep-alive pour les appels Groq (Python 2.7 / 3)
+
+Une session requests par endpoint (chat, transcription...), avec pool de
+connexions persistantes. Chaque requete mesure separement le temps
+d'etablissement de connexion (DNS + TCP + TLS) et le temps de transfert.
+"""
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+
+# Duree de connexion de la requete en cours (par thread)
+_connect_timing = threading.local()
+
+
+def _record_connect(duration):
+    _connect_timing.total = getattr(_connect_timing, "total", 0.0) + duration
+    _connect_timing.count = getattr(_connect_timing, "count", 0) + 1
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.time()
+        try:
+            return HTTPConnection.connect(self)
+        finally:
+            _record_connect(time.time() - start)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.time()
+        try:
+            return HTTPSConnection.connect(self)
+        finally:
+            _record_connect(time.time() - start)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    """Adapter dont les connexions chronometrent leur connect()"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class SessionPool(object):
+    """Sessions HTTP partagees par endpoint avec statistiques de latence"""
+
+    def __init__(self, pool_size=4, history_size=50):
+        self.pool_size = pool_size
+        self.history_size = history_size
+        self._sessions = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def session(self, url):
+        """Retourner (et creer si besoin) la session de l'endpoint"""
+        with self._lock:
+            session = self._sessions.get(url)
+            if session is None:
+                session = requests.Session()
+                adapter = _TimedAdapter(pool_connections=1,
+                                        pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers["Connection"] = "keep-alive"
+                self._sessions[url] = session
+                self._stats[url] = []
+            return session
+
+    def request(self, method, url, **kwargs):
+        """Envoyer une requete et mesurer connexion / transfert
+
+        Returns:
+            (response, timing) ou timing contient connect_s, transfer_s,
+            ttfb_s (en-tetes recus), total_s et reused (connexion
+            keep-alive reutilisee)
+        """
+        session = self.session(url)
+        _connect_timing.total = 0.0
+        _connect_timing.count = 0
+
+        start = time.time()
+        response = session.request(method, url, **kwargs)
+        # Forcer la lecture du corps pour inclure le transfert complet (en
+        # streaming, le corps est lu ensuite par l'appelant)
+        if not kwargs.get("stream"):
+            response.content
+        total = time.time() - start
+
+        connect = getattr(_connect_timing, "total", 0.0)
+        timing = {
+            "connect_s": round(connect, 4),
+            "transfer_s": round(max(0.0, total - connect), 4),
+            "ttfb_s": round(response.elapsed.total_seconds(), 4),
+            "total_s": round(total, 4),
+            "reused": getattr(_connect_timing, "count", 0) == 0,
+        }
+
+        with self._lock:
+            history = self._stats.setdefault(url, [])
+            history.append(timing)
+            if len(history) > self.history_size:
+                del history[:-self.history_size]
+
+        return response, timing
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def warm_up(self, urls, api_key, warm_url=None, timeout=10):
+        """Ouvrir les connexions a l'avance avec une requete peu couteuse
+
+        Le GET /models est gratuit et ouvre une connexion TLS qui reste
+        dans le pool de chaque session pour le premier vrai appel.
+        """
+        headers = {"Authorization": "Bearer %s" % api_key}
+        results = {}
+        for url in urls:
+            session = self.session(url)
+            target = warm_url or models_url(url)
+            _connect_timing.total = 0.0
+            _connect_timing.count = 0
+            start = time.time()
+            try:
+                session.get(target, headers=headers, timeout=timeout).content
+                results[url] = {
+                    "connect_s": round(getattr(_connect_timing, "total", 0.0), 4),
+                    "total_s": round(time.time() - start, 4),
+                }
+            except Exception as e:
+                results[url] = {"error": str(e)}
+        return results
+
+    def stats(self, url=None):
+        """Moyennes connexion / transfert par endpoint"""
+        with self._lock:
+            items = [(url, self._stats.get(url, []))] if url else list(self._stats.items())
+            summary = {}
+            for key, history in items:
+                if not history:
+                    continue
+                n = float(len(history))
+                summary[key] = {
+                    "requests": len(history),
+                    "reused": sum(1 for t in history if t["reused"]),
+                    "avg_connect_s": round(sum(t["connect_s"] for t in history) / n, 4),
+                    "avg_transfer_s": round(sum(t["transfer_s"] for t in history) / n, 4),
+                }
+            return summary
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                try:
+                    session.close()
+                except Exception:
+                    pass
+            self._sessions = {}
+
+
+def models_url(endpoint_url):
+    """URL /models de la meme API que l'endpoint (Groq ou serveur local)"""
+    for suffix in ("/chat/completions", "/audio/transcriptions"):
+        if endpoint_url.endswith(suffix):
+            return endpoint_url[:-len(suffix)] + "/models"
+    return GROQ_BASE_URL + "/models"
+
+
+_default_pool = None
+
+
+def get_session_pool():
+    """Pool partage par tout le processus"""
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = SessionPool()
+    return _default_pool
+
+
+def format_timing(label, timing):
+    """Ligne de log lisible pour une mesure"""
+    return ">>> HTTP %s: connexion %.3fs%s / transfert %.3fs (total %.3fs)" % (
+        label,
+        timing.get("connect_s", 0.0),
+        " (keep-alive)" if timing.get("reused") else "",
+        timing.get("transfer_s", 0.0),
+        timing.get("total_s", 0.0),
+    )
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+"""
+Fenetre glissante de latences et percentiles (Python 2.7 / 3)
+
+Sans dependance: importe par le client LLM du bridge et par
+l'application Streamlit (nao_turn_latency).
+"""
+
+import threading
+
+
+class LatencyTracker(object):
+    """Fenetre glissante des latences (secondes)"""
+
+    def __init__(self, window=50):
+        self.window = window
+        self._samples = []
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            if len(self._samples) > self.window:
+                del self._samples[:-self.window]
+
+    def count(self):
+        with self._lock:
+            return len(self._samples)
+
+    def samples(self):
+        with self._lock:
+            return list(self._samples)
+
+    def percentile(self, p):
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))
+        return ordered[index]
+
+    def stats(self):
+        with self._lock:
+            samples = list(self._samples)
+        if not samples:
+            return {"count": 0}
+        return {
+            "count": len(samples),
+            "mean_s": round(sum(samples) / len(samples), 3),
+            "p50_s": round(self.percentile(0.5), 3),
+            "p95_s": round(self.percentile(0.95), 3),
+        }
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+
+"""
+Client LLM resilient (Python 2.7 / 3)
+
+- Requete dupliquee (hedging) quand la premiere depasse un percentile de
+  latence observe
+- Nouvelles tentatives avec backoff exponentiel + jitter sur 429 / 5xx
+- Disjoncteur: apres plusieurs echecs, echec immediat vers une reponse
+  locale de secours
+- Delai global (deadline): tentatives, doublon et backoff tiennent dans
+  un seul budget de temps
+- Streaming (SSE): texte partiel transmis au fil des tokens. Le doublon
+  part si les en-tetes tardent; le premier flux qui repond est lu seul,
+  l'autre est ferme (deux flux ne se fusionnent pas)
+"""
+
+import json
+import random
+import threading
+import time
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+import requests
+
+from nao_http_py27 import get_session_pool
+from nao_latency_py27 import LatencyTracker
+
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+# Lecture d'un flux SSE octet par octet: une lecture plus grande attend
+# d'avoir assez d'octets et retarde la fin de l'evenement en cours
+SSE_CHUNK_SIZE = 1
+
+FALLBACK_ANSWERS = {
+    "fr": "Desole, mon cerveau est un peu lent en ce moment. Peux-tu reposer ta question dans un instant?",
+    "en": "Sorry, my brain is a bit slow right now. Could you ask me again in a moment?",
+}
+
+
+def read_completion(response, on_text=None, deadline=None):
+    """Texte et finish_reason d'une reponse /chat/completions
+
+    Lit un flux SSE ("stream": true) au fil de l'eau, sinon le JSON
+    complet (serveur qui ignore le streaming).
+
+    Args:
+        on_text: fonction (texte recu jusqu'ici) appelee a chaque token
+        deadline: Heure limite (time.time()) pour lire tout le flux; le
+            timeout de requests ne borne que l'attente entre deux paquets
+
+    Returns:
+        (contenu, finish_reason)
+
+    Raises:
+        LLMTimeoutError si le flux n'est pas fini a la deadline
+    """
+    if "text/event-stream" not in response.headers.get("Content-Type", ""):
+        choice = response.json()["choices"][0]
+        return choice["message"]["content"], choice.get("finish_reason")
+
+    parts = []
+    finish_reason = None
+    # Chaque evenement est traite des son arrivee (par defaut requests
+    # attend 512 octets, soit plusieurs tokens)
+    for line in response.iter_lines(chunk_size=SSE_CHUNK_SIZE):
+        if deadline is not None and time.time() > deadline:
+            raise LLMTimeoutError("Timeout LLM: flux incomplet")
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+        choice = json.loads(data)["choices"][0]
+        delta = choice.get("delta", {}).get("content")
+        if delta:
+            parts.append(delta)
+            if on_text:
+                on_text(u"".join(parts))
+        finish_reason = choice.get("finish_reason") or finish_reason
+    return u"".join(parts), finish_reason
+
+
+class CircuitOpenError(Exception):
+    """Le disjoncteur est ouvert: pas d'appel reseau"""
+
+
+class LLMTimeoutError(Exception):
+    """Delai global de la requete LLM depasse"""
+
+
+def is_transient(error):
+    """Erreur passagere (reseau, delai, disjoncteur): reponse de secours
+
+    Les autres erreurs (configuration, bug) doivent faire echouer le tour.
+    """
+    return isinstance(error, (CircuitOpenError, LLMTimeoutError, requests.RequestException))
+
+
+class CircuitBreaker(object):
+    """Disjoncteur ferme -> ouvert -> semi-ouvert"""
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.time() - self.opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self):
+        # En semi-ouvert, une requete d'essai est autorisee
+        return self.state != "open"
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.time()
+
+
+class ResilientClient(object):
+    """POST JSON avec hedging, retries et disjoncteur
+
+    Args:
+        hedge_percentile: Percentile de latence declenchant le doublon
+        min_hedge_delay: Delai minimal avant doublon (secondes)
+        default_hedge_delay: Delai utilise tant qu'il y a peu de mesures
+        max_retries: Nombre de nouvelles tentatives sur 429 / 5xx
+        backoff_base, backoff_max: Parametres du backoff exponentiel
+    """
+
+    def __init__(self, pool=None, timeout=30, hedge_percentile=0.9,
+                 min_hedge_delay=1.0, default_hedge_delay=4.0, max_retries=2,
+                 backoff_base=0.5, backoff_max=4.0, breaker=None):
+        self.pool = pool or get_session_pool()
+        self.timeout = timeout
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.default_hedge_delay = default_hedge_delay
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        # Streaming: delai jusqu'aux en-tetes, qui declenche le doublon
+        self.first_byte = LatencyTracker()
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.retries = 0
+        self.fast_failures = 0
+
+    def hedge_delay(self, stream=False):
+        tracker = self.first_byte if stream else self.latency
+        if tracker.count() < 5:
+            return self.default_hedge_delay
+        return max(self.min_hedge_delay, tracker.percentile(self.hedge_percentile))
+
+    def backoff(self, attempt, response=None):
+        """Backoff exponentiel 'full jitter', Retry-After respecte"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except (TypeError, ValueError):
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _attempt(self, url, headers, data, timeout, results, tag, stream=False):
+        start = time.time()
+        try:
+            response, timing = self.pool.post(url, headers=headers, data=data,
+                                              timeout=timeout, stream=stream)
+            # En streaming, seuls les en-tetes sont arrives
+            (self.first_byte if stream else self.latency).add(time.time() - start)
+            results.put((tag, response, timing, None))
+        except Exception as e:
+            results.put((tag, None, None, e))
+
+    def _close_late(self, results, outstanding):
+        """Fermer en arriere-plan les reponses arrivees apres le choix"""
+        def close():
+            for _ in range(outstanding):
+                try:
+                    _, response, _, _ = results.get(timeout=self.timeout)
+                except queue.Empty:
+                    return
+                if response is not None:
+                    response.close()
+        if outstanding:
+            t = threading.Thread(target=close)
+            t.daemon = True
+            t.start()
+
+    def _hedged_post(self, url, headers, data, timeout, stream=False):
+        """Premiere requete, puis un doublon si elle depasse le delai
+
+        Les reponses sont attendues au plus timeout secondes au total; une
+        requete plus lente est abandonnee (son thread finit seul, sa
+        reponse est fermee). En streaming, le delai porte sur les en-tetes.
+        """
+        end = time.time() + timeout
+        results = queue.Queue()
+        for tag in ("primary", "hedge"):
+            t = threading.Thread(target=self._attempt,
+                                 args=(url, headers, data, timeout, results, tag, stream))
+            t.daemon = True
+            t.start()
+            if tag == "hedge":
+                self.hedges += 1
+                break
+            try:
+                return results.get(timeout=min(self.hedge_delay(stream), timeout))
+            except queue.Empty:
+                if time.time() >= end:
+                    self._close_late(results, 1)
+                    return ("primary", None, None, LLMTimeoutError("Timeout LLM (%.0fs)" % timeout))
+
+        # Deux requetes en vol: garder la premiere reponse utilisable
+        outstanding = 2
+        first = None
+        while outstanding:
+            try:
+                outcome = results.get(timeout=max(0.0, end - time.time()))
+            except queue.Empty:
+                break
+            outstanding -= 1
+            tag, response, timing, error = outcome
+            if error is None and response.status_code not in RETRY_STATUS:
+                if tag == "hedge":
+                    self.hedge_wins += 1
+                if first is not None and first[1] is not None:
+                    first[1].close()
+                self._close_late(results, outstanding)
+                return outcome
+            if first is None:
+                first = outcome
+            elif response is not None:
+                response.close()
+        self._close_late(results, outstanding)
+        if first is None:
+            return ("primary", None, None, LLMTimeoutError("Timeout LLM (%.0fs)" % timeout))
+        return first
+
+    def _streamed_post(self, url, headers, data, timeout, on_text, info):
+        """Requete en streaming, lue jusqu'au bout (texte dans info)
+
+        Doublon possible avant les en-tetes; ensuite un seul flux, lu avant
+        start + timeout.
+        """
+        start = time.time()
+        tag, response, timing, error = self._hedged_post(url, headers, data, timeout, stream=True)
+        if error is not None:
+            return tag, response, timing, error
+        try:
+            if response.status_code != 200:
+                # Corps d'erreur court: lu pour liberer la connexion du pool
+                response.content
+                return tag, response, timing, None
+            info["content"], info["finish_reason"] = read_completion(
+                response, on_text, deadline=start + timeout)
+        except Exception as e:
+            response.close()
+            return tag, None, None, e
+        total = time.time() - start
+        self.latency.add(total)
+        timing["transfer_s"] = round(max(0.0, total - timing["connect_s"]), 4)
+        timing["total_s"] = round(total, 4)
+        return tag, response, timing, None
+
+    def post(self, url, headers, data, on_text=None, deadline=None):
+        """Envoyer la requete
+
+        Args:
+            on_text: Streaming: fonction (texte recu jusqu'ici) appelee a
+                chaque token; le corps doit demander "stream": true
+            deadline: Heure limite (time.time()) pour l'ensemble des
+                tentatives; chaque tentative dure au plus self.timeout
+
+        Returns:
+            (response, info): info contient timing, attempts, hedged, et en
+            streaming content et finish_reason
+
+        Raises:
+            CircuitOpenError si le disjoncteur est ouvert, LLMTimeoutError
+            si la deadline est depassee, sinon la derniere erreur reseau
+        """
+        if not self.breaker.allow():
+            self.fast_failures += 1
+            raise CircuitOpenError("Disjoncteur ouvert")
+
+        info = {"attempts": 0, "hedged": False, "timing": None}
+        response = None
+        error = None
+        for attempt in range(self.max_retries + 1):
+            timeout = self.timeout
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.time())
+                if timeout <= 0:
+                    error = LLMTimeoutError("Timeout LLM: delai global depasse")
+                    break
+            info["attempts"] = attempt + 1
+            if on_text is None:
+                tag, response, timing, error = self._hedged_post(url, headers, data, timeout)
+            else:
+                tag, response, timing, error = self._streamed_post(url, headers, data, timeout,
+                                                                   on_text, info)
+            info["hedged"] = info["hedged"] or tag == "hedge"
+            info["timing"] = timing
+            if error is None and response.status_code not in RETRY_STATUS:
+                break
+            if response is not None:
+                # Connexion rendue au pool avant la tentative suivante
+                response.close()
+            if attempt < self.max_retries:
+                delay = self.backoff(attempt, response)
+                if deadline is not None and time.time() + delay >= deadline:
+                    break
+                self.retries += 1
+                time.sleep(delay)
+
+        if error is not None or response.status_code in RETRY_STATUS:
+            self.breaker.record_failure()
+            if error is not None:
+                raise error
+        else:
+            self.breaker.record_success()
+        return response, info
+
+    def stats(self):
+        stats = self.latency.stats()
+        stats.update({
+            "hedge_delay_s": round(self.hedge_delay(), 3),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "retries": self.retries,
+            "fast_failures": self.fast_failures,
+            "breaker": self.breaker.state,
+        })
+        return stats
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+"""
+Logs du terminal Streamlit en tampon circulaire (Python 3)
+
+Chaque log est horodate, classe (ok, erreur, action, info) et echappe en
+HTML une seule fois, a l'ajout. Le terminal ne garde que les derniers
+logs (deque de taille fixe) et chaque entree porte un numero croissant:
+l'affichage ne reprend que les entrees arrivees depuis son dernier
+rafraichissement. Le flux complet est ecrit au fil de l'eau dans un
+journal sur disque, ouvert au premier log et exportable a tout moment.
+"""
+
+import html
+import io
+import itertools
+import os
+import shutil
+import threading
+import time
+from collections import deque
+
+
+def classify_log(message):
+    """Classe CSS du terminal pour un log (None: texte normal)"""
+    if "OK " in message or "succes" in message.lower():
+        return "log-ok"
+    elif "X " in message or "Erreur" in message or "erreur" in message:
+        return "log-error"
+    elif ">>>" in message:
+        return "log-action"
+    elif "===" in message or "---" in message:
+        return "log-info"
+    return None
+
+
+class LogStore(object):
+    """Derniers logs pre-formates + journal complet
+
+    Args:
+        capacity: Logs gardes en memoire pour le terminal
+        journal_path: Fichier ou ecrire tous les logs (None: pas de journal)
+    """
+
+    def __init__(self, capacity=200, journal_path=None):
+        self.entries = deque(maxlen=capacity)
+        self.journal_path = journal_path
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self._journal = None
+
+    def _open_journal(self):
+        """Journal cree au premier log: pas de fichier vide pour un robot
+        jamais utilise (appele sous le verrou)"""
+        folder = os.path.dirname(self.journal_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._journal = io.open(self.journal_path, "a", encoding="utf-8")
+
+    def add(self, message):
+        """Ajouter un log: horodatage, classe et echappement faits ici, une fois"""
+        line = f"[{time.strftime('%H:%M:%S')}] {message}"
+        css = classify_log(message)
+        escaped = html.escape(line)
+        entry_html = f'<span class="{css}">{escaped}</span>' if css else escaped
+        with self._lock:
+            self.entries.append((next(self._seq), line, entry_html))
+            if self._journal is None and self.journal_path:
+                self._open_journal()
+            if self._journal:
+                self._journal.write(line + "\n")
+                self._journal.flush()
+
+    def last_seq(self):
+        with self._lock:
+            return self.entries[-1][0] if self.entries else 0
+
+    def since(self, seq, limit=None):
+        """Entrees (numero, texte, html) posterieures a seq
+
+        Args:
+            limit: Ne rendre que les plus recentes
+        """
+        with self._lock:
+            if not self.entries or self.entries[-1][0] <= seq:
+                return []
+            # Les numeros se suivent: seules les entrees recentes sont parcourues
+            count = min(self.entries[-1][0] - seq, len(self.entries))
+            if limit is not None:
+                count = min(count, limit)
+            return list(itertools.islice(self.entries, len(self.entries) - count, None))
+
+    def lines(self):
+        with self._lock:
+            return [line for _, line, _ in self.entries]
+
+    def export(self, path):
+        """Ecrire le flux complet (journal, sinon le tampon) dans path"""
+        with self._lock:
+            if self._journal:
+                self._journal.flush()
+                shutil.copyfile(self.journal_path, path)
+            else:
+                with io.open(path, "w", encoding="utf-8") as f:
+                    for _, line, _ in self.entries:
+                        f.write(line + "\n")
+        return path
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+"""
+Facade ALMotion avec cache de raideur et regroupement des appels (Python 2.7 / 3)
+
+- La raideur courante de chaque chaine (LArm, RArm, Head, LLeg, RLeg) est
+  memorisee: une demande qui ne change rien n'envoie aucun appel.
+- Les changements de raideur de plusieurs chaines partent en un seul
+  setStiffnesses(liste, liste); les consignes d'angles de meme vitesse en
+  un seul setAngles(liste, liste, vitesse).
+- Les appels reellement envoyes sont compares a ceux qu'auraient faits les
+  appels un par un: nombre de RPC evites par reponse.
+"""
+
+import threading
+import time
+
+
+GESTURE_CHAINS = ("LArm", "RArm", "Head", "LLeg", "RLeg")
+
+# Raideurs pendant les gestes: bras souples, tete, jambes verrouillees
+GESTURE_STIFFNESS = (("LArm", 0.8), ("RArm", 0.8), ("Head", 0.6), ("LLeg", 1.0), ("RLeg", 1.0))
+
+
+class MotionFacade(object):
+    """Acces a ALMotion avec cache de raideur et compteur de RPC
+
+    Args:
+        motion: Proxy ALMotion
+        settle: Attente apres une hausse de raideur (moteurs en charge)
+    """
+
+    def __init__(self, motion, settle=0.1):
+        self.motion = motion
+        self.settle = settle
+        self._stiffness = {}
+        self._lock = threading.RLock()
+        self.rpc = 0
+        self.naive_rpc = 0
+        self._answer_start = (0, 0)
+
+    def _count(self, sent, naive):
+        self.rpc += sent
+        self.naive_rpc += naive
+
+    def set_stiffness(self, stiffnesses, settle=None):
+        """Appliquer des raideurs par chaine, sans repeter l'etat connu
+
+        Args:
+            stiffnesses: Liste de (chaine, raideur) ou dict
+            settle: Attente apres une hausse (None = valeur du constructeur)
+
+        Returns:
+            True si au moins une chaine a change
+        """
+        if isinstance(stiffnesses, dict):
+            stiffnesses = sorted(stiffnesses.items())
+        with self._lock:
+            changes = [(chain, float(value)) for chain, value in stiffnesses
+                       if self._stiffness.get(chain) != float(value)]
+            raised = any(value > (self._stiffness.get(chain) or 0.0) for chain, value in changes)
+            if changes:
+                self.motion.setStiffnesses([c for c, _ in changes], [v for _, v in changes])
+                for chain, value in changes:
+                    self._stiffness[chain] = value
+            self._count(1 if changes else 0, len(stiffnesses))
+        settle = self.settle if settle is None else settle
+        if raised and settle:
+            time.sleep(settle)
+        return bool(changes)
+
+    def release(self, chains=GESTURE_CHAINS, force=False):
+        """Relacher les chaines (force: ignorer le cache, ex. a la deconnexion)"""
+        if force:
+            self.invalidate(chains)
+        return self.set_stiffness([(chain, 0.0) for chain in chains])
+
+    def invalidate(self, chains=None):
+        """Oublier l'etat connu (raideur changee hors de la facade)"""
+        with self._lock:
+            if chains is None:
+                self._stiffness.clear()
+            else:
+                for chain in chains:
+                    self._stiffness.pop(chain, None)
+
+    def set_angles(self, commands, speed, post=False):
+        """Envoyer plusieurs consignes de meme vitesse en un seul setAngles
+
+        Args:
+            commands: Liste de (articulation, angle)
+            speed: Fraction de la vitesse maximale
+        """
+        names = [name for name, _ in commands]
+        angles = [float(angle) for _, angle in commands]
+        with self._lock:
+            self._count(1, len(commands))
+        if post:
+            return self.motion.post.setAngles(names, angles, speed)
+        self.motion.setAngles(names, angles, speed)
+        return None
+
+    def play(self, gesture, wait=False, time_scale=1.0):
+        """Jouer un geste compile (nao_gesture_library_py27.Gesture)"""
+        with self._lock:
+            self._count(1, len(gesture.keyframes))
+        return gesture.play(self.motion, wait=wait, time_scale=time_scale)
+
+    def begin_answer(self):
+        """Debut d'une reponse parlee: point de depart du compteur"""
+        with self._lock:
+            self._answer_start = (self.rpc, self.naive_rpc)
+
+    def answer_stats(self):
+        """RPC moteur envoyes / evites depuis begin_answer()"""
+        with self._lock:
+            rpc = self.rpc - self._answer_start[0]
+            naive = self.naive_rpc - self._answer_start[1]
+        return {"rpc": rpc, "naive_rpc": naive, "saved": naive - rpc}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rpc": self.rpc,
+                "naive_rpc": self.naive_rpc,
+                "saved": self.naive_rpc - self.rpc,
+                "stiffness": dict(self._stiffness),
+            }
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""
+Construction incrementale du corps JSON des requetes chat (Python 2.7 / 3)
+
+Au lieu de re-serialiser [systeme] + tout l'historique a chaque tour:
+- le message systeme encode est garde en cache par contenu (donc par langue)
+- le prefixe encode des tours deja envoyes est garde; seuls les nouveaux
+  messages sont serialises et ajoutes
+Le resultat est le meme JSON UTF-8 que json.dumps(payload, ensure_ascii=False).
+"""
+
+import json
+import threading
+
+
+def encode_json(obj):
+    """json.dumps(ensure_ascii=False) encode en UTF-8 (Python 2 et 3)"""
+    data = json.dumps(obj, ensure_ascii=False)
+    if not isinstance(data, bytes):
+        data = data.encode("utf-8")
+    return data
+
+
+class PayloadBuilder(object):
+    """Corps de requete chat construit par morceaux pre-encodes
+
+    Les messages systeme (prompt + resume) sont mis en cache par contenu.
+    Les tours de conversation sont reconnus par identite: tant que la liste
+    de tours ne fait que grandir (ou perdre des tours en tete apres un
+    resume), seuls les nouveaux messages sont encodes.
+    """
+
+    def __init__(self, max_system_entries=8):
+        self.max_system_entries = max_system_entries
+        self._system_cache = {}
+        self._turn_refs = []
+        self._turn_lengths = []
+        self._prefix = b""
+        self._lock = threading.Lock()
+        self.encoded_messages = 0
+
+    def _encode_system(self, message):
+        key = (message.get("role"), message.get("content"))
+        data = self._system_cache.get(key)
+        if data is None:
+            if len(self._system_cache) >= self.max_system_entries:
+                self._system_cache.clear()
+            data = encode_json(message)
+            self._system_cache[key] = data
+            self.encoded_messages += 1
+        return data
+
+    def _sync_turns(self, turns):
+        """Mettre le prefixe encode en phase avec la liste de tours"""
+        refs = self._turn_refs
+        # Tours retires en tete (repli dans le resume): couper le prefixe
+        if refs and turns and refs[0] is not turns[0]:
+            drop = None
+            for index, ref in enumerate(refs):
+                if ref is turns[0]:
+                    drop = index
+                    break
+            if drop is None:
+                self._reset()
+            else:
+                cut = sum(self._turn_lengths[:drop]) + 2 * drop
+                self._prefix = self._prefix[cut:]
+                del refs[:drop]
+                del self._turn_lengths[:drop]
+        elif not turns:
+            self._reset()
+
+        # Verification O(1): meme premier et meme dernier tour deja encode
+        refs = self._turn_refs
+        common = len(refs)
+        if common and (len(turns) < common or turns[0] is not refs[0]
+                       or turns[common - 1] is not refs[-1]):
+            # Historique modifie au milieu: on repart de zero
+            self._reset()
+            common = 0
+
+        for turn in turns[common:]:
+            data = encode_json(turn)
+            self.encoded_messages += 1
+            if self._turn_refs:
+                self._prefix += b", " + data
+            else:
+                self._prefix = data
+            self._turn_refs.append(turn)
+            self._turn_lengths.append(len(data))
+
+    def _reset(self):
+        self._turn_refs = []
+        self._turn_lengths = []
+        self._prefix = b""
+
+    def build(self, messages, **params):
+        """Corps JSON encode pour messages (systeme d'abord, puis tours)
+
+        Args:
+            messages: liste [systeme, (resume systeme), tours...]
+            params: autres champs du payload (model, temperature, ...)
+        """
+        leading = []
+        index = 0
+        while index < len(messages) and messages[index].get("role") == "system":
+            leading.append(messages[index])
+            index += 1
+        turns = messages[index:]
+
+        with self._lock:
+            parts = [self._encode_system(m) for m in leading]
+            self._sync_turns(turns)
+            if self._prefix:
+                parts.append(self._prefix)
+            body = b", ".join(parts)
+
+        head = encode_json(params)[:-1]
+        if params:
+            head += b", "
+        return head + b'"messages": [' + body + b"]}"
+
+    def reset(self):
+        with self._lock:
+            self._system_cache.clear()
+            self._reset()
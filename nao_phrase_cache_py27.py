@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+
+"""
+Cache audio des phrases frequentes de NAO (Python 2.7 / 3)
+
+Les phrases fixes (accueil, "je n'ai pas compris", erreurs, au revoir) sont
+synthetisees une seule fois par langue et reglage de voix avec
+ALTextToSpeech.sayToFile; le fichier reste sur le robot et est rejoue par
+ALAudioPlayer, sans repasser par la synthese. Les phrases des reponses LLM
+qui reviennent souvent sont apprises et pre-synthetisees de la meme facon.
+
+Le nombre de fichiers est borne: les fichiers sont des emplacements
+numerotes, reutilises par la phrase la moins recemment jouee (LRU). Aucun
+fichier n'a donc besoin d'etre supprime sur le robot.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from nao_speech_py27 import split_sentences
+
+
+NOT_UNDERSTOOD = {
+    "fr": u"Je n'ai pas compris. Pouvez-vous repeter?",
+    "en": u"I didn't understand. Can you repeat?",
+}
+
+ERROR_ANSWERS = {
+    "fr": u"Desole, je n'ai pas pu traiter votre demande.",
+    "en": u"Sorry, I couldn't process your request.",
+}
+
+GOODBYE = {
+    "fr": u"Merci pour cette conversation! A bientot!",
+    "en": u"Thank you for this conversation! See you soon!",
+}
+
+_SPACES_RE = re.compile(u"\\s+", re.UNICODE)
+
+
+def _to_unicode(text):
+    if isinstance(text, bytes):
+        return text.decode("utf-8", "ignore")
+    return text
+
+
+def canonical_phrase(text):
+    """Texte tel que prononce: espaces normalises, casse et ponctuation gardees"""
+    return _SPACES_RE.sub(u" ", _to_unicode(text or u"")).strip()
+
+
+def fixed_phrases(lang, extra=()):
+    """Phrases fixes a pre-synthetiser pour une langue"""
+    phrases = [NOT_UNDERSTOOD.get(lang), ERROR_ANSWERS.get(lang), GOODBYE.get(lang)]
+    phrases.extend(extra)
+    return [p for p in phrases if p]
+
+
+class PhraseCache(object):
+    """Fichiers audio pre-synthetises sur le robot, rejoues par ALAudioPlayer
+
+    Args:
+        tts, audio_player: Proxies ALTextToSpeech et ALAudioPlayer
+        path: Index local (JSON) des phrases deja synthetisees
+        remote_dir: Dossier des fichiers sur le robot
+        max_entries: Nombre maximal de fichiers (emplacements)
+        learn_after: Une phrase LLM dite ce nombre de fois est pre-synthetisee
+        volume: Volume de lecture ALAudioPlayer (0-1)
+    """
+
+    def __init__(self, tts, audio_player, path=None, remote_dir="/home/nao", max_entries=60,
+                 learn_after=3, max_phrase_chars=200, volume=0.8, log_fn=None):
+        self.tts = tts
+        self.audio_player = audio_player
+        self.path = path
+        self.remote_dir = remote_dir.rstrip("/")
+        self.max_entries = max_entries
+        self.learn_after = learn_after
+        self.max_phrase_chars = max_phrase_chars
+        self.volume = volume
+        self.log_fn = log_fn
+        self.voice = u""
+        self._entries = OrderedDict()
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._queue = []
+        self._queue_cond = threading.Condition(self._lock)
+        self._idle = threading.Event()
+        self._idle.set()
+        self._cancelled = threading.Event()
+        self._running = True
+        self.hits = 0
+        self.misses = 0
+        self.renders = 0
+        self.evictions = 0
+        self.load()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _log(self, message):
+        if self.log_fn:
+            self.log_fn(message)
+
+    def set_voice(self, lang, speed=100, voice_name=u""):
+        """Reglages de voix courants: font partie de la cle de chaque fichier"""
+        self.voice = u"%s|%s|%d" % (lang, voice_name, int(speed))
+
+    def make_key(self, text):
+        data = self.voice + u"|" + canonical_phrase(text)
+        return hashlib.md5(data.encode("utf-8")).hexdigest()
+
+    def remote_path(self, slot):
+        return "%s/nao_phrase_%03d.wav" % (self.remote_dir, slot)
+
+    def lookup(self, text):
+        """Chemin du fichier sur le robot (None si la phrase n'est pas prete)"""
+        key = self.make_key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            del self._entries[key]
+            self._entries[key] = entry
+            return self.remote_path(entry["slot"])
+
+    def plan(self, text):
+        """[(phrase, chemin)] si le texte entier ou chacune de ses phrases est prete"""
+        path = self.lookup(text)
+        if path:
+            return [(canonical_phrase(text), path)]
+        sentences = split_sentences(text)
+        paths = [self.lookup(s) for s in sentences]
+        if not sentences or None in paths:
+            return None
+        return list(zip(sentences, paths))
+
+    def speak(self, text, on_sentence=None):
+        """Rejouer le texte depuis le cache s'il est entierement pre-synthetise
+
+        Args:
+            on_sentence: fonction (index, phrase) appelee avant chaque fichier
+                (geste de la phrase)
+
+        Returns:
+            True si le texte a ete dit, False s'il faut passer par la synthese
+        """
+        plan = self.plan(text)
+        if plan is None:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        self._cancelled.clear()
+        for index, (sentence, path) in enumerate(plan):
+            if self._cancelled.is_set():
+                break
+            if on_sentence:
+                on_sentence(index, sentence)
+            try:
+                self.audio_player.playFile(path, self.volume, 0.0)
+            except Exception as e:
+                if self._cancelled.is_set():
+                    break
+                # Fichier absent (robot reinitialise...): oublier et synthetiser
+                self._log("X Cache audio: %s illisible (%s)" % (path, str(e)))
+                self.forget(sentence)
+                if index == 0:
+                    return False
+                self.tts.say(sentence.encode("utf-8"))
+        return True
+
+    def cancel(self):
+        """Interrompre le fichier en cours et ne pas jouer les suivants"""
+        self._cancelled.set()
+        try:
+            self.audio_player.stopAll()
+        except Exception:
+            pass
+
+    def forget(self, text):
+        with self._lock:
+            self._entries.pop(self.make_key(text), None)
+        self.save()
+
+    def prerender(self, texts, pinned=True):
+        """Synthetiser ces phrases en arriere-plan (pinned: jamais evincees
+        tant qu'une phrase apprise peut l'etre)"""
+        with self._lock:
+            for text in texts:
+                text = canonical_phrase(text)
+                if text and self.make_key(text) not in self._entries:
+                    self._queue.append((text, self.voice, pinned))
+            self._queue_cond.notify()
+
+    def observe(self, text):
+        """Compter les phrases dites; pre-synthetiser celles qui reviennent"""
+        learned = []
+        with self._lock:
+            for sentence in split_sentences(text):
+                if len(sentence) > self.max_phrase_chars:
+                    continue
+                key = self.make_key(sentence)
+                if key in self._entries:
+                    continue
+                count = self._counts.get(key, 0) + 1
+                self._counts[key] = count
+                if count == self.learn_after:
+                    learned.append(sentence)
+            # Compteurs bornes: on oublie les phrases vues une seule fois
+            if len(self._counts) > 10 * self.max_entries:
+                self._counts = dict((k, c) for k, c in self._counts.items() if c > 1)
+        if learned:
+            self.prerender(learned, pinned=False)
+
+    @contextmanager
+    def speaking(self):
+        """Pas de synthese de fichier pendant que NAO parle"""
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._idle.set()
+
+    def _free_slot(self):
+        """Emplacement libre, sinon celui de la phrase la moins recemment jouee"""
+        used = set(entry["slot"] for entry in self._entries.values())
+        for slot in range(self.max_entries):
+            if slot not in used:
+                return slot
+        # Phrases apprises ou d'une autre voix d'abord, puis les plus anciennes
+        candidates = [key for key, entry in self._entries.items()
+                      if not entry["pinned"] or entry["voice"] != self.voice]
+        victim = candidates[0] if candidates else next(iter(self._entries))
+        self.evictions += 1
+        return self._entries.pop(victim)["slot"]
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while self._running and not self._queue:
+                    self._queue_cond.wait(0.5)
+                if not self._running:
+                    return
+                text, voice, pinned = self._queue.pop(0)
+            self._idle.wait()
+            self._render(text, voice, pinned)
+
+    def _render(self, text, voice, pinned):
+        if voice != self.voice:
+            return
+        key = self.make_key(text)
+        with self._lock:
+            if key in self._entries:
+                return
+            slot = self._free_slot()
+        path = self.remote_path(slot)
+        start = time.time()
+        try:
+            self.tts.sayToFile(text.encode("utf-8"), path)
+        except Exception as e:
+            self._log("X Cache audio: synthese impossible (%s)" % str(e))
+            return
+        with self._lock:
+            self._entries[key] = {"text": text, "voice": voice, "slot": slot,
+                                  "pinned": pinned, "created": time.time()}
+            self._counts.pop(key, None)
+            self.renders += 1
+        self._log(">>> Cache audio: '%s' pre-synthetise (%.2fs)" % (text, time.time() - start))
+        self.save()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        with self._lock:
+            for key, entry in data.get("entries", []):
+                if entry.get("slot", self.max_entries) < self.max_entries:
+                    self._entries[key] = entry
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {"entries": list(self._entries.items())}
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError):
+            pass
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+            self._queue_cond.notify_all()
+        self._thread.join(2.0)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "pending": len(self._queue),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(float(self.hits) / total, 3) if total else 0.0,
+                "renders": self.renders,
+                "evictions": self.evictions,
+            }
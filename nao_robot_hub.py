@@ -0,0 +1,484 @@
+# -*- coding: utf-8 -*-
+
+"""
+Etat partage d'un robot NAO entre plusieurs pages Streamlit (Python 3)
+
+Un RobotHub par robot (ip:port), partage par tous les onglets ouverts
+(st.cache_resource): un seul bridge Python 2.7, une seule connexion
+NAOqi. Il regroupe:
+- un arbitre: un seul echange a la fois, quel que soit l'onglet qui le
+  lance; les autres boutons sont refuses tant qu'il n'est pas fini,
+- un thread repartiteur: chaque evenement du bridge fait avancer l'etat
+  (chat, statut, logs) une seule fois, puis est diffuse,
+- la conversation, ecrite dans un TranscriptStore (SQLite): une session
+  par connexion, le chat ne relit que sa derniere page,
+- un bus d'evenements: chaque onglet s'abonne a sa propre file et
+  rafraichit son affichage quand un evenement arrive.
+"""
+
+import os
+import queue
+import threading
+import time
+
+from nao_bridge_client import BridgeClient
+from nao_log_store import LogStore
+from nao_transcript_store import TranscriptStore
+from nao_turn_latency import TurnLatency
+
+
+LISTENING_MESSAGE = "🎤 Ecoute en cours..."
+
+# Commandes d'un echange dont l'aller-retour est mesure (etape "command")
+TIMED_COMMANDS = ("listen", "get_response", "speak")
+
+
+class Subscription(queue.Queue):
+    """File d'un abonne, horodatee a chaque lecture"""
+
+    def __init__(self, maxsize=0):
+        queue.Queue.__init__(self, maxsize)
+        self.last_read = time.time()
+
+    def get(self, block=True, timeout=None):
+        self.last_read = time.time()
+        return queue.Queue.get(self, block, timeout)
+
+
+class EventBus(object):
+    """Diffusion des evenements vers une file par abonne
+
+    Un abonne qui ne lit plus perd ses evenements les plus anciens au lieu
+    de bloquer les autres. Apres idle_timeout sans lecture (onglet ferme),
+    il est retire; un onglet encore ouvert se reabonne (is_subscribed).
+    """
+
+    def __init__(self, maxsize=500, idle_timeout=120.0):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        subscription = Subscription(maxsize=self.maxsize)
+        with self._lock:
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def is_subscribed(self, subscription):
+        with self._lock:
+            return subscription in self._subscribers
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event):
+        now = time.time()
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers
+                                 if now - s.last_read <= self.idle_timeout]
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            while True:
+                try:
+                    subscription.put_nowait(event)
+                    break
+                except queue.Full:
+                    try:
+                        subscription.get_nowait()
+                    except queue.Empty:
+                        pass
+
+
+class RobotHub(object):
+    """Bridge, etat de conversation et arbitre d'un robot
+
+    Args:
+        nao_ip, nao_port: Robot pilote
+        command, env, cwd: Lancement du bridge (voir BridgeClient)
+        max_logs: Logs gardes pour le terminal
+        log_dir: Dossier du journal complet des logs (None: pas de journal)
+        transcript: TranscriptStore partage (None: base en memoire)
+    """
+
+    def __init__(self, nao_ip, nao_port, command, env=None, cwd=None, max_logs=200,
+                 log_dir=None, transcript=None):
+        self.nao_ip = nao_ip
+        self.nao_port = nao_port
+        self.command = command
+        self.env = env
+        self.cwd = cwd
+        self.bus = EventBus()
+        self.lock = threading.RLock()
+        self.bridge = None
+        self.connected = False
+        self.robot_status = "disconnected"
+        self.is_processing = False
+        self.owner = None
+        self.language = "fr"
+        self.exchange_count = 0
+        self.transcript = transcript if transcript is not None else TranscriptStore(":memory:")
+        self.session_id = None
+        # Incremente a chaque changement du chat: les pages relisent la base
+        # seulement quand il change
+        self.chat_version = 0
+        self.message_count = 0
+        # Message provisoire ("ecoute en cours"), jamais enregistre
+        self.pending_message = None
+        # Reponse du LLM en cours de reception (streaming), jamais enregistree
+        self.streaming_text = ""
+        # Reponse en train d'etre dite (phrase en cours: speech_progress)
+        self.speaking_text = ""
+        journal_path = None
+        if log_dir:
+            journal_path = os.path.join(
+                log_dir, f"nao_{nao_ip}_{nao_port}_{time.strftime('%Y%m%d_%H%M%S')}.log")
+        self.logs = LogStore(max_logs, journal_path)
+        self.llm_stats = {}
+        self.motion_rpc = {}
+        self.speech_progress = {}
+        # Latences par etape des echanges (tableau de bord)
+        self.latency = TurnLatency()
+        self._submitted = {}
+        self._events = queue.Queue()
+        # Demarre a la premiere connexion (adresse saisie mais jamais connectee)
+        self._dispatcher = None
+
+    # --------------------------------------------------------
+    # Lecture de l'etat (pages)
+    # --------------------------------------------------------
+
+    def layout(self):
+        """Ce qui change la mise en page (connexion, boutons actifs)"""
+        with self.lock:
+            return (self.connected, self.is_processing, self.robot_status == "connecting")
+
+    def snapshot(self):
+        """Copie coherente de l'etat pour l'affichage"""
+        with self.lock:
+            return {
+                "connected": self.connected,
+                "robot_status": self.robot_status,
+                "is_processing": self.is_processing,
+                "owner": self.owner,
+                "exchange_count": self.exchange_count,
+                "session_id": self.session_id,
+                "chat_version": self.chat_version,
+                "message_count": self.message_count,
+                "pending_message": self.pending_message,
+                "streaming_text": self.streaming_text,
+                "speaking_text": self.speaking_text,
+                "llm_stats": self.llm_stats,
+                "motion_rpc": self.motion_rpc,
+                "speech_progress": self.speech_progress,
+            }
+
+    def live(self):
+        """Etat qui change token par token ou phrase par phrase (bulle en direct)"""
+        with self.lock:
+            return self.robot_status, self.streaming_text, self.speaking_text, self.speech_progress
+
+    def add_log(self, message):
+        """Ajouter un log au terminal"""
+        self.logs.add(message)
+
+    def _start_session(self):
+        """Nouvelle session de conversation (a chaque connexion reussie)"""
+        self.session_id = self.transcript.start_session(f"{self.nao_ip}:{self.nao_port}")
+        self.message_count = 0
+        self.pending_message = None
+        self.chat_version += 1
+
+    def _add_message(self, role, content):
+        """Enregistrer un message dans la session en cours (ignore hors session)"""
+        if self.session_id is None:
+            return
+        self.transcript.add(self.session_id, role, content)
+        self.message_count += 1
+        self.chat_version += 1
+
+    def _set_pending(self, message):
+        self.pending_message = message
+        self.chat_version += 1
+
+    # --------------------------------------------------------
+    # Commandes (arbitre)
+    # --------------------------------------------------------
+
+    def _submit(self, action, params=None):
+        bridge = self.bridge
+        if action in TIMED_COMMANDS:
+            self._submitted[action] = time.time()
+        if not bridge or not bridge.submit(action, params):
+            self.add_log("X Bridge non disponible")
+            return False
+        return True
+
+    def _record_stages(self, action, payload):
+        """Etapes d'une reponse du bridge + aller-retour de la commande"""
+        stages = list(payload.get("stages", []))
+        submitted = self._submitted.pop(action, None)
+        if submitted is not None:
+            stages.append({"stage": "command", "command": action, "start": submitted,
+                           "duration_s": round(time.time() - submitted, 4)})
+        self.latency.add(stages)
+
+    def _begin_turn(self, owner, language):
+        """Reserver le robot pour un echange
+
+        Returns:
+            False si un echange est deja en cours (autre onglet compris)
+        """
+        if not self.connected or self.is_processing:
+            return False
+        self.is_processing = True
+        self.owner = owner
+        self.language = language
+        self.exchange_count += 1
+        self.latency.begin()
+        # Synchroniser la langue avec le bridge
+        self._submit("set_language", {"language": language})
+        return True
+
+    def connect(self, language):
+        """Lancer le bridge et la connexion (la suite arrive par evenements)"""
+        with self.lock:
+            if self.connected or self.robot_status == "connecting":
+                return False
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+                self._dispatcher.start()
+            self.add_log("=" * 50)
+            self.add_log("CONNEXION AU ROBOT NAO")
+            self.add_log("=" * 50)
+            try:
+                self.bridge = BridgeClient(self.command, events=self._events,
+                                           env=self.env, cwd=self.cwd).start()
+                self.add_log("OK Bridge Python 2.7 demarre")
+            except Exception as e:
+                self.add_log(f"X Erreur demarrage bridge: {e}")
+                self.bridge = None
+                return False
+            self.language = language
+            self.robot_status = "connecting"
+            # La session s'ouvre quand le bridge confirme la connexion
+            self.session_id = None
+            self.message_count = 0
+            self.pending_message = None
+            self.chat_version += 1
+            # Lue par le bridge des qu'il est pret
+            self._submit("connect", {
+                "nao_ip": self.nao_ip,
+                "nao_port": self.nao_port,
+                "language": language
+            })
+        self.bus.publish({"action": "hub_state"})
+        return True
+
+    def disconnect(self):
+        """Deconnecter du robot (pour tous les onglets)"""
+        with self.lock:
+            bridge = self.bridge
+            was_connected = self.connected
+            self.add_log(">>> Deconnexion...")
+            self._submit("disconnect")
+            self.bridge = None
+            self.connected = False
+            self.robot_status = "disconnected"
+            self.is_processing = False
+            self.owner = None
+            self.speech_progress = {}
+        # Hors verrou: l'arret du processus peut prendre quelques secondes
+        if bridge:
+            bridge.stop()
+        with self.lock:
+            self._set_pending(None)
+            if was_connected:
+                self._add_message("system", "Deconnecte du robot")
+            self.add_log("OK Deconnecte")
+        self.bus.publish({"action": "hub_state"})
+
+    def listen_and_respond(self, owner, language):
+        """Echange a la voix: ecouter, reflechir et repondre"""
+        with self.lock:
+            if not self._begin_turn(owner, language):
+                return False
+            self.add_log(f"--- Echange {self.exchange_count} ---")
+            self.robot_status = "listening"
+            self._set_pending(LISTENING_MESSAGE)
+            # Le bridge lance la reflexion des que la transcription est connue
+            self._submit("listen", {"max_duration": 10, "think_after": True})
+        self.bus.publish({"action": "hub_state"})
+        return True
+
+    def send_text(self, owner, text, language):
+        """Echange en mode texte"""
+        with self.lock:
+            if not text or not self._begin_turn(owner, language):
+                return False
+            self._add_message("human", text)
+            # Reflexion en arriere-plan pendant la requete LLM, arretee a
+            # l'arrivee de la reponse
+            self.robot_status = "thinking"
+            self._submit("think")
+            self._submit("get_response", {"text": text})
+        self.bus.publish({"action": "hub_state"})
+        return True
+
+    def say_greeting(self, owner, language):
+        """Faire dire le message d'accueil (ex. a toute la flotte)"""
+        with self.lock:
+            if not self._begin_turn(owner, language):
+                return False
+            self.robot_status = "speaking"
+            self._submit("say_greeting", {"language": language})
+        self.bus.publish({"action": "hub_state"})
+        return True
+
+    def cancel_speech(self):
+        """Interrompre NAO, depuis n'importe quel onglet"""
+        with self.lock:
+            return self._submit("cancel_speech")
+
+    # --------------------------------------------------------
+    # Evenements du bridge
+    # --------------------------------------------------------
+
+    def _dispatch(self):
+        while True:
+            event = self._events.get()
+            try:
+                with self.lock:
+                    self._handle_event(event)
+            except Exception as e:
+                self.add_log(f"X Evenement {event.get('action')}: {e}")
+            self.bus.publish(event)
+
+    def _finish_turn(self):
+        """Fin d'un echange: le robot est de nouveau libre"""
+        self.speech_progress = {}
+        self.streaming_text = ""
+        self.speaking_text = ""
+        self.robot_status = "connected"
+        self.is_processing = False
+        self.owner = None
+        if self.pending_message:
+            self._set_pending(None)
+        total = self.latency.finish()
+        if total is not None:
+            self.add_log(f">>> Echange termine en {total:.2f}s")
+
+    def _speak_response(self, text):
+        """Afficher la reponse puis la faire dire (fin de l'echange a la reponse "speak")"""
+        self._add_message("robot", text)
+        self.speaking_text = text
+        self.robot_status = "speaking"
+        self._submit("speak", {"text": text})
+
+    def _handle_event(self, data):
+        """Appliquer un evenement du bridge a l'etat partage
+
+        Chaque reponse fait avancer l'echange en cours: listen -> get_response
+        -> speak -> fin.
+        """
+        action = data.get("action")
+        success = data.get("success")
+        payload = data.get("data", {})
+
+        for log_msg in data.get("logs", []):
+            self.add_log(log_msg)
+
+        if action == "ready":
+            self.add_log("OK Bridge pret")
+
+        elif action == "connect":
+            if success:
+                self.connected = True
+                # Une session de conversation par connexion
+                self._start_session()
+                self.add_log("OK Robot connecte avec succes!")
+                # Message d'accueil
+                self.robot_status = "speaking"
+                self.is_processing = True
+                self._submit("say_greeting", {"language": self.language})
+            else:
+                self.add_log(f"X Connexion echouee: {payload.get('error', 'Erreur inconnue')}")
+                bridge, self.bridge = self.bridge, None
+                if bridge:
+                    threading.Thread(target=bridge.stop, daemon=True).start()
+                self.robot_status = "disconnected"
+
+        elif action == "say_greeting":
+            if success:
+                self._add_message("robot", payload.get("text", "Bonjour!"))
+            self._finish_turn()
+
+        elif action == "listen":
+            self._record_stages(action, payload)
+            # Retirer le message "ecoute en cours"
+            self._set_pending(None)
+            transcription = payload.get("transcription", "") if success else None
+            if not transcription:
+                not_understood = "Je n'ai pas compris. Pouvez-vous repeter?" if self.language == "fr" else "I didn't understand. Can you repeat?"
+                self._speak_response(not_understood)
+            else:
+                self._add_message("human", transcription)
+                # Le bridge a deja lance la reflexion (think_after)
+                self.robot_status = "thinking"
+                self._submit("get_response", {"text": transcription})
+
+        elif action == "llm_partial":
+            self.streaming_text = payload.get("text", "")
+
+        elif action == "get_response":
+            self._record_stages(action, payload)
+            # La reponse finale (coupee au temps de parole) remplace le texte partiel
+            self.streaming_text = ""
+            stats = payload.get("llm_stats")
+            if stats:
+                self.llm_stats = stats
+            if success:
+                response_text = payload.get("response", "Desole, une erreur s'est produite.")
+            else:
+                self.add_log(f"X get_response failed: {payload.get('error', 'unknown')}")
+                response_text = "Sorry, I couldn't process your request." if self.language == "en" else "Desole, je n'ai pas pu traiter votre demande."
+            self._speak_response(response_text)
+
+        elif action == "speech_progress":
+            self.speech_progress = payload
+
+        elif action == "speak":
+            self._record_stages(action, payload)
+            stats = payload.get("motion_rpc")
+            if stats:
+                self.motion_rpc = stats
+            self._finish_turn()
+
+        elif action == "cancel_speech":
+            if payload.get("cancelled"):
+                self.add_log("OK Parole interrompue")
+
+        elif action == "error":
+            self.add_log(f"X Bridge: {payload.get('error', 'erreur')}")
+            if self.is_processing:
+                self._finish_turn()
+
+        elif action == "bridge_exit":
+            # Fin d'un ancien bridge apres une reconnexion: ignoree
+            if self.bridge is not None and self.bridge.alive():
+                return
+            if self.connected or self.robot_status == "connecting":
+                self.add_log("X Bridge arrete")
+            self.bridge = None
+            self.connected = False
+            self.robot_status = "disconnected"
+            self.is_processing = False
+            self.owner = None
+            if self.pending_message:
+                self._set_pending(None)
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+"""
+Routeur LLM sensible a la latence (Python 2.7 / 3)
+
+Plusieurs couples backend/modele (gros et petit modele Groq, serveur
+local compatible OpenAI...). Pour chacun: latence au premier octet et
+latence totale glissantes. Chaque requete part vers le backend le plus
+rapide du niveau de qualite demande; si ce niveau ne tient plus le SLO
+de latence, on descend vers le modele plus petit. Chaque decision est
+journalisee.
+"""
+
+import threading
+import time
+from collections import deque
+
+from nao_latency_py27 import LatencyTracker
+from nao_llm_client_py27 import CircuitOpenError, LLMTimeoutError, RETRY_STATUS, ResilientClient
+
+
+class Backend(object):
+    """Un couple endpoint / modele
+
+    Args:
+        name: Nom affiche dans les logs
+        url: Endpoint /chat/completions
+        model: Modele demande au backend
+        api_key: Cle API (vide pour un serveur local)
+        tier: Niveau de qualite (plus grand = meilleur)
+    """
+
+    def __init__(self, name, url, model, api_key="", tier=1, client=None):
+        self.name = name
+        self.url = url
+        self.model = model
+        self.api_key = api_key
+        self.tier = tier
+        self.client = client or ResilientClient()
+        self.ttft = LatencyTracker()
+
+    def headers(self):
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = "Bearer %s" % self.api_key
+        return headers
+
+    def p95(self):
+        return self.client.latency.percentile(0.95)
+
+    def p50(self):
+        return self.client.latency.percentile(0.5)
+
+    def stats(self):
+        stats = self.client.stats()
+        stats.update({
+            "model": self.model,
+            "tier": self.tier,
+            "ttft_p50_s": round(self.ttft.percentile(0.5) or 0.0, 3),
+        })
+        return stats
+
+
+class LatencyRouter(object):
+    """Choisir le backend le plus rapide qui respecte un niveau de qualite
+
+    Args:
+        backends: Liste de Backend
+        slo_s: SLO de latence totale (p95, secondes)
+        min_tier: Niveau de qualite demande par defaut
+        log_fn: Fonction de journalisation des decisions
+        probe_every: En mode degrade, une requete sur N resonde le niveau
+            demande pour detecter son retour sous le SLO
+        deadline_s: Duree maximale d'une requete, tentatives et bascules
+            comprises (secondes)
+    """
+
+    def __init__(self, backends, slo_s=4.0, min_tier=None, log_fn=None, probe_every=10,
+                 deadline_s=30.0):
+        self.backends = list(backends)
+        self.slo_s = slo_s
+        self.deadline_s = deadline_s
+        self.probe_every = probe_every
+        self._degraded_count = 0
+        self.min_tier = min_tier if min_tier is not None else max(b.tier for b in self.backends)
+        self.log_fn = log_fn
+        self.decisions = deque(maxlen=50)
+        self.last_backend = None
+        self._lock = threading.Lock()
+
+    def _log(self, message):
+        if self.log_fn:
+            self.log_fn(message)
+
+    def _within_slo(self, backend):
+        p95 = backend.p95()
+        return p95 is None or p95 <= self.slo_s
+
+    def _sort_key(self, backend):
+        # Backend sans mesure: essaye en priorite pour l'evaluer
+        p50 = backend.p50()
+        return (p50 is not None, p50 or 0.0, -backend.tier)
+
+    def candidates(self, min_tier=None):
+        """Backends par ordre de preference, avec la raison du choix"""
+        min_tier = self.min_tier if min_tier is None else min_tier
+        available = [b for b in self.backends if b.client.breaker.allow()]
+        qualified = sorted([b for b in available if b.tier >= min_tier], key=self._sort_key)
+        fast = [b for b in qualified if self._within_slo(b)]
+        # Niveaux inferieurs en dernier recours (bascule apres echec)
+        degraded = sorted([b for b in available if b.tier < min_tier], key=self._sort_key)
+        if fast:
+            others = [b for b in qualified if b not in fast]
+            return fast + others + degraded, "plus rapide du niveau %d" % min_tier
+
+        # Niveau demande hors SLO (ou indisponible): modele plus petit
+        degraded_fast = [b for b in degraded if self._within_slo(b)]
+        if degraded_fast:
+            self._degraded_count += 1
+            if qualified and self._degraded_count % self.probe_every == 0:
+                return qualified + degraded_fast, "sonde du niveau %d" % min_tier
+            return degraded_fast + qualified, "niveau %d hors SLO %.1fs: repli" % (min_tier, self.slo_s)
+        return qualified + degraded, "aucun backend dans le SLO"
+
+    def post(self, build_body, min_tier=None, on_text=None):
+        """Envoyer la requete au meilleur backend
+
+        Bascule sur le suivant en cas d'erreur ou de 429 / 5xx persistant.
+
+        Args:
+            build_body: fonction (modele) -> corps JSON encode
+            on_text: Streaming (voir ResilientClient.post); une bascule
+                repart d'un texte vide
+
+        Returns:
+            (response, info) ou info contient backend, model, timing...
+            Si tous les backends repondent 429 / 5xx, la derniere reponse.
+
+        Raises:
+            CircuitOpenError si aucun backend n'est disponible,
+            LLMTimeoutError si deadline_s est depasse
+        """
+        ordered, reason = self.candidates(min_tier)
+        if not ordered:
+            raise CircuitOpenError("Aucun backend LLM disponible")
+
+        deadline = time.time() + self.deadline_s
+        last_error = None
+        last_result = None
+        for index, backend in enumerate(ordered):
+            if time.time() >= deadline:
+                last_error = LLMTimeoutError("Timeout LLM (%.0fs)" % self.deadline_s)
+                self._log("X Routeur LLM: delai global de %.0fs depasse" % self.deadline_s)
+                break
+            decision = {
+                "backend": backend.name,
+                "model": backend.model,
+                "reason": reason if index == 0 else "bascule apres erreur",
+                "p50_s": backend.p50(),
+                "p95_s": backend.p95(),
+            }
+            self._log(">>> Routeur LLM: %s (%s) - %s [p50 %s / p95 %s]" % (
+                backend.name, backend.model, decision["reason"],
+                "%.2fs" % decision["p50_s"] if decision["p50_s"] is not None else "?",
+                "%.2fs" % decision["p95_s"] if decision["p95_s"] is not None else "?"))
+            with self._lock:
+                self.decisions.append(decision)
+            try:
+                response, info = backend.client.post(backend.url, backend.headers(),
+                                                     build_body(backend.model), on_text=on_text,
+                                                     deadline=deadline)
+            except Exception as e:
+                last_error = e
+                self._log("X Routeur LLM: %s en echec (%s)" % (backend.name, str(e)))
+                continue
+            if info.get("timing"):
+                backend.ttft.add(info["timing"].get("ttfb_s", 0.0))
+            self.last_backend = backend
+            info["backend"] = backend.name
+            info["model"] = backend.model
+            if response.status_code in RETRY_STATUS:
+                last_result = (response, info)
+                self._log("X Routeur LLM: %s en echec (code %d)" % (backend.name, response.status_code))
+                continue
+            return response, info
+
+        if last_result is not None:
+            return last_result
+        raise last_error or CircuitOpenError("Aucun backend LLM disponible")
+
+    def stats(self):
+        """Statistiques du dernier backend utilise + detail par backend"""
+        current = self.last_backend or self.backends[0]
+        stats = current.stats()
+        stats["backend"] = current.name
+        stats["slo_s"] = self.slo_s
+        stats["backends"] = dict((b.name, b.stats()) for b in self.backends)
+        return stats
+
+
+def build_default_router(env_vars, api_key, groq_url, log_fn=None):
+    """Routeur a partir de la configuration .env
+
+    LLM_MODEL (niveau 2), LLM_SMALL_MODEL (niveau 1) et, si LOCAL_LLM_URL
+    est defini, un serveur local compatible OpenAI (LOCAL_LLM_TIER).
+    LLM_DEADLINE borne la duree totale d'une requete (30s comme l'appel
+    unique d'origine).
+    """
+    timeout = 30
+    hedge_percentile = float(env_vars.get("LLM_HEDGE_PERCENTILE", "0.9"))
+    max_retries = int(env_vars.get("LLM_MAX_RETRIES", "2"))
+
+    def client():
+        return ResilientClient(timeout=timeout, hedge_percentile=hedge_percentile,
+                               max_retries=max_retries)
+
+    backends = [
+        Backend("groq-large", groq_url, env_vars.get("LLM_MODEL", "llama-3.3-70b-versatile"),
+                api_key, tier=2, client=client()),
+    ]
+    small_model = env_vars.get("LLM_SMALL_MODEL", "llama-3.1-8b-instant")
+    if small_model:
+        backends.append(Backend("groq-small", groq_url, small_model, api_key, tier=1, client=client()))
+    local_url = env_vars.get("LOCAL_LLM_URL", "")
+    if local_url:
+        backends.append(Backend("local", local_url, env_vars.get("LOCAL_LLM_MODEL", "local-model"),
+                                env_vars.get("LOCAL_LLM_API_KEY", ""),
+                                tier=int(env_vars.get("LOCAL_LLM_TIER", "1")), client=client()))
+
+    return LatencyRouter(backends,
+                         slo_s=float(env_vars.get("LLM_LATENCY_SLO", "4.0")),
+                         min_tier=int(env_vars.get("LLM_MIN_TIER", "2")),
+                         log_fn=log_fn,
+                         deadline_s=float(env_vars.get("LLM_DEADLINE", "30")))
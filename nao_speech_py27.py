@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+"""
+Estimation du temps de parole de NAO (Python 2.7 / 3)
+
+Sert a choisir le budget de generation du LLM a partir d'un temps de
+parole cible par tour, et a couper une reponse trop longue a une fin de
+phrase.
+"""
+
+import re
+
+
+# Debit de ALTextToSpeech a la vitesse 100% (mots par minute)
+WORDS_PER_MINUTE = {"fr": 150.0, "en": 160.0}
+
+# Tokens LLM par mot (le francais se decoupe en plus de tokens)
+TOKENS_PER_WORD = {"fr": 1.6, "en": 1.35}
+
+# Longueur moyenne d'une phrase generee (mots)
+WORDS_PER_SENTENCE = 14.0
+
+_SENTENCE_RE = re.compile(r"[^.!?]+[.!?]*", re.UNICODE)
+
+
+def split_sentences(text):
+    """Decouper en phrases en gardant la ponctuation finale"""
+    return [s.strip() for s in _SENTENCE_RE.findall(text or "") if s.strip()]
+
+
+def count_words(text):
+    return len((text or "").split())
+
+
+def words_per_second(lang="fr", speed=100):
+    return WORDS_PER_MINUTE.get(lang, WORDS_PER_MINUTE["en"]) * (speed / 100.0) / 60.0
+
+
+def estimate_speaking_time(text, lang="fr", speed=100, sentence_overhead=0.0):
+    """Duree estimee (secondes) pour dire le texte
+
+    Args:
+        speed: Parametre "speed" de ALTextToSpeech (100 = normal)
+        sentence_overhead: Temps fixe par phrase (gestes, retour au repos)
+    """
+    sentences = split_sentences(text)
+    words = sum(count_words(s) for s in sentences)
+    return words / words_per_second(lang, speed) + len(sentences) * sentence_overhead
+
+
+def max_tokens_for_target(target_s, lang="fr", speed=100, sentence_overhead=0.0,
+                          min_tokens=60, max_tokens=350, headroom=1.5):
+    """Budget max_tokens pour tenir dans le temps de parole cible
+
+    La marge (headroom) laisse le modele finir sa phrase: la coupe fine se
+    fait ensuite avec trim_to_target, a une fin de phrase.
+    """
+    wps = words_per_second(lang, speed)
+    # Temps par mot en incluant la part du surcout par phrase
+    seconds_per_word = 1.0 / wps + sentence_overhead / WORDS_PER_SENTENCE
+    words = target_s / seconds_per_word
+    tokens = int(words * TOKENS_PER_WORD.get(lang, TOKENS_PER_WORD["en"]) * headroom)
+    return max(min_tokens, min(max_tokens, tokens))
+
+
+def target_words(target_s, lang="fr", speed=100, sentence_overhead=0.0):
+    """Nombre de mots indicatif a demander dans le prompt"""
+    seconds_per_word = 1.0 / words_per_second(lang, speed) + sentence_overhead / WORDS_PER_SENTENCE
+    return int(target_s / seconds_per_word)
+
+
+def trim_to_target(text, target_s, lang="fr", speed=100, sentence_overhead=0.0,
+                   drop_incomplete=False):
+    """Couper la reponse a une fin de phrase pour tenir le temps cible
+
+    La premiere phrase est toujours gardee. Avec drop_incomplete (reponse
+    tronquee par max_tokens), une derniere phrase sans ponctuation finale
+    est retiree.
+
+    Returns:
+        (texte, duree_estimee, coupe)
+    """
+    all_sentences = split_sentences(text)
+    sentences = all_sentences
+    if drop_incomplete and len(sentences) > 1 and sentences[-1][-1] not in ".!?":
+        sentences = sentences[:-1]
+    kept = []
+    total = 0.0
+    for sentence in sentences:
+        duration = estimate_speaking_time(sentence, lang, speed, sentence_overhead)
+        if kept and total + duration > target_s:
+            break
+        kept.append(sentence)
+        total += duration
+    cut = len(kept) < len(all_sentences)
+    if not cut:
+        return text, total, False
+    return " ".join(kept), total, True
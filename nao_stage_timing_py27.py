@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+"""
+Minutage par etape d'un echange (Python 2.7 / 3)
+
+Chaque commande du bridge (listen, get_response, speak) note ses etapes
+avec leur debut (horloge murale, time.time()) et leur duree, et les
+renvoie dans sa reponse sous "stages". L'application les recolle en un
+echange complet: memes horloges, meme machine.
+
+Etapes: capture, end_of_speech, audio_transfer, transcription, llm,
+thinking, puis speech et gesture par phrase (cle "index").
+"""
+
+import time
+from contextlib import contextmanager
+
+
+class StageTimer(object):
+    """Etapes mesurees pendant une commande"""
+
+    def __init__(self):
+        self.stages = []
+
+    def mark(self, stage, start, end=None, **extra):
+        """Ajouter une etape de start a end (maintenant par defaut)"""
+        end = time.time() if end is None else end
+        entry = {"stage": stage, "start": round(start, 4),
+                 "duration_s": round(max(0.0, end - start), 4)}
+        entry.update(extra)
+        self.stages.append(entry)
+        return entry
+
+    @contextmanager
+    def measure(self, stage, **extra):
+        """with timer.measure("transcription"): ..."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.mark(stage, start, **extra)
+
+    def summary(self):
+        """Ligne de log: "etape 0.12s, ..." """
+        return ", ".join("%s %.2fs" % (s["stage"], s["duration_s"]) for s in self.stages)
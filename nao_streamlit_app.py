@@ -5,13 +5,18 @@ Application Streamlit pour piloter le robot NAO
 Interface web remplacant le fichier .bat
 """
 
+import altair as alt
 import streamlit as st
-import subprocess
-import json
-import threading
+import html
 import time
 import queue
 import os
+import uuid
+from collections import deque
+
+from nao_fleet import FleetPool, parse_fleet
+from nao_robot_hub import RobotHub
+from nao_transcript_store import TranscriptStore
 
 # Configuration de la page
 st.set_page_config(
@@ -67,6 +72,10 @@ st.markdown("""
         background: #ff5252;
         color: white;
     }
+    .status-connecting {
+        background: #9e9e9e;
+        color: white;
+    }
     .status-listening {
         background: #2979ff;
         color: white;
@@ -211,28 +220,47 @@ st.markdown("""
 # Session State Initialization
 # ============================================================
 
-if "bridge_process" not in st.session_state:
-    st.session_state.bridge_process = None
-if "connected" not in st.session_state:
-    st.session_state.connected = False
-if "chat_messages" not in st.session_state:
-    st.session_state.chat_messages = []
-if "terminal_logs" not in st.session_state:
-    st.session_state.terminal_logs = []
-if "robot_status" not in st.session_state:
-    st.session_state.robot_status = "disconnected"
-if "response_queue" not in st.session_state:
-    st.session_state.response_queue = queue.Queue()
-if "is_processing" not in st.session_state:
-    st.session_state.is_processing = False
-if "exchange_count" not in st.session_state:
-    st.session_state.exchange_count = 0
+# Logs affiches dans le terminal de la sidebar
+TERMINAL_LINES = 50
+# Messages par page du chat (les pages plus anciennes a la demande)
+CHAT_PAGE_SIZE = 20
+# Derniers messages affiches par robot en mode flotte
+FLEET_CHAT_MESSAGES = 8
+# Robots par rangee dans la console de flotte
+FLEET_COLUMNS = 4
+
+# Etat propre a l'onglet: le robot, sa conversation et ses logs sont dans
+# le RobotHub partage (voir get_hub). Les valeurs saisies sont gardees hors
+# des cles de widgets: Streamlit supprime celles d'un widget non affiche
+if "viewer_id" not in st.session_state:
+    st.session_state.viewer_id = uuid.uuid4().hex[:8]
 if "nao_ip" not in st.session_state:
     st.session_state.nao_ip = "169.254.201.219"
 if "nao_port" not in st.session_state:
     st.session_state.nao_port = 9559
 if "language" not in st.session_state:
     st.session_state.language = "fr"
+if "fleet_mode" not in st.session_state:
+    # Mode flotte: plusieurs robots, un bridge chacun (voir nao_fleet)
+    st.session_state.fleet_mode = False
+if "fleet_spec" not in st.session_state:
+    st.session_state.fleet_spec = os.environ.get("NAO_FLEET", "")
+if "fleet_chat" not in st.session_state:
+    st.session_state.fleet_chat = {}
+if "subscription" not in st.session_state:
+    st.session_state.subscription = None
+if "layout" not in st.session_state:
+    st.session_state.layout = None
+if "terminal_seq" not in st.session_state:
+    # Dernier log affiche par cet onglet et HTML deja formate
+    st.session_state.terminal_seq = 0
+    st.session_state.terminal_lines = deque(maxlen=TERMINAL_LINES)
+    st.session_state.terminal_html = ""
+if "chat_pages" not in st.session_state:
+    # Pages affichees et messages deja lus pour (session, version, pages)
+    st.session_state.chat_pages = 1
+    st.session_state.chat_key = None
+    st.session_state.chat_page = []
 
 
 # ============================================================
@@ -242,126 +270,119 @@ if "language" not in st.session_state:
 PYTHON27_PATH = r"C:\Python27\python.exe"
 CHOREGRAPHE_BIN = r"C:\Program Files (x86)\Softbank Robotics\Choregraphe Suite 2.5\bin"
 BRIDGE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nao_bridge_py27.py")
-
-
-def add_log(message):
-    """Ajouter un log au terminal"""
-    timestamp = time.strftime("%H:%M:%S")
-    st.session_state.terminal_logs.append(f"[{timestamp}] {message}")
-    # Garder les 200 derniers logs
-    if len(st.session_state.terminal_logs) > 200:
-        st.session_state.terminal_logs = st.session_state.terminal_logs[-200:]
-
-
-def format_log_html(log):
-    """Formater un log en HTML avec couleurs"""
-    if "OK " in log or "succes" in log.lower():
-        return f'<span class="log-ok">{log}</span>'
-    elif "X " in log or "Erreur" in log or "erreur" in log:
-        return f'<span class="log-error">{log}</span>'
-    elif ">>>" in log:
-        return f'<span class="log-action">{log}</span>'
-    elif "===" in log or "---" in log:
-        return f'<span class="log-info">{log}</span>'
-    return log
-
-
-def start_bridge():
-    """Demarrer le processus bridge Python 2.7"""
+# Journal complet des logs (un fichier par robot et par demarrage)
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+# Conversations (SQLite) et leurs exports
+TRANSCRIPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "transcripts")
+
+# Periode de rafraichissement des zones vivantes (statut, chat, terminal)
+LIVE_REFRESH_S = 0.5
+# Periode de la bulle en direct (tokens du LLM, phrase dite)
+STREAM_REFRESH_S = 0.15
+
+STATUS_LABELS = {
+    "disconnected": "Deconnecte",
+    "connecting": "Connexion...",
+    "connected": "Connecte",
+    "listening": "Ecoute...",
+    "thinking": "Reflexion...",
+    "speaking": "Parle..."
+}
+
+
+@st.cache_resource
+def get_transcript_store():
+    """Base des conversations, commune a tous les robots et tous les onglets"""
+    return TranscriptStore(os.path.join(TRANSCRIPT_DIR, "conversations.db"))
+
+
+@st.cache_resource
+def get_hub(nao_ip, nao_port):
+    """Un seul RobotHub (donc un seul bridge Python 2.7) par robot, partage
+    par tous les onglets et toutes les sessions du serveur"""
     env = os.environ.copy()
     env["PATH"] = CHOREGRAPHE_BIN + ";" + env.get("PATH", "")
     
-    process = subprocess.Popen(
+    return RobotHub(
+        nao_ip, nao_port,
         [PYTHON27_PATH, BRIDGE_SCRIPT],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
         env=env,
-        cwd=os.path.dirname(os.path.abspath(__file__))
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        log_dir=LOG_DIR,
+        transcript=get_transcript_store()
     )
-    
-    return process
 
 
-def send_command(action, params=None):
-    """Envoyer une commande au bridge et attendre la reponse"""
-    process = st.session_state.bridge_process
-    if not process or process.poll() is not None:
-        add_log("X Bridge non disponible")
-        return None
-    
-    command = json.dumps({"action": action, "params": params or {}}) + "\n"
-    
-    try:
-        process.stdin.write(command.encode("utf-8"))
-        process.stdin.flush()
-    except Exception as e:
-        add_log(f"X Erreur envoi commande: {e}")
-        return None
-    
-    # Lire les reponses (logs + reponse finale)
-    responses = []
+@st.cache_resource
+def get_fleet(robots):
+    """Pool de la flotte; les hubs sont ceux de get_hub, partages avec le
+    mode un seul robot
+    
+    Args:
+        robots: ((nom, ip, port), ...)
+    """
+    return FleetPool([(name, get_hub(ip, port)) for name, ip, port in robots])
+
+
+def current_hub(nao_ip, nao_port):
+    """Hub du robot choisi, avec l'abonnement de cet onglet a ses evenements"""
+    hub = get_hub(nao_ip, int(nao_port))
+    if st.session_state.get("subscription_hub") is not hub:
+        previous = st.session_state.get("subscription_hub")
+        if previous is not None and st.session_state.subscription is not None:
+            previous.bus.unsubscribe(st.session_state.subscription)
+        st.session_state.subscription = hub.bus.subscribe()
+        st.session_state.subscription_hub = hub
+        st.session_state.layout = hub.layout()
+        st.session_state.terminal_seq = 0
+        st.session_state.terminal_lines.clear()
+        st.session_state.terminal_html = ""
+        st.session_state.chat_key = None
+        st.session_state.chat_pages = 1
+    elif not hub.bus.is_subscribed(st.session_state.subscription):
+        # Abonnement retire par le bus apres une longue inactivite
+        st.session_state.subscription = hub.bus.subscribe()
+    return hub
+
+
+def pump_events():
+    """Vider la file d'evenements de cet onglet
+    
+    L'etat a deja ete mis a jour par le hub; les evenements servent
+    seulement a savoir si l'affichage a change.
+    
+    Returns:
+        True si la page entiere doit etre relancee (connexion ou boutons changent)
+    """
+    subscription = st.session_state.subscription
     while True:
         try:
-            line = process.stdout.readline()
-            if not line:
-                break
-            
-            line = line.decode("utf-8", errors="ignore").strip()
-            if not line:
-                continue
-            
-            try:
-                data = json.loads(line)
-                responses.append(data)
-                
-                # Ajouter les logs
-                for log_msg in data.get("logs", []):
-                    add_log(log_msg)
-                
-                # Si c'est la reponse finale (pas un log)
-                if data.get("action") != "log":
-                    return data
-                    
-            except json.JSONDecodeError:
-                add_log(line)
-                
-        except Exception as e:
-            add_log(f"X Erreur lecture: {e}")
+            subscription.get_nowait()
+        except queue.Empty:
             break
-    
-    return None
+    layout = hub.layout()
+    changed = layout != st.session_state.layout
+    st.session_state.layout = layout
+    return changed
 
 
-def stop_bridge():
-    """Arreter le processus bridge"""
-    process = st.session_state.bridge_process
-    if process and process.poll() is None:
-        try:
-            command = json.dumps({"action": "quit", "params": {}}) + "\n"
-            process.stdin.write(command.encode("utf-8"))
-            process.stdin.flush()
-            process.wait(timeout=5)
-        except:
-            process.kill()
-    st.session_state.bridge_process = None
+def refresh_live():
+    """Dans un fragment: depiler, et relancer toute la page si la mise en page change"""
+    if pump_events():
+        st.rerun()
 
 
 # ============================================================
 # UI Components
 # ============================================================
 
+@st.fragment(run_every=LIVE_REFRESH_S)
 def render_header():
-    """Afficher le header"""
-    status_class = f"status-{st.session_state.robot_status}"
-    status_labels = {
-        "disconnected": "Deconnecte",
-        "connected": "Connecte",
-        "listening": "Ecoute...",
-        "thinking": "Reflexion...",
-        "speaking": "Parle..."
-    }
-    status_label = status_labels.get(st.session_state.robot_status, "Inconnu")
+    """Afficher le header (statut rafraichi pendant l'echange)"""
+    refresh_live()
+    robot_status = hub.snapshot()["robot_status"]
+    status_class = f"status-{robot_status}"
+    status_label = STATUS_LABELS.get(robot_status, "Inconnu")
     
     st.markdown(f"""
     <div class="nao-header">
@@ -372,46 +393,296 @@ def render_header():
     """, unsafe_allow_html=True)
 
 
+def render_fleet_header(fleet):
+    """Header de la console de flotte (statuts dans chaque colonne)"""
+    st.markdown(f"""
+    <div class="nao-header">
+        <h1>🤖 NAO Robot Controller</h1>
+        <p>Console de flotte: {len(fleet.hubs)} robot(s) pilotes en parallele</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+
+def render_message(msg):
+    """Un message du chat"""
+    role = msg["role"]
+    text = msg["content"]
+    
+    if role == "robot":
+        with st.chat_message("assistant", avatar="🤖"):
+            st.markdown(text)
+    elif role == "human":
+        with st.chat_message("user", avatar="👤"):
+            st.markdown(text)
+    elif role == "system":
+        st.caption(f"_{text}_")
+
+
+def live_answer_html(status, streaming_text, speaking_text, progress):
+    """Bulle de la reponse en cours (HTML echappe), ou None
+    
+    Texte du LLM au fil des tokens pendant la reflexion, puis reponse dite
+    avec la phrase en cours surlignee.
+    """
+    if streaming_text:
+        return html.escape(streaming_text) + " ▌"
+    if status == "speaking" and speaking_text:
+        escaped = html.escape(speaking_text)
+        sentence = progress.get("sentence", "") if progress.get("state") == "speaking" else ""
+        target = html.escape(sentence.strip())
+        if target and target in escaped:
+            return escaped.replace(target, f"<mark>{target}</mark>", 1)
+        return escaped
+    return None
+
+
+def render_speech_progress(state):
+    """Phrase en cours pendant que NAO parle"""
+    progress = state["speech_progress"]
+    if state["robot_status"] == "speaking" and progress.get("state") == "speaking":
+        total = progress.get("total") or 1
+        st.progress(
+            min((progress.get("index", 1) - 1) / total, 1.0),
+            text=f"🗣️ Phrase {progress.get('index')}/{total}: {progress.get('sentence', '')}"
+        )
+
+
+@st.fragment(run_every=LIVE_REFRESH_S)
 def render_chat():
     """Afficher le chat avec les composants natifs Streamlit"""
+    refresh_live()
+    state = hub.snapshot()
+    
+    # Base relue seulement si le chat a change: une page par defaut, quelle
+    # que soit la longueur de la conversation
+    chat_key = (state["session_id"], state["chat_version"], st.session_state.chat_pages)
+    previous_key = st.session_state.chat_key
+    if previous_key is not None and previous_key[0] != state["session_id"]:
+        # Nouvelle session: retour a la derniere page
+        st.session_state.chat_pages = 1
+        chat_key = (state["session_id"], state["chat_version"], 1)
+    if chat_key != previous_key:
+        messages = []
+        if state["session_id"] is not None:
+            messages = hub.transcript.latest(
+                state["session_id"], st.session_state.chat_pages * CHAT_PAGE_SIZE)
+        st.session_state.chat_page = messages
+        st.session_state.chat_key = chat_key
+    messages = st.session_state.chat_page
+    
     chat_container = st.container(height=450)
     
     with chat_container:
-        if not st.session_state.chat_messages:
+        if len(messages) < state["message_count"]:
+            if st.button(f"⬆️ Messages precedents ({state['message_count'] - len(messages)})",
+                         key="older_messages"):
+                st.session_state.chat_pages += 1
+                st.rerun(scope="fragment")
+        
+        if not messages and not state["pending_message"]:
             st.markdown(
                 "<p style='text-align:center; color:#999; padding:2rem;'>"
                 "Connectez-vous au robot pour commencer la conversation</p>",
                 unsafe_allow_html=True
             )
         
-        for msg in st.session_state.chat_messages:
-            role = msg["role"]
-            text = msg["content"]
-            
-            if role == "robot":
-                with st.chat_message("assistant", avatar="🤖"):
-                    st.markdown(text)
-            elif role == "human":
-                with st.chat_message("user", avatar="👤"):
-                    st.markdown(text)
-            elif role == "system":
-                st.caption(f"_{text}_")
+        # La reponse en train d'etre dite est dans la bulle en direct
+        if (state["robot_status"] == "speaking" and messages and messages[-1]["role"] == "robot"
+                and messages[-1]["content"] == state["speaking_text"]):
+            messages = messages[:-1]
+        for msg in messages:
+            render_message(msg)
+        
+        if state["pending_message"]:
+            st.caption(f"_{state['pending_message']}_")
+    
+    # Echange lance depuis un autre onglet
+    if state["is_processing"] and state["owner"] not in (None, st.session_state.viewer_id):
+        st.caption("Echange en cours depuis un autre onglet")
 
 
+@st.fragment(run_every=STREAM_REFRESH_S)
+def render_live_answer():
+    """Reponse en cours sous le chat
+    
+    Fragment a part, rafraichi plus souvent que le chat: a chaque token ou
+    phrase, seule cette bulle est redessinee.
+    """
+    status, streaming_text, speaking_text, progress = hub.live()
+    content = live_answer_html(status, streaming_text, speaking_text, progress)
+    if content:
+        with st.chat_message("assistant", avatar="🤖"):
+            st.markdown(content, unsafe_allow_html=True)
+    render_speech_progress({"robot_status": status, "speech_progress": progress})
+
+
+@st.fragment(run_every=LIVE_REFRESH_S)
 def render_terminal():
     """Afficher le terminal dans la sidebar"""
-    logs_html = '<div class="terminal-output">'
-    logs_html += '<div style="color:#569cd6; margin-bottom:0.5rem; font-weight:bold;">$ NAO Bridge Terminal</div>'
+    refresh_live()
+    # Seuls les logs arrives depuis le dernier rafraichissement sont ajoutes;
+    # ils sont deja classes et echappes par le LogStore
+    new_entries = hub.logs.since(st.session_state.terminal_seq, limit=TERMINAL_LINES)
+    if new_entries or not st.session_state.terminal_html:
+        lines = st.session_state.terminal_lines
+        for seq, _, entry_html in new_entries:
+            lines.append(entry_html)
+            st.session_state.terminal_seq = seq
+        
+        logs_html = '<div class="terminal-output">'
+        logs_html += '<div style="color:#569cd6; margin-bottom:0.5rem; font-weight:bold;">$ NAO Bridge Terminal</div>'
+        if lines:
+            logs_html += '<br>'.join(lines) + '<br>'
+        else:
+            logs_html += '<span style="color:#666;">En attente de connexion...</span>'
+        logs_html += '</div>'
+        st.session_state.terminal_html = logs_html
+    
+    st.markdown(st.session_state.terminal_html, unsafe_allow_html=True)
+
+
+def render_latency_dashboard():
+    """Latences par etape: p50/p95, cascade du dernier echange, histogramme
+    
+    Mis a jour a la fin de chaque echange (relance complete de la page).
+    """
+    latency = hub.latency
+    if not latency.turns:
+        st.caption("Aucun echange mesure pour l'instant")
+        return
+    
+    rows = latency.summary()
+    st.dataframe(
+        [{"Etape": r["stage"], "Mesures": r["count"], "Moyenne (s)": r["mean_s"],
+          "p50 (s)": r["p50_s"], "p95 (s)": r["p95_s"]} for r in rows],
+        hide_index=True,
+        use_container_width=True
+    )
     
-    for log in st.session_state.terminal_logs[-50:]:
-        formatted = format_log_html(log)
-        logs_html += f'{formatted}<br>'
+    st.markdown(f"**Dernier echange** (echange {latency.turns})")
+    waterfall = alt.Chart(alt.Data(values=latency.latest)).mark_bar().encode(
+        x=alt.X("start_s:Q", title="Temps depuis le debut (s)"),
+        x2="end_s:Q",
+        y=alt.Y("label:N", sort=None, title=None),
+        color=alt.Color("stage:N", legend=None),
+        tooltip=["label:N", "start_s:Q", "duration_s:Q"]
+    )
+    st.altair_chart(waterfall, use_container_width=True)
+    
+    stage = st.selectbox("Histogramme", [r["stage"] for r in rows],
+                         index=len(rows) - 1, key="latency_stage")
+    histogram = alt.Chart(alt.Data(values=[{"duration_s": d} for d in latency.samples(stage)])).mark_bar().encode(
+        x=alt.X("duration_s:Q", bin=alt.Bin(maxbins=20), title="Duree (s)"),
+        y=alt.Y("count():Q", title="Mesures")
+    )
+    st.altair_chart(histogram, use_container_width=True)
+
+
+@st.fragment(run_every=LIVE_REFRESH_S)
+def render_robot_panel(name, robot_hub):
+    """Colonne d'un robot de la flotte: statut, derniers messages, boutons
+    
+    Chaque colonne se rafraichit seule; ses boutons ne relancent qu'elle.
+    """
+    state = robot_hub.snapshot()
+    status = state["robot_status"]
+    st.markdown(
+        f"**{name}** · `{robot_hub.nao_ip}:{robot_hub.nao_port}`<br>"
+        f'<span class="status-badge status-{status}">{STATUS_LABELS.get(status, "Inconnu")}</span>',
+        unsafe_allow_html=True
+    )
     
-    if not st.session_state.terminal_logs:
-        logs_html += '<span style="color:#666;">En attente de connexion...</span>'
+    # Base relue seulement quand le chat de ce robot change
+    chat_key = (state["session_id"], state["chat_version"])
+    cached = st.session_state.fleet_chat.get(name)
+    if cached is None or cached[0] != chat_key:
+        messages = []
+        if state["session_id"] is not None:
+            messages = robot_hub.transcript.latest(state["session_id"], FLEET_CHAT_MESSAGES)
+        cached = st.session_state.fleet_chat[name] = (chat_key, messages)
+    
+    messages = cached[1]
+    live = live_answer_html(state["robot_status"], state["streaming_text"],
+                            state["speaking_text"], state["speech_progress"])
+    if live and messages and messages[-1]["content"] == state["speaking_text"]:
+        messages = messages[:-1]
+    with st.container(height=320):
+        for msg in messages:
+            render_message(msg)
+        if state["pending_message"]:
+            st.caption(f"_{state['pending_message']}_")
+        if live:
+            with st.chat_message("assistant", avatar="🤖"):
+                st.markdown(live, unsafe_allow_html=True)
+    render_speech_progress(state)
+    
+    col_listen, col_stop = st.columns(2)
+    with col_listen:
+        if st.button("🎤", key=f"fleet_listen_{name}", use_container_width=True,
+                     disabled=not state["connected"] or state["is_processing"],
+                     help="Ecouter (micro du robot)"):
+            if not robot_hub.listen_and_respond(st.session_state.viewer_id, st.session_state.language):
+                st.toast(f"{name}: un echange est deja en cours")
+            st.rerun(scope="fragment")
+    with col_stop:
+        if st.button("⏹️", key=f"fleet_stop_{name}", use_container_width=True,
+                     disabled=not state["connected"], help="Arreter la parole"):
+            robot_hub.cancel_speech()
+
+
+def report_broadcast(label, results):
+    """Signaler les robots qui ont refuse ou rate une commande diffusee"""
+    failed = [name for name, result in results.items()
+              if result is False or isinstance(result, Exception)]
+    if failed:
+        st.toast(f"{label}: ignore par {', '.join(failed)}")
+
+
+def render_fleet_console(fleet):
+    """Commandes diffusees a la flotte et une colonne par robot"""
+    names = fleet.names()
+    viewer = st.session_state.viewer_id
+    language = st.session_state.language
+    
+    st.markdown("### 🛰️ Commandes de flotte")
+    col_connect, col_greet, col_stop, col_disconnect = st.columns(4)
+    with col_connect:
+        if st.button("🤖 Connecter tout", use_container_width=True, type="primary"):
+            report_broadcast("Connexion", fleet.connect_all(language))
+            st.rerun()
+    with col_greet:
+        if st.button("👋 Tous disent bonjour", use_container_width=True):
+            report_broadcast("Bonjour", fleet.greet_all(viewer, language))
+    with col_stop:
+        if st.button("⏹️ Arreter tout", use_container_width=True):
+            fleet.cancel_all()
+    with col_disconnect:
+        if st.button("🔌 Deconnecter tout", use_container_width=True):
+            fleet.disconnect_all()
+            st.rerun()
+    
+    col_text, col_targets, col_send = st.columns([3, 2, 1])
+    with col_text:
+        fleet_text = st.text_input(
+            "Message texte",
+            placeholder="Message envoye aux robots choisis...",
+            key="fleet_text",
+            label_visibility="collapsed"
+        )
+    with col_targets:
+        targets = st.multiselect("Robots", names, default=names, key="fleet_targets",
+                                 label_visibility="collapsed")
+    with col_send:
+        if st.button("📝 Envoyer", use_container_width=True) and fleet_text:
+            report_broadcast("Message", fleet.send_text_all(viewer, fleet_text, language, targets))
     
-    logs_html += '</div>'
-    st.markdown(logs_html, unsafe_allow_html=True)
+    st.markdown("")
+    robots = list(fleet.hubs.items())
+    for row in range(0, len(robots), FLEET_COLUMNS):
+        columns = st.columns(FLEET_COLUMNS)
+        for column, (name, robot_hub) in zip(columns, robots[row:row + FLEET_COLUMNS]):
+            with column:
+                render_robot_panel(name, robot_hub)
 
 
 # ============================================================
@@ -419,207 +690,106 @@ def render_terminal():
 # ============================================================
 
 def do_connect():
-    """Connecter au robot"""
-    add_log("=" * 50)
-    add_log("CONNEXION AU ROBOT NAO")
-    add_log("=" * 50)
-    
-    # Demarrer le bridge
-    try:
-        st.session_state.bridge_process = start_bridge()
-        add_log("OK Bridge Python 2.7 demarre")
-    except Exception as e:
-        add_log(f"X Erreur demarrage bridge: {e}")
-        return
-    
-    # Attendre le message "ready"
-    try:
-        line = st.session_state.bridge_process.stdout.readline()
-        data = json.loads(line.decode("utf-8", errors="ignore").strip())
-        if data.get("action") == "ready":
-            add_log("OK Bridge pret")
-    except Exception as e:
-        add_log(f"X Erreur initialisation bridge: {e}")
-        return
-    
-    # Envoyer la commande de connexion
-    result = send_command("connect", {
-        "nao_ip": st.session_state.nao_ip,
-        "nao_port": st.session_state.nao_port,
-        "language": st.session_state.language
-    })
-    
-    if result and result.get("success"):
-        st.session_state.connected = True
-        st.session_state.robot_status = "connected"
-        add_log("OK Robot connecte avec succes!")
-        
-        # Message d'accueil
-        st.session_state.robot_status = "speaking"
-        result = send_command("say_greeting", {"language": st.session_state.language})
-        if result and result.get("success"):
-            greeting = result.get("data", {}).get("text", "Bonjour!")
-            st.session_state.chat_messages.append({
-                "role": "robot",
-                "content": greeting
-            })
-        st.session_state.robot_status = "connected"
-    else:
-        error = result.get("data", {}).get("error", "Erreur inconnue") if result else "Bridge non disponible"
-        add_log(f"X Connexion echouee: {error}")
+    """Connecter au robot (la suite arrive par les evenements du bridge)"""
+    hub.connect(st.session_state.language)
 
 
 def do_disconnect():
-    """Deconnecter du robot"""
-    add_log(">>> Deconnexion...")
-    send_command("disconnect")
-    stop_bridge()
-    st.session_state.connected = False
-    st.session_state.robot_status = "disconnected"
-    st.session_state.chat_messages.append({
-        "role": "system",
-        "content": "Deconnecte du robot"
-    })
-    add_log("OK Deconnecte")
+    """Deconnecter du robot (pour tous les onglets)"""
+    hub.disconnect()
 
 
 def do_listen_and_respond():
-    """Ecouter, reflechir et repondre"""
-    if not st.session_state.connected:
-        return
-    
-    st.session_state.is_processing = True
-    st.session_state.exchange_count += 1
-    
-    add_log(f"--- Echange {st.session_state.exchange_count} ---")
-    
-    # Synchroniser la langue avec le bridge
-    send_command("set_language", {"language": st.session_state.language})
-    
-    # 1. Ecouter
-    st.session_state.robot_status = "listening"
-    st.session_state.chat_messages.append({
-        "role": "system",
-        "content": "🎤 Ecoute en cours..."
-    })
-    
-    result = send_command("listen", {"max_duration": 10})
-    
-    # Retirer le message "ecoute en cours"
-    st.session_state.chat_messages = [
-        m for m in st.session_state.chat_messages 
-        if m.get("content") != "🎤 Ecoute en cours..."
-    ]
-    
-    if not result or not result.get("success"):
-        transcription = None
-    else:
-        transcription = result.get("data", {}).get("transcription", "")
-    
-    if not transcription:
-        st.session_state.robot_status = "speaking"
-        not_understood = "Je n'ai pas compris. Pouvez-vous repeter?" if st.session_state.language == "fr" else "I didn't understand. Can you repeat?"
-        send_command("speak", {"text": not_understood})
-        st.session_state.chat_messages.append({
-            "role": "robot",
-            "content": not_understood
-        })
-        st.session_state.robot_status = "connected"
-        st.session_state.is_processing = False
-        return
-    
-    # Ajouter le message humain
-    st.session_state.chat_messages.append({
-        "role": "human",
-        "content": transcription
-    })
-    
-    # 2. Reflexion
-    st.session_state.robot_status = "thinking"
-    send_command("think")
-    
-    # 3. Obtenir la reponse LLM
-    result = send_command("get_response", {"text": transcription})
-    
-    if result and result.get("success"):
-        response_text = result.get("data", {}).get("response", "Desole, une erreur s'est produite.")
-    else:
-        error_detail = result.get("data", {}).get("error", "unknown") if result else "no response"
-        add_log(f"X get_response failed: {error_detail}")
-        response_text = "Sorry, I couldn't process your request." if st.session_state.language == "en" else "Desole, je n'ai pas pu traiter votre demande."
-    
-    # 4. Parler
-    st.session_state.robot_status = "speaking"
-    send_command("speak", {"text": response_text})
-    
-    st.session_state.chat_messages.append({
-        "role": "robot",
-        "content": response_text
-    })
-    
-    st.session_state.robot_status = "connected"
-    st.session_state.is_processing = False
+    """Lancer un echange a la voix: ecouter, reflechir et repondre"""
+    if not hub.listen_and_respond(st.session_state.viewer_id, st.session_state.language):
+        st.toast("Robot occupe: un echange est deja en cours")
+
+
+def do_stop_speaking():
+    """Interrompre NAO: phrase en cours arretee, suivantes abandonnees"""
+    hub.cancel_speech()
 
 
 def do_send_text(text):
     """Envoyer un texte manuellement (mode texte)"""
-    if not st.session_state.connected or not text:
-        return
-    
-    st.session_state.is_processing = True
-    st.session_state.exchange_count += 1
-    
-    # Synchroniser la langue avec le bridge
-    send_command("set_language", {"language": st.session_state.language})
-    
-    # Ajouter le message humain
-    st.session_state.chat_messages.append({
-        "role": "human",
-        "content": text
-    })
-    
-    # Reflexion
-    st.session_state.robot_status = "thinking"
-    send_command("think")
-    
-    # Obtenir la reponse LLM
-    result = send_command("get_response", {"text": text})
-    
-    if result and result.get("success"):
-        response_text = result.get("data", {}).get("response", "Desole, une erreur s'est produite.")
-    else:
-        error_detail = result.get("data", {}).get("error", "unknown") if result else "no response"
-        add_log(f"X get_response failed: {error_detail}")
-        response_text = "Sorry, I couldn't process your request." if st.session_state.language == "en" else "Desole, je n'ai pas pu traiter votre demande."
-    
-    # Parler
-    st.session_state.robot_status = "speaking"
-    send_command("speak", {"text": response_text})
-    
-    st.session_state.chat_messages.append({
-        "role": "robot",
-        "content": response_text
-    })
-    
-    st.session_state.robot_status = "connected"
-    st.session_state.is_processing = False
+    if not hub.send_text(st.session_state.viewer_id, text, st.session_state.language):
+        st.toast("Robot occupe: un echange est deja en cours")
 
 
 # ============================================================
 # Main Layout
 # ============================================================
 
-render_header()
+fleet = None
+fleet_robots = []
+fleet_error = None
+if st.session_state.fleet_mode:
+    try:
+        fleet_robots = parse_fleet(st.session_state.fleet_spec)
+    except ValueError as e:
+        fleet_error = str(e)
+
+if fleet_robots:
+    fleet = get_fleet(tuple(fleet_robots))
+    # Terminal et statistiques: robot choisi dans la sidebar
+    terminal_robot = next((r for r in fleet_robots if r[0] == st.session_state.get("fleet_robot")),
+                          fleet_robots[0])
+    hub = current_hub(terminal_robot[1], terminal_robot[2])
+else:
+    hub = current_hub(st.session_state.nao_ip, st.session_state.nao_port)
+# Evenements arrives pendant que la page etait inactive
+pump_events()
+state = hub.snapshot()
+
+if fleet:
+    render_fleet_header(fleet)
+else:
+    render_header()
 
 # Sidebar - Terminal Output
 with st.sidebar:
     st.markdown("### 📟 Terminal Output")
     render_terminal()
+    if st.button("💾 Exporter les logs", use_container_width=True):
+        export_path = os.path.join(LOG_DIR, f"export_{time.strftime('%Y%m%d_%H%M%S')}.log")
+        try:
+            hub.logs.export(export_path)
+            st.success(f"Logs exportes: {export_path}")
+        except OSError as e:
+            st.error(f"Export impossible: {e}")
+    if state["session_id"] is not None and st.button("💾 Exporter la conversation", use_container_width=True):
+        export_path = os.path.join(
+            TRANSCRIPT_DIR, f"session_{state['session_id']}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+        try:
+            hub.transcript.export(state["session_id"], export_path)
+            st.success(f"Conversation exportee: {export_path}")
+        except OSError as e:
+            st.error(f"Export impossible: {e}")
     
     st.markdown("---")
     st.markdown("### ⚙️ Configuration")
-    st.session_state.nao_ip = st.text_input("IP du robot NAO", value=st.session_state.nao_ip)
-    st.session_state.nao_port = st.number_input("Port", value=st.session_state.nao_port, min_value=1, max_value=65535)
+    st.toggle("🛰️ Mode flotte (plusieurs robots)", key="fleet_mode")
+    if st.session_state.fleet_mode:
+        fleet_connected = fleet is not None and any(h.bridge is not None for h in fleet.hubs.values())
+        st.session_state.fleet_spec = st.text_area(
+            "Robots (un par ligne: nom=ip:port)",
+            value=st.session_state.fleet_spec,
+            key="fleet_spec_input",
+            placeholder="nao1=169.254.201.219\nnao2=169.254.201.220:9559",
+            disabled=fleet_connected
+        )
+        if fleet_error:
+            st.error(fleet_error)
+        if fleet_robots:
+            st.selectbox("Terminal du robot", [r[0] for r in fleet_robots], key="fleet_robot")
+    else:
+        # Un robot connecte garde son adresse (partagee avec les autres onglets)
+        st.session_state.nao_ip = st.text_input(
+            "IP du robot NAO", value=st.session_state.nao_ip, key="nao_ip_input",
+            disabled=state["connected"])
+        st.session_state.nao_port = st.number_input(
+            "Port", value=int(st.session_state.nao_port), key="nao_port_input",
+            min_value=1, max_value=65535, disabled=state["connected"])
     
     st.markdown("---")
     st.markdown("### 🌐 Langue / Language")
@@ -632,14 +802,46 @@ with st.sidebar:
     )
     st.session_state.language = lang_options[selected_lang]
     
-    if st.session_state.connected:
+    if state["connected"]:
         st.markdown("---")
         st.markdown("### 📊 Statistiques")
-        st.metric("Echanges", st.session_state.exchange_count)
-        st.metric("Messages", len(st.session_state.chat_messages))
+        st.metric("Echanges", state["exchange_count"])
+        st.metric("Messages", state["message_count"])
+        
+        llm_stats = state["llm_stats"]
+        if llm_stats.get("count"):
+            st.markdown(f"**Latence LLM** · `{llm_stats.get('backend', '?')}`")
+            col_p50, col_p95 = st.columns(2)
+            col_p50.metric("p50", f"{llm_stats.get('p50_s', 0):.2f}s")
+            col_p95.metric("p95", f"{llm_stats.get('p95_s', 0):.2f}s")
+            st.caption(
+                f"Doublon apres {llm_stats.get('hedge_delay_s', 0):.2f}s · "
+                f"doublons {llm_stats.get('hedges', 0)} (gagnants {llm_stats.get('hedge_wins', 0)}) · "
+                f"retries {llm_stats.get('retries', 0)} · "
+                f"disjoncteur {llm_stats.get('breaker', '?')}"
+            )
+            for name, backend in llm_stats.get("backends", {}).items():
+                if backend.get("count"):
+                    st.caption(
+                        f"{name} ({backend.get('model')}): p50 {backend.get('p50_s', 0):.2f}s · "
+                        f"p95 {backend.get('p95_s', 0):.2f}s · 1er octet {backend.get('ttft_p50_s', 0):.2f}s"
+                    )
+        
+        motion_rpc = state["motion_rpc"]
+        if motion_rpc:
+            st.caption(
+                f"Moteurs (derniere reponse): {motion_rpc.get('rpc', 0)} appels ALMotion · "
+                f"{motion_rpc.get('saved', 0)} evites"
+            )
 
 # Main content
-if not st.session_state.connected:
+if st.session_state.fleet_mode:
+    if fleet:
+        render_fleet_console(fleet)
+    else:
+        st.info("Ajoutez les robots de la flotte dans la barre laterale (un par ligne: nom=ip:port).")
+
+elif not state["connected"]:
     # Page de connexion
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
@@ -657,10 +859,13 @@ if not st.session_state.connected:
         
         col_a, col_b, col_c = st.columns([1, 2, 1])
         with col_b:
-            if st.button("🤖 Connecter au Robot NAO", use_container_width=True, type="primary"):
-                with st.spinner("Connexion en cours..."):
-                    do_connect()
+            connecting = state["robot_status"] == "connecting"
+            if st.button("🤖 Connecter au Robot NAO", use_container_width=True, type="primary",
+                         disabled=connecting):
+                do_connect()
                 st.rerun()
+            if connecting:
+                st.caption("Connexion en cours...")
         
         st.markdown("")
         st.info(f"📡 Robot cible: **{st.session_state.nao_ip}:{st.session_state.nao_port}**\n\nModifiez l'IP dans la barre laterale si necessaire.")
@@ -670,11 +875,12 @@ else:
     # Zone de chat
     st.markdown("### 💬 Conversation")
     render_chat()
+    render_live_answer()
     
     st.markdown("")
     
     # Controles
-    col1, col2, col3, col4 = st.columns([3, 2, 2, 1])
+    col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 1, 1])
     
     with col1:
         text_input = st.text_input(
@@ -688,7 +894,7 @@ else:
         send_text_btn = st.button(
             "📝 Envoyer texte",
             use_container_width=True,
-            disabled=st.session_state.is_processing
+            disabled=state["is_processing"]
         )
     
     with col3:
@@ -696,10 +902,18 @@ else:
             "🎤 Ecouter (micro NAO)",
             use_container_width=True,
             type="primary",
-            disabled=st.session_state.is_processing
+            disabled=state["is_processing"]
         )
     
     with col4:
+        # Reste actif pendant un echange: cancel_speech passe devant la file du bridge
+        stop_btn = st.button(
+            "⏹️",
+            use_container_width=True,
+            help="Arreter la parole"
+        )
+    
+    with col5:
         disconnect_btn = st.button(
             "🔌",
             use_container_width=True,
@@ -708,15 +922,21 @@ else:
     
     # Actions
     if listen_btn:
-        with st.spinner("🎤 Ecoute en cours... Parlez au robot!"):
-            do_listen_and_respond()
+        do_listen_and_respond()
         st.rerun()
     
     if send_text_btn and text_input:
-        with st.spinner("💭 Traitement en cours..."):
-            do_send_text(text_input)
+        do_send_text(text_input)
+        st.rerun()
+    
+    if stop_btn:
+        do_stop_speaking()
         st.rerun()
     
     if disconnect_btn:
         do_disconnect()
         st.rerun()
+    
+    # Ou passe le temps d'un echange
+    with st.expander("📈 Latences par etape"):
+        render_latency_dashboard()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+"""
+Conversations NAO en base SQLite locale (Python 3)
+
+Chaque connexion au robot ouvre une session; chaque message (humain,
+robot, systeme) y est ajoute avec son horodatage. L'index
+(session_id, ts) sert a lire une page de messages sans parcourir toute la
+conversation: le chat n'affiche que la derniere page, les plus anciennes
+sont chargees a la demande. Une session s'exporte en JSON.
+"""
+
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    robot TEXT NOT NULL,
+    started_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id INTEGER NOT NULL REFERENCES sessions(id),
+    ts REAL NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_session_ts ON messages(session_id, ts);
+"""
+
+
+class TranscriptStore(object):
+    """Sessions et messages dans un fichier SQLite
+
+    Une seule connexion, partagee par les threads (repartiteur du hub et
+    pages Streamlit) sous un verrou.
+    """
+
+    def __init__(self, path):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+
+    def start_session(self, robot):
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT INTO sessions (robot, started_at) VALUES (?, ?)", (robot, time.time()))
+            return cursor.lastrowid
+
+    def add(self, session_id, role, content):
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT INTO messages (session_id, ts, role, content) VALUES (?, ?, ?, ?)",
+                (session_id, time.time(), role, content))
+            return cursor.lastrowid
+
+    def count(self, session_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()
+            return row[0]
+
+    def latest(self, session_id, limit=20):
+        """Derniers messages de la session, du plus ancien au plus recent"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, ts, role, content FROM messages WHERE session_id = ? "
+                "ORDER BY ts DESC, id DESC LIMIT ?", (session_id, limit)).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def export(self, session_id, path):
+        """Ecrire la session complete en JSON dans path"""
+        with self._lock:
+            session = self._db.execute(
+                "SELECT id, robot, started_at FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            rows = self._db.execute(
+                "SELECT ts, role, content FROM messages WHERE session_id = ? ORDER BY ts, id",
+                (session_id,)).fetchall()
+        data = dict(session) if session else {"id": session_id}
+        data["messages"] = [dict(row) for row in rows]
+        with io.open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return path
+
+    def close(self):
+        with self._lock:
+            self._db.close()
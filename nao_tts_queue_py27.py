@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+"""
+File de parole asynchrone, phrase par phrase (Python 2.7 / 3)
+
+Chaque phrase part avec tts.post.say (non bloquant) et son identifiant de
+tache est suivi. La phrase suivante est deja soumise pendant que la
+courante est dite (file interne de ALTextToSpeech): pas de blanc entre
+les phrases, et le thread appelant reste libre pour preparer gestes et
+progression. La fin de chaque phrase est attendue par tts.wait avec un
+court delai, ce qui permet d'annuler a tout moment (cancel_all).
+"""
+
+import threading
+import time
+
+
+class SpeechQueue(object):
+    """Dire une liste de phrases avec suivi des taches TTS
+
+    Args:
+        tts: Proxy ALTextToSpeech
+        lookahead: Nombre de phrases soumises en avance
+        poll_ms: Delai de chaque tts.wait (reactivite de l'annulation)
+        progress_fn: fonction (dict) appelee au debut de chaque phrase et a la fin
+    """
+
+    def __init__(self, tts, lookahead=1, poll_ms=100, progress_fn=None, log_fn=None):
+        self.tts = tts
+        self.lookahead = lookahead
+        self.poll_ms = poll_ms
+        self.progress_fn = progress_fn
+        self.log_fn = log_fn
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._task_ids = []
+        self._progress = {"state": "idle", "index": 0, "total": 0, "sentence": u""}
+
+    def _log(self, message):
+        if self.log_fn:
+            self.log_fn(message)
+
+    def _report(self, **progress):
+        with self._lock:
+            self._progress.update(progress)
+            snapshot = dict(self._progress)
+        if self.progress_fn:
+            try:
+                self.progress_fn(snapshot)
+            except Exception:
+                pass
+
+    def _submit(self, sentence):
+        """Envoyer une phrase au TTS (None si la file est annulee)"""
+        text = sentence.encode("utf-8") if not isinstance(sentence, bytes) else sentence
+        if self._cancelled.is_set():
+            return None
+        task_id = self.tts.post.say(text)
+        # Verification et enregistrement en une etape sous le verrou: une
+        # tache enregistree est forcement vue par cancel_all
+        with self._lock:
+            if not self._cancelled.is_set():
+                self._task_ids.append(task_id)
+                return task_id
+        # Annulee pendant l'envoi: cancel_all n'a pas vu cette tache
+        try:
+            self.tts.stop(task_id)
+        except Exception:
+            pass
+        return None
+
+    def _wait(self, task_id):
+        """Attendre la fin de la tache par tranches de poll_ms (False si annule)"""
+        while not self._cancelled.is_set():
+            try:
+                if self.tts.wait(task_id, self.poll_ms):
+                    return True
+            except Exception:
+                pass
+            if not self.tts.isRunning(task_id):
+                return True
+        return False
+
+    def speak(self, sentences, on_start=None):
+        """Dire les phrases dans l'ordre (bloquant pour l'appelant)
+
+        Args:
+            sentences: Liste de phrases unicode
+            on_start: fonction (index, phrase) appelee quand la phrase commence
+
+        Returns:
+            dict: spoken, total, cancelled, starts (s depuis le debut), elapsed_s
+        """
+        with self._lock:
+            self._cancelled.clear()
+            self._task_ids = []
+        total = len(sentences)
+        starts = []
+        submitted = []
+        start = time.time()
+        current = 0
+
+        while current < total and not self._cancelled.is_set():
+            # Phrase courante + look-ahead deja dans la file de ALTextToSpeech
+            while len(submitted) < min(total, current + 1 + self.lookahead):
+                submitted.append(self._submit(sentences[len(submitted)]))
+
+            # La phrase courante demarre quand la precedente est finie
+            starts.append(round(time.time() - start, 3))
+            self._report(state="speaking", index=current + 1, total=total,
+                         sentence=sentences[current], elapsed_s=starts[-1])
+            if on_start:
+                on_start(current, sentences[current])
+
+            # Phrase arretee par cancel_all: pas comptee comme dite
+            if not self._wait(submitted[current]) or self._cancelled.is_set():
+                break
+            current += 1
+
+        cancelled = self._cancelled.is_set()
+        elapsed = round(time.time() - start, 3)
+        self._report(state="cancelled" if cancelled else "done", index=current, total=total,
+                     sentence=u"", elapsed_s=elapsed)
+        with self._lock:
+            self._task_ids = []
+        return {"spoken": current, "total": total, "cancelled": cancelled,
+                "starts": starts, "elapsed_s": elapsed}
+
+    def cancel_all(self):
+        """Arreter la phrase en cours et abandonner les suivantes
+
+        Returns:
+            True si une parole etait en cours
+        """
+        with self._lock:
+            self._cancelled.set()
+            task_ids = list(self._task_ids)
+        for task_id in task_ids:
+            try:
+                self.tts.stop(task_id)
+            except Exception:
+                pass
+        try:
+            self.tts.stopAll()
+        except Exception as e:
+            self._log("X Arret TTS: %s" % str(e))
+        return bool(task_ids)
+
+    def progress(self):
+        with self._lock:
+            return dict(self._progress)
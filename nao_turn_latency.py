@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+"""
+Latences par etape des echanges, cote application (Python 3)
+
+Le hub ouvre un echange au clic (begin), y ajoute les etapes renvoyees
+par le bridge (listen, get_response, speak: voir nao_stage_timing_py27)
+et le temps aller-retour de chaque commande mesure ici, puis le ferme a
+la fin de la parole (finish). Chaque etape alimente une fenetre
+glissante (p50 / p95, histogramme); le dernier echange est garde pour la
+vue en cascade.
+"""
+
+import threading
+from collections import OrderedDict
+
+from nao_latency_py27 import LatencyTracker
+
+
+# Ordre d'affichage: etapes d'un echange dans l'ordre ou elles arrivent
+STAGE_ORDER = ("command listen", "command get_response", "command speak", "capture",
+               "end_of_speech", "audio_transfer", "transcription", "thinking", "llm",
+               "speech", "gesture", "turn")
+
+
+def stage_label(stage):
+    """Libelle d'une ligne de la cascade ("speech 2", "command listen")"""
+    if "index" in stage:
+        return "%s %d" % (stage["stage"], stage["index"])
+    if "command" in stage:
+        return "command %s" % stage["command"]
+    return stage["stage"]
+
+
+class TurnLatency(object):
+    """Etapes de l'echange en cours + statistiques des echanges passes
+
+    Args:
+        window: Mesures gardees par etape
+    """
+
+    def __init__(self, window=200):
+        self.window = window
+        self.trackers = OrderedDict((stage, LatencyTracker(window)) for stage in STAGE_ORDER)
+        self.latest = []
+        self.turns = 0
+        self._current = None
+        self._lock = threading.Lock()
+
+    def begin(self):
+        with self._lock:
+            self._current = []
+
+    def add(self, stages):
+        """Ajouter des etapes {stage, start, duration_s, ...} a l'echange en cours"""
+        with self._lock:
+            if self._current is not None:
+                self._current.extend(stages)
+
+    def finish(self):
+        """Fermer l'echange en cours
+
+        Returns:
+            Duree totale (s), ou None si aucun echange n'etait ouvert
+        """
+        with self._lock:
+            stages, self._current = self._current, None
+        if not stages:
+            return None
+        origin = min(s["start"] for s in stages)
+        end = max(s["start"] + s["duration_s"] for s in stages)
+        for stage in stages:
+            # Aller-retour suivi par commande, phrases et gestes ensemble
+            key = stage_label(stage) if "command" in stage else stage["stage"]
+            tracker = self.trackers.get(key)
+            if tracker is None:
+                tracker = self.trackers[key] = LatencyTracker(self.window)
+            tracker.add(stage["duration_s"])
+        self.trackers["turn"].add(end - origin)
+        latest = []
+        for stage in sorted(stages, key=lambda s: s["start"]):
+            start_s = round(stage["start"] - origin, 3)
+            latest.append({
+                "label": stage_label(stage),
+                "stage": stage["stage"],
+                "start_s": start_s,
+                "end_s": round(start_s + stage["duration_s"], 3),
+                "duration_s": stage["duration_s"],
+            })
+        with self._lock:
+            self.latest = latest
+            self.turns += 1
+        return end - origin
+
+    def summary(self):
+        """Une ligne par etape mesuree: count, mean_s, p50_s, p95_s"""
+        rows = []
+        for stage, tracker in self.trackers.items():
+            stats = tracker.stats()
+            if stats["count"]:
+                row = {"stage": stage}
+                row.update(stats)
+                rows.append(row)
+        return rows
+
+    def samples(self, stage):
+        tracker = self.trackers.get(stage)
+        return tracker.samples() if tracker else []
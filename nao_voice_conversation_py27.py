@@ -11,7 +11,15 @@ import sys
 import os
 import time
 import json
-import requests
+import threading
+
+from nao_http_py27 import SessionPool, format_timing
+from nao_gestures_py27 import GesturePlanner, GestureScheduler, GestureWorker
+from nao_gesture_library_py27 import GestureLibrary
+from nao_motion_py27 import GESTURE_STIFFNESS, MotionFacade
+from nao_phrase_cache_py27 import PhraseCache, fixed_phrases
+from nao_tts_queue_py27 import SpeechQueue
+from nao_choreography_py27 import ChoreographyLibrary, ChoreographyPlayer, LoopingBehaviour
 
 # Charger les variables d'environnement manuellement
 def load_env():
@@ -53,6 +61,8 @@ print()
 class VoiceConversation:
     """Classe pour la conversation vocale avec NAO et Groq LLM"""
     
+    GREETING = u"Bonjour! je suis NAO, un robot assistant. Enchant\xe9 ! Comment puis-je t'aider ?"
+    
     def __init__(self, nao_ip, nao_port=9559):
         """Initialisation"""
         self.nao_ip = nao_ip
@@ -64,15 +74,24 @@ class VoiceConversation:
         self.memory = None
         self.audio_device = None
         self.motion = None
+        self.motion_facade = None  # Cache de raideur + appels ALMotion groupes
         self.leds = None
         self.tracker = None
         self.face_detection = None
         self.audio_player = None
+        self.phrase_cache = None  # Phrases frequentes pre-synthetisees sur le robot
+        self.speech_queue = None  # Phrases soumises une a une a ALTextToSpeech
+        self.choreography_player = None  # Comportements scenarises (reflexion)
+        self.speaking_now = threading.Event()  # Moteurs pris par la parole
         
         # Configuration Groq
         self.groq_api_key = env_vars.get("GROQ_API_KEY", "")
         self.llm_model = env_vars.get("LLM_MODEL", "llama-3.3-70b-versatile")
-        self.groq_api_url = "https://api.groq.com/openai/v1/chat/completions"
+        self.groq_api_url = env_vars.get("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+        self.groq_transcription_url = env_vars.get("GROQ_TRANSCRIPTION_URL", "https://api.groq.com/openai/v1/audio/transcriptions")
+        
+        # Sessions HTTP keep-alive partagees (chat + transcription)
+        self.http = SessionPool()
         
         # Historique de conversation
         self.conversation_history = []
@@ -87,6 +106,13 @@ class VoiceConversation:
         
         # Configuration gestes expressifs
         self.use_expressive_gestures = True  # Activer les gestes pendant la parole
+        self.gesture_worker = GestureWorker()  # Gestes executes pendant la parole
+        self.gesture_planner = GesturePlanner()  # Type de geste de chaque phrase, en une passe
+        self.gestures = GestureLibrary.load(env_vars.get("GESTURES_FILE") or None)  # gestures.json compile
+        # Ecart maximal entre le debut d'une phrase et son geste (fondu, raccourci ou saute au-dela)
+        self.gesture_scheduler = GestureScheduler(
+            self.gestures, max_gap_s=float(env_vars.get("SENTENCE_MAX_GAP", "0.3")))
+        self.choreographies = ChoreographyLibrary.load(env_vars.get("CHOREOGRAPHY_FILE") or None)
         
     def connect(self):
         """Connexion au robot NAO"""
@@ -97,16 +123,32 @@ class VoiceConversation:
             self.memory = ALProxy("ALMemory", self.nao_ip, self.nao_port)
             self.audio_device = ALProxy("ALAudioDevice", self.nao_ip, self.nao_port)
             self.motion = ALProxy("ALMotion", self.nao_ip, self.nao_port)
+            self.motion_facade = MotionFacade(self.motion)
             self.leds = ALProxy("ALLeds", self.nao_ip, self.nao_port)
             self.tracker = ALProxy("ALTracker", self.nao_ip, self.nao_port)
             self.face_detection = ALProxy("ALFaceDetection", self.nao_ip, self.nao_port)
             self.audio_player = ALProxy("ALAudioPlayer", self.nao_ip, self.nao_port)
+            
+            def log(message):
+                print(message)
+            self.phrase_cache = PhraseCache(
+                self.tts, self.audio_player,
+                path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "phrase_cache.json"),
+                remote_dir=env_vars.get("PHRASE_CACHE_DIR", "/home/nao"),
+                log_fn=log)
+            self.speech_queue = SpeechQueue(self.tts, log_fn=log)
+            self.choreography_player = ChoreographyPlayer(self.motion_facade, self.tts, self.leds, log_fn=log)
             print("OK Connexion etablie avec succes!")
             return True
         except Exception as e:
             print("X Erreur de connexion:", str(e))
             return False
     
+    def prerender_phrases(self, lang="fr", speed=100):
+        """Pre-synthetiser accueil, incomprehension, erreur et au revoir (en arriere-plan)"""
+        self.phrase_cache.set_voice(lang, speed)
+        self.phrase_cache.prerender(fixed_phrases(lang, [self.GREETING]))
+    
     def check_groq_config(self):
         """Verifier la configuration Groq"""
         print("Verification de la configuration Groq LLM...")
@@ -116,8 +158,24 @@ class VoiceConversation:
             return False
         
         print("OK Configuration Groq valide (Modele: %s)" % self.llm_model)
+        self.warm_up_http()
         return True
     
+    def warm_up_http(self):
+        """Pre-ouvrir les connexions Groq en arriere-plan"""
+        def warm():
+            results = self.http.warm_up([self.groq_api_url, self.groq_transcription_url],
+                                        self.groq_api_key)
+            for url, result in results.items():
+                if "error" in result:
+                    print("X Prechauffage HTTP %s: %s" % (url, result["error"]))
+                else:
+                    print("OK Connexion HTTP prechauffee (%.3fs): %s" % (result["total_s"], url))
+        
+        t = threading.Thread(target=warm)
+        t.daemon = True
+        t.start()
+    
     def configure_audio_recorder(self):
         """Configurer l'enregistreur audio"""
         print("Configuration de l'enregistreur audio...")
@@ -139,12 +197,10 @@ class VoiceConversation:
             print(">>> Activation du suivi facial...")
             
             # Activer les moteurs de la tete pour le suivi
-            self.motion.setStiffnesses("Head", 1.0)
-            time.sleep(0.2)
+            self.motion_facade.set_stiffness([("Head", 1.0)], settle=0.2)
             
             # Position initiale
-            self.motion.setAngles("HeadYaw", 0.0, 0.3)
-            self.motion.setAngles("HeadPitch", 0.0, 0.3)
+            self.motion_facade.set_angles([("HeadYaw", 0.0), ("HeadPitch", 0.0)], 0.3)
             time.sleep(0.3)
             
             # Configurer la detection de visages
@@ -179,12 +235,11 @@ class VoiceConversation:
             self.tracker.unregisterAllTargets()
             
             # Remettre la tete en position initiale
-            self.motion.setAngles("HeadYaw", 0.0, 0.3)
-            self.motion.setAngles("HeadPitch", 0.0, 0.3)
+            self.motion_facade.set_angles([("HeadYaw", 0.0), ("HeadPitch", 0.0)], 0.3)
             time.sleep(0.5)
             
             # Desactiver les moteurs de la tete
-            self.motion.setStiffnesses("Head", 0.0)
+            self.motion_facade.release(["Head"])
             
             self.tracking_active = False
             print(">>> Suivi facial desactive")
@@ -290,81 +345,28 @@ class VoiceConversation:
             time.sleep(check_interval)
     
     def thinking_animation(self):
-        """Animation de reflexion: gratter la tete avec mouvement et son"""
+        """Animation de reflexion: gratter la tete avec mouvement et son
+        
+        Non bloquante: entree rapide puis grattage en boucle jusqu'a stop()
+        sur l'objet renvoye; "Heummm" seulement si l'attente se prolonge.
+        
+        Returns:
+            LoopingBehaviour demarre
+        """
         print()
         print(">>> Animation de reflexion...")
         
-        try:
-            import thread
-            import math
-            
-            # Activer les moteurs du bras droit et de la tete
-            self.motion.setStiffnesses("RArm", 1.0)
-            self.motion.setStiffnesses("Head", 1.0)
-            time.sleep(0.2)
-                        
-            # Lever le bras vers la tete
-            names = ["RShoulderPitch", "RShoulderRoll", "RElbowYaw", "RElbowRoll", "RWristYaw", "RHand"]
-            angles_up = [-1.22, -0.43, 0.22, 1.39, 0.52, 0.2]
-            self.motion.setAngles(names, angles_up, 0.2)
-            time.sleep(1.0)
-
-            # Incliner legerement la tete sur le cote
-            self.motion.setAngles("HeadPitch", 0.2, 0.3)
-            self.motion.setAngles("HeadYaw", -0.3, 0.3)
-            time.sleep(0.5)
-            
-            # Lancer le son en thread non-bloquant
-            try:
-                thread.start_new_thread(self.tts.say, ("Heummmmmmmmmmmm",))
-            except:
-                pass
-
-            # Mouvement de grattage avec doigts (5 fois pour effet realiste)
-            for _ in range(5):
-                self.motion.setAngles("RWristYaw", 0.52, 0.8)
-                self.motion.setAngles("RHand", 0.3, 0.9)
-                time.sleep(0.2)
-                self.motion.setAngles("RWristYaw", 0.8, 0.52)
-                self.motion.setAngles("RHand", 0.5, 0.9)
-                time.sleep(0.2)
-            
-            # Remettre le poignet au centre
-            self.motion.setAngles("RWristYaw", 0.0, 0.3)
-            time.sleep(0.2)
-            
-            # Remettre la tete droite
-            self.motion.setAngles("HeadPitch", 0.0, 0.3)
-            self.motion.setAngles("HeadYaw", 0.0, 0.3)
-            time.sleep(0.3)
-            
-            # Ramener le bras en position repos specifiee
-            angles_rest = [
-                60.4 * math.pi / 180,   # RShoulderPitch = 60.4°
-                -17.0 * math.pi / 180,  # RShoulderRoll = -17.0°
-                32.8 * math.pi / 180,   # RElbowYaw = 32.8°
-                88.5 * math.pi / 180,   # RElbowRoll = 88.5°
-                31.6 * math.pi / 180,   # RWristYaw = 31.6°
-                0.22                     # RHand = 0.22
-            ]
-            self.motion.setAngles(names, angles_rest, 0.8)
-            
-            # Attendre que le mouvement soit termine
-            time.sleep(1.0)
-            
-            # Desactiver les moteurs
-            self.motion.setStiffnesses("RArm", 0.0)
-            self.motion.setStiffnesses("Head", 0.0)
-            
-            print(">>> Animation terminee - pret a parler")
-            
-        except Exception as e:
-            print("X Erreur lors de l'animation:", str(e))
-            try:
-                self.motion.setStiffnesses("RArm", 0.0)
-                self.motion.setStiffnesses("Head", 0.0)
-            except:
-                pass
+        def log(message):
+            print(message)
+        
+        behaviour = LoopingBehaviour(
+            self.choreography_player, self.choreographies.get("think_enter"),
+            self.choreographies.get("think_scratch"), self.choreographies.get("think_exit"),
+            filler_text="Heummmmmmmmmmmm",
+            filler_after=float(env_vars.get("THINK_FILLER_AFTER", "2.0")),
+            release=["RArm", "Head"], busy_fn=self.speaking_now.is_set, log_fn=log)
+        behaviour.start()
+        return behaviour
     
     def listen(self, max_duration=10, use_silence_detection=True):
         """Ecouter via le microphone de NAO et transcrire avec Whisper
@@ -509,7 +511,7 @@ class VoiceConversation:
         
         try:
             # Preparer la requete multipart
-            url = "https://api.groq.com/openai/v1/audio/transcriptions"
+            url = self.groq_transcription_url
             
             headers = {
                 "Authorization": "Bearer %s" % self.groq_api_key
@@ -523,7 +525,8 @@ class VoiceConversation:
                     'language': (None, 'fr')
                 }
                 
-                response = requests.post(url, headers=headers, files=files, timeout=30)
+                response, timing = self.http.post(url, headers=headers, files=files, timeout=30)
+            print(format_timing("whisper", timing))
             
             if response.status_code == 200:
                 result = response.json()
@@ -575,12 +578,13 @@ class VoiceConversation:
             }
             
             # Appeler l'API Groq
-            response = requests.post(
+            response, timing = self.http.post(
                 self.groq_api_url,
                 headers=headers,
                 data=json.dumps(payload),
                 timeout=30
             )
+            print(format_timing("chat", timing))
             
             if response.status_code == 200:
                 result = response.json()
@@ -602,234 +606,129 @@ class VoiceConversation:
             print("X Erreur lors de l'appel a Groq:", str(e))
             return "Desole, je n'ai pas pu traiter votre demande."
     
-    def _perform_expressive_gesture(self, gesture_type="neutral"):
+    def _perform_expressive_gesture(self, gesture, time_scale=1.0):
         """Effectuer un geste expressif avec mains en avant et mouvement de tete
         
-        Gestes realistes: mains projetees vers l'avant, tete qui bouge
+        Gestes realistes: mains projetees vers l'avant, tete qui bouge. Le
+        geste part de la pose courante (enchainement direct apres un geste).
         
         Args:
-            gesture_type: Type de geste (neutral, explain, question, emphasis)
+            gesture: Geste de la bibliotheque (neutral, explain, question, emphasis)
+            time_scale: Facteur de duree (< 1 = geste raccourci)
         """
         try:
-            import random
-            import math
+            # Activer les moteurs des bras ET de la tete, verrouiller les
+            # jambes: un seul appel, aucun si deja actifs (phrase precedente)
+            self.motion_facade.set_stiffness(GESTURE_STIFFNESS)
             
-            # Activer les moteurs des bras ET de la tete
-            self.motion.setStiffnesses("LArm", 0.8)
-            self.motion.setStiffnesses("RArm", 0.8)
-            self.motion.setStiffnesses("Head", 0.6)
+            # Trajectoire complete (images cles de gestures.json) en un seul appel
+            self.motion_facade.play(gesture, time_scale=time_scale)
             
-            # Verrouiller les jambes pour stabilite
-            self.motion.setStiffnesses("LLeg", 1.0)
-            self.motion.setStiffnesses("RLeg", 1.0)
-            time.sleep(0.1)
-            
-            if gesture_type == "explain":
-                # Geste d'explication: mains vers l'avant ULTRA FLUIDE
-                names = ["LShoulderPitch", "LShoulderRoll", "LElbowRoll", "LElbowYaw",
-                        "RShoulderPitch", "RShoulderRoll", "RElbowRoll", "RElbowYaw",
-                        "HeadPitch", "HeadYaw"]
-                # Position intermediaire pour transition douce - BRAS HAUTS
-                angles_mid = [0.0, 0.3, -0.2, -0.4, 0.0, -0.3, 0.2, 0.4, -0.05, 0.0]
-                self.motion.setAngles(names, angles_mid, 0.12)
-                time.sleep(0.5)
-                # Position finale - mouvement TRES LENT - BRAS RESTENT HAUTS
-                angles = [-0.2, 0.6, -0.4, -0.8, -0.2, -0.6, 0.4, 0.8, -0.1, 0.0]
-                self.motion.post.setAngles(names, angles, 0.12)
-                
-            elif gesture_type == "question":
-                # Geste de question: main levee ULTRA FLUIDE avec transition
-                side = random.choice(["L", "R"])
-                if side == "L":
-                    names = ["LShoulderPitch", "LShoulderRoll", "LElbowRoll", "LElbowYaw",
-                            "HeadPitch", "HeadYaw"]
-                    # Position intermediaire - BRAS HAUT
-                    angles_mid = [-0.1, 0.3, -0.6, -0.3, 0.05, 0.1]
-                    self.motion.setAngles(names, angles_mid, 0.12)
-                    time.sleep(0.4)
-                    # Position finale - mouvement TRES LENT - BRAS RESTE HAUT
-                    angles = [-0.4, 0.5, -1.2, -0.5, 0.1, 0.2]
-                else:
-                    names = ["RShoulderPitch", "RShoulderRoll", "RElbowRoll", "RElbowYaw",
-                            "HeadPitch", "HeadYaw"]
-                    # Position intermediaire - BRAS HAUT
-                    angles_mid = [-0.1, -0.3, 0.6, 0.3, 0.05, -0.1]
-                    self.motion.setAngles(names, angles_mid, 0.12)
-                    time.sleep(0.4)
-                    # Position finale - BRAS RESTE HAUT
-                    angles = [-0.4, -0.5, 1.2, 0.5, 0.1, -0.2]
-                self.motion.post.setAngles(names, angles, 0.12)
-                
-            elif gesture_type == "emphasis":
-                # Geste d'emphase: mouvement ULTRA FLUIDE en 3 phases progressives
-                names = ["LShoulderPitch", "LShoulderRoll", "LElbowRoll",
-                        "RShoulderPitch", "RShoulderRoll", "RElbowRoll",
-                        "HeadPitch", "HeadYaw"]
-                # Phase 1: debut de mouvement - TRES LENT - BRAS HAUTS
-                angles = [0.0, 0.3, -0.3, 0.0, -0.3, 0.3, -0.08, 0.0]
-                self.motion.setAngles(names, angles, 0.08)
-                time.sleep(0.5)
-                # Phase 2: mains vers l'avant - TRES LENT - BRAS RESTENT HAUTS
-                angles = [-0.2, 0.5, -0.5, -0.2, -0.5, 0.5, -0.15, 0.0]
-                self.motion.setAngles(names, angles, 0.08)
-                time.sleep(0.5)
-                # Phase 3: leger mouvement vers le haut - TRES LENT
-                angles = [-0.3, 0.4, -0.6, -0.3, -0.4, 0.6, 0.0, 0.0]
-                self.motion.post.setAngles(names, angles, 0.12)
-                
-            else:  # neutral
-                # Geste neutre: mouvement ULTRA FLUIDE avec transition
-                side = random.choice(["L", "R"])
-                head_yaw = random.choice([-0.15, 0.15])
-                if side == "L":
-                    names = ["LShoulderPitch", "LShoulderRoll", "LElbowRoll", "HeadYaw"]
-                    # Position intermediaire - BRAS HAUT
-                    angles_mid = [0.0, 0.2, -0.3, head_yaw * 0.5]
-                    self.motion.setAngles(names, angles_mid, 0.08)
-                    time.sleep(0.4)
-                    # Position finale - TRES LENT pour fluidite maximale - BRAS RESTE HAUT
-                    angles = [-0.2, 0.4, -0.5, head_yaw]
-                else:
-                    names = ["RShoulderPitch", "RShoulderRoll", "RElbowRoll", "HeadYaw"]
-                    # Position intermediaire - BRAS HAUT
-                    angles_mid = [0.0, -0.2, 0.3, head_yaw * 0.5]
-                    self.motion.setAngles(names, angles_mid, 0.08)
-                    time.sleep(0.4)
-                    # Position finale - BRAS RESTE HAUT
-                    angles = [-0.2, -0.4, 0.5, head_yaw]
-                self.motion.post.setAngles(names, angles, 0.08)
-                
         except Exception as e:
             print("X Erreur geste expressif:", str(e))
     
-    def _reset_arms_to_rest(self):
-        """Remettre les bras et la tete en position de repos FLUIDE"""
+    def _reset_arms_to_rest(self, release=True):
+        """Remettre les bras et la tete en position de repos FLUIDE
+        
+        Args:
+            release: Relacher les moteurs ensuite (False entre deux phrases)
+        """
         try:
-            import math
-            
-            # Position repos: bras croises devant le torse + tete droite
-            names = ["LShoulderPitch", "LShoulderRoll", "LElbowRoll", "LElbowYaw",
-                    "RShoulderPitch", "RShoulderRoll", "RElbowRoll", "RElbowYaw",
-                    "HeadPitch", "HeadYaw"]
-            
-            # Position intermediaire pour retour progressif - BRAS HAUTS pour eviter genoux
-            angles_mid = [0.3, 0.05, -0.5, -0.3, 0.3, -0.05, 0.5, 0.3, 0.0, 0.0]
-            self.motion.setAngles(names, angles_mid, 0.12)
-            time.sleep(0.5)
+            # Position repos: bras croises devant le torse + tete droite, en
+            # une trajectoire; bloquant pour ne relacher les moteurs qu'a la fin
+            self.motion_facade.play(self.gestures.get("rest"), wait=True)
             
-            # Position croisee naturelle + tete centree - ULTRA LENT - BRAS HAUTS
-            angles = [1.0, 0.1, -1.0, -0.5, 1.0, -0.1, 1.0, 0.5, 0.0, 0.0]
-            self.motion.setAngles(names, angles, 0.12)
-            time.sleep(0.8)
-            
-            # Desactiver les moteurs des bras et tete
-            self.motion.setStiffnesses("LArm", 0.0)
-            self.motion.setStiffnesses("RArm", 0.0)
-            self.motion.setStiffnesses("Head", 0.0)
-            
-            # Deverrouiller les jambes
-            self.motion.setStiffnesses("LLeg", 0.0)
-            self.motion.setStiffnesses("RLeg", 0.0)
+            # Desactiver bras, tete et jambes en un seul appel
+            if release:
+                self.motion_facade.release()
             
         except Exception as e:
             print("X Erreur reset bras:", str(e))
     
-    def _detect_gesture_type(self, text):
-        """Detecter le type de geste approprie selon le texte
-        
-        Args:
-            text: Texte a analyser
-            
-        Returns:
-            Type de geste: explain, question, emphasis, neutral
-        """
-        import random
-        
-        text_lower = text.lower() if isinstance(text, unicode) else text.decode('utf-8').lower()
-        
-        # Mots cles pour differents types de gestes (plus de mots pour plus de detection)
-        question_words = [u'pourquoi', u'comment', u'quoi', u'qui', u'où', u'quand', u'quel', u'quelle', u'?']
-        emphasis_words = [u'important', u'attention', u'!', u'vraiment', u'absolument', u'certainement',
-                         u'très', u'super', u'magnifique', u'incroyable', u'génial', u'excellent']
-        explain_words = [u'parce que', u'donc', u'ainsi', u'par exemple', u'c\'est-à-dire', u'en effet',
-                        u'voici', u'voilà', u'regardez', u'comme', u'si', u'alors']
-        
-        # Verifier les mots cles
-        for word in emphasis_words:
-            if word in text_lower:
-                return "emphasis"
-        
-        for word in question_words:
-            if word in text_lower:
-                return "question"
-        
-        for word in explain_words:
-            if word in text_lower:
-                return "explain"
-        
-        # 70% de chance de geste neutre (au lieu de 30%) - plus de gestes!
-        if random.random() < 0.7:
-            return "neutral"
-        
-        return None
-    
     def _speak_with_punctuation_gestures(self, text):
         """Parler avec gestes UNIQUEMENT aux phrases completes
         
-        Gestes seulement aux points/points d'exclamation/interrogation
-        PAS de geste aux virgules (trop frequent)
+        Les phrases partent une a une dans la file TTS (tts.post.say, une
+        phrase d'avance); le geste de chaque phrase demarre quand NAO
+        commence a la dire. PAS de geste aux virgules.
         """
-        import re
-        
-        # Decouper le texte par phrases completes (. ! ?)
-        # Garder les virgules dans les segments
-        sentences = re.split(r'([.!?])', text)
-        
-        for i, segment in enumerate(sentences):
-            segment = segment.strip()
-            if not segment:
-                continue
-            
-            # Si c'est une fin de phrase (. ! ?), faire une pause
-            if segment in ['.', '!', '?']:
-                # Pause et retour position repos SEULEMENT aux phrases
-                if self.use_expressive_gestures:
-                    self._reset_arms_to_rest()
-                time.sleep(0.4)
-                continue
-            
-            # Pour chaque phrase, faire UN SEUL geste au debut
-            if self.use_expressive_gestures:
-                gesture_type = self._detect_gesture_type(segment)
-                if gesture_type:
-                    print(">>> Geste: %s" % gesture_type)
-                    self._perform_expressive_gesture(gesture_type)
-                else:
-                    print(">>> Geste: neutral")
-                    self._perform_expressive_gesture("neutral")
+        if not self.use_expressive_gestures:
+            with self.phrase_cache.speaking():
+                if not self.phrase_cache.speak(text):
+                    self.tts.say(text.encode('utf-8'))
+            self.phrase_cache.observe(text)
+            return
+        
+        # Plan complet des gestes avant de parler, tenu dans le budget d'ecart
+        cues = self.gesture_scheduler.schedule(self.gesture_planner.plan(text))
+        setup = {}
+        self.gesture_worker.lags.clear()
+        
+        def gesture_for(index, sentence):
+            cue = cues[index] if index < len(cues) else None
+            if cue is None or cue["gesture"] is None:
+                return None
             
-            # Dire la phrase complete (avec virgules incluses)
-            segment_utf8 = segment.encode('utf-8')
-            self.tts.say(segment_utf8)
+            def action():
+                began = time.time()
+                # Retour au repos seulement s'il tient dans le budget
+                if cue["mode"] == "reset":
+                    self._reset_arms_to_rest(release=False)
+                self._perform_expressive_gesture(cue["gesture"], cue["time_scale"])
+                setup[index] = time.time() - began
+            return action, "%s (%s)" % (cue["gesture"].name, cue["mode"])
+        
+        def on_sentence(index, sentence):
+            planned = gesture_for(index, sentence)
+            if planned:
+                print(">>> Geste: %s (phrase %d)" % (planned[1], index + 1))
+                self.gesture_worker.submit(planned[0], planned[1], key=index)
+        
+        with self.phrase_cache.speaking():
+            # Phrase deja pre-synthetisee: fichier rejoue, sans synthese
+            if self.phrase_cache.speak(text, on_sentence=on_sentence):
+                print(">>> Phrase jouee depuis le cache audio")
+            else:
+                try:
+                    self.speech_queue.speak([cue["sentence"] for cue in cues], on_start=on_sentence)
+                except KeyboardInterrupt:
+                    # Ctrl+C: NAO se tait tout de suite
+                    self.speech_queue.cancel_all()
+                    raise
+                except Exception as e:
+                    print("X File de parole indisponible:", str(e))
+                    self.tts.say(text.encode('utf-8'))
+            self.gesture_worker.wait_idle()
+        self.phrase_cache.observe(text)
+        print(">>> " + self.gesture_scheduler.report(cues, self.gesture_worker.lags, setup)[1])
     
     def speak(self, text):
         """Faire parler le robot avec gestes expressifs synchronises"""
         print()
         print("NAO dit: '%s'" % text)
+        self.speaking_now.set()
         try:
             # Convertir en unicode si necessaire pour Python 2.7
             if isinstance(text, str):
                 text = text.decode('utf-8')
             
+            self.motion_facade.invalidate()
+            self.motion_facade.begin_answer()
+            
             # Parler avec gestes synchronises aux ponctuations
             self._speak_with_punctuation_gestures(text)
             
             # Remettre les bras en position de repos a la fin
             if self.use_expressive_gestures:
                 self._reset_arms_to_rest()
+                stats = self.motion_facade.answer_stats()
+                print(">>> RPC moteur: %d envoyes, %d evites (sur %d)" % (
+                    stats["rpc"], stats["saved"], stats["naive_rpc"]))
                 
         except Exception as e:
             print("X Erreur lors de la synthese vocale:", str(e))
+        finally:
+            self.speaking_now.clear()
     
     def conversation_loop(self, num_exchanges=5):
         """Boucle de conversation"""
@@ -839,7 +738,7 @@ class VoiceConversation:
         print("-" * 60)
         print()
         
-        self.speak("Bonjour! je suis NAO, un robot assistant. Enchanté ! Comment puis-je t'aider ?")
+        self.speak(self.GREETING)
         
         try:
             for i in range(num_exchanges):
@@ -855,11 +754,12 @@ class VoiceConversation:
                     self.speak("Je n'ai pas compris. Pouvez-vous repeter?")
                     continue
                 
-                # Animation de reflexion apres l'enregistrement (bloquante)
-                self.thinking_animation()
-                
-                # Obtenir la reponse du LLM (bloquant - appel API)
-                response = self.get_llm_response(user_input)
+                # Reflexion pendant l'appel au LLM, arretee des que la reponse arrive
+                thinking = self.thinking_animation()
+                try:
+                    response = self.get_llm_response(user_input)
+                finally:
+                    print(">>> Reflexion arretee en %d ms" % (thinking.stop() * 1000))
                 
                 # Faire parler le robot (bloquant - attend la fin de la parole)
                 self.speak(response)
@@ -909,6 +809,7 @@ def main():
     # Configurer la langue et le volume
     conversation.tts.setLanguage("French")
     conversation.tts.setVolume(0.8)
+    conversation.prerender_phrases("fr")
     
     try:
         # Lancer la boucle de conversation